@@ -0,0 +1,240 @@
+# ==============================================================================
+# 1. IMPORTS
+# ==============================================================================
+# --- Standard Library Imports ---
+import asyncio
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# --- Local Application Imports ---
+from .http_clients import http_client, pooled_tavily_search_tool
+from .model_routing import MODEL_TIERS, model_router
+from .pipeline import Stage
+from .search_cache import search_cache, cached_search_tool
+
+
+# ==============================================================================
+# 2. CONFIGURATION CONSTANTS
+# ==============================================================================
+# Build the agents in the background as soon as a worker starts, instead of on the
+# first request that needs them. Either way, importing the app stays fast.
+PRELOAD_AGENTS = os.getenv("PRELOAD_AGENTS", "true").lower() in ("1", "true", "yes")
+
+
+# ==============================================================================
+# 3. AI AGENT DEFINITIONS
+# ==============================================================================
+# Each profile is keyed by the stage that runs it ("qna" for follow-ups), which is
+# also the key its model tier is configured under (see `model_routing.py`).
+AGENT_PROFILES: Dict[str, Dict[str, Any]] = {
+    # --- Core Analysis Agents ---
+    "vision": dict(
+        role='Creative Product Visionary',
+        goal='Develop a raw business idea into a grand, compelling vision.',
+        backstory="You are a highly optimistic product visionary...",
+        uses_search=False,
+    ),
+    "market": dict(
+        role='Data-Driven Market Analyst',
+        goal='Use web search to find real-time data...',
+        backstory="You are a market analyst...",
+        uses_search=True,
+    ),
+    "critique": dict(
+        role='Realistic Risk Manager',
+        goal='Objectively identify all weaknesses...',
+        backstory="You are a meticulous and logical risk manager...",
+        uses_search=False,
+    ),
+    "report": dict(
+        role='Pragmatic Strategy Consultant',
+        goal='Synthesize all information into a final report.',
+        backstory='You are an expert at taking inputs from multiple sources...',
+        uses_search=False,
+    ),
+    # --- Follow-up Q&A Agent ---
+    "qna": dict(
+        role='Creative Strategist & Follow-up Specialist',
+        goal="Answer user questions and expand on ideas based on a provided report. Use your general knowledge and web search capabilities to provide creative, insightful, and forward-thinking answers.",
+        backstory="You are a brilliant strategic assistant. You use a provided report as the primary context, but you are encouraged to think beyond it, add new insights, perform web searches for new information, and help the user develop their original idea further.",
+        uses_search=True,
+    ),
+}
+
+
+class Agents:
+    """
+    This worker's LLM clients, search tool, agents and analysis pipeline.
+
+    An agent is built per (profile, model) on first use, so every stage can run
+    on whichever model the router picks for it. The stages route through this
+    object (`select` / `record`), which delegates the choice to `model_router`.
+
+    crewai and the LangChain integrations take seconds to import, so they are
+    imported by the methods that build agents rather than when this module loads.
+    """
+
+    def __init__(self):
+        # --- LLM and Tool Initialization ---
+        # Initialize the Tavily search tool for web searches. It is wrapped in a shared
+        # cache so repeated queries (across users, follow-ups and retries) are served locally.
+        self.search_tool = cached_search_tool(pooled_tavily_search_tool(), search_cache)
+        self._llms: Dict[str, Any] = {}
+        self._agents: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.RLock()
+
+        # --- Analysis Pipeline (Dependency Graph) ---
+        # Each stage declares the values it needs. The scheduler starts a stage as soon as
+        # its inputs exist, so the market research and the critique run side by side once
+        # the vision is ready, and the Planner waits for all three.
+        self.analysis_stages = [
+            Stage(
+                key="vision",
+                agent=self.configured_agent("vision"),
+                router=self,
+                inputs=("idea", "history_context"),
+                description="Create a compelling vision for: '{idea}'.\n{history_context}",
+                expected_output="An inspiring paragraph about the idea's potential.",
+                label="vision task",
+                progress_message="Vision created",
+                trim_order=("history_context",)
+            ),
+            Stage(
+                key="market",
+                agent=self.configured_agent("market"),
+                router=self,
+                inputs=("idea", "vision"),
+                description="Analyze the market for '{idea}', considering this vision: {vision}",
+                expected_output="A summary of market trends and competitors.",
+                label="market analysis task",
+                progress_message="Market analysis completed",
+                trim_order=("vision",)
+            ),
+            Stage(
+                key="critique",
+                agent=self.configured_agent("critique"),
+                router=self,
+                inputs=("idea", "vision"),
+                description="Critically evaluate the idea for '{idea}', considering the vision ({vision}). Focus on market, execution and financial risks.",
+                expected_output="A bullet list of potential risks.",
+                label="critique task",
+                progress_message="Risk analysis completed",
+                trim_order=("vision",)
+            ),
+            Stage(
+                key="report",
+                agent=self.configured_agent("report"),
+                router=self,
+                inputs=("idea", "vision", "market", "critique"),
+                description="""
+                    Synthesize all the following information into a single, cohesive final report for the business idea: '{idea}'.
+                    You MUST use the information provided below as the primary context for your report.
+
+                    **Vision Provided:**\n{vision}\n
+                    **Market Analysis Provided:**\n{market}\n
+                    **Critique & Risks Provided:**\n{critique}\n
+
+                    Based on ALL of this information, create a comprehensive report that includes a summary, the market analysis, the risks, and a final SWOT & Action Plan. Structure your response with clear markdown headings.
+                """,
+                expected_output="A comprehensive, well-structured report in Markdown format.",
+                label="planning task",
+                progress_message="Final report generated",
+                # The vision is already reflected in the market analysis and the critique.
+                trim_order=("vision", "critique", "market")
+            ),
+        ]
+
+    @property
+    def planner_role(self) -> str:
+        return AGENT_PROFILES["report"]["role"]
+
+    def llm(self, model: str) -> Any:
+        """
+        Returns the chat model client for a model name, creating it on first use.
+        """
+        from langchain_openai import ChatOpenAI
+
+        with self._lock:
+            if model not in self._llms:
+                # Streaming is enabled so each agent's answer can be forwarded token by token.
+                self._llms[model] = ChatOpenAI(
+                    model=model,
+                    temperature=0.7,
+                    streaming=True,
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    # The worker's shared keep-alive pool, so calls reuse connections instead of
+                    # each thread and stage paying for its own TCP + TLS setup.
+                    http_client=http_client.get()
+                )
+            return self._llms[model]
+
+    def agent(self, key: str, model: str) -> Any:
+        """
+        Returns the agent of a profile running on a model, creating it on first use.
+        """
+        from crewai import Agent
+
+        with self._lock:
+            if (key, model) not in self._agents:
+                profile = AGENT_PROFILES[key]
+                self._agents[key, model] = Agent(
+                    role=profile["role"],
+                    goal=profile["goal"],
+                    backstory=profile["backstory"],
+                    llm=self.llm(model),
+                    tools=[self.search_tool] if profile["uses_search"] else [],
+                    allow_delegation=False,
+                    verbose=False
+                )
+            return self._agents[key, model]
+
+    def configured_agent(self, key: str) -> Any:
+        """
+        Returns the agent of a profile on its configured tier.
+        """
+        return self.agent(key, MODEL_TIERS[model_router.configured_tier(key)])
+
+    def select(self, key: str) -> Tuple[Any, str, str]:
+        """
+        Picks the agent for the next call of a stage.
+
+        Returns:
+            Tuple[Any, str, str]: The agent, its tier and its model name.
+        """
+        tier, model = model_router.select(key)
+        return self.agent(key, model), tier, model
+
+    def record(self, key: str, tier: str, seconds: float) -> None:
+        """
+        Reports the latency of a call made with `select`.
+        """
+        model_router.record(key, tier, seconds)
+
+
+# ==============================================================================
+# 4. LAZY ACCESS
+# ==============================================================================
+_agents: Optional[Agents] = None
+_agents_lock = threading.Lock()
+
+
+def get_agents() -> Agents:
+    """
+    Returns this worker's agents, building them on first use.
+    """
+    global _agents
+    if _agents is None:
+        with _agents_lock:
+            if _agents is None:
+                _agents = Agents()
+    return _agents
+
+
+async def get_agents_async() -> Agents:
+    """
+    Returns this worker's agents without blocking the event loop while they are built.
+    """
+    if _agents is not None:
+        return _agents
+    return await asyncio.to_thread(get_agents)
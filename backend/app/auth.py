@@ -2,9 +2,17 @@
 # 1. IMPORTS
 # ==============================================================================
 # --- Standard Library Imports ---
+import asyncio
+import hashlib
+import multiprocessing
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Dict, Optional, Set, Tuple
 
 # --- Third-party Library Imports ---
 from fastapi.security import OAuth2PasswordBearer
@@ -25,6 +33,17 @@ ALGORITHM = "HS256"
 # Default expiration time for access tokens, in minutes.
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# How long a verified token maps to its user without re-checking the database, in seconds.
+# An entry never outlives the token's own 'exp'.
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "300"))
+
+# Maximum number of cached principals per worker process (least recently used is evicted first).
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "4096"))
+
+# Processes dedicated to bcrypt, per worker process. bcrypt is deliberately slow (~250 ms)
+# and CPU-bound, so it runs outside the event loop and outside the GIL.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+
 
 # ==============================================================================
 # 3. UTILITY INSTANCES
@@ -96,3 +115,164 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+
+# --- Async Password Hashing (Process Pool) ---
+_password_executor: Optional[ProcessPoolExecutor] = None
+_password_executor_lock = threading.Lock()
+
+
+def _get_password_executor() -> ProcessPoolExecutor:
+    """
+    Returns the bcrypt process pool, creating it on first use.
+
+    The pool is created lazily so each gunicorn worker gets its own after forking,
+    and it uses 'spawn' so the children never inherit the server's threads or locks.
+    """
+    global _password_executor
+    with _password_executor_lock:
+        if _password_executor is None:
+            _password_executor = ProcessPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _password_executor
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Async version of `verify_password` that runs bcrypt on the password process pool.
+
+    Args:
+        plain_password (str): The password to check, as entered by the user.
+        hashed_password (str): The stored hash to check against.
+
+    Returns:
+        bool: True if the passwords match, False otherwise.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_password_executor(), verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Async version of `get_password_hash` that runs bcrypt on the password process pool.
+
+    Args:
+        password (str): The plain-text password to hash.
+
+    Returns:
+        str: The resulting hashed password.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_password_executor(), get_password_hash, password)
+
+
+def shutdown_password_pool() -> None:
+    """
+    Stops the bcrypt worker processes, if they were started.
+    """
+    global _password_executor
+    with _password_executor_lock:
+        if _password_executor is not None:
+            _password_executor.shutdown(wait=False, cancel_futures=True)
+            _password_executor = None
+
+
+# ==============================================================================
+# 5. VERIFIED PRINCIPAL CACHE
+# ==============================================================================
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    The lightweight identity of an authenticated user, as seen by the endpoints.
+    Carries only what request handling needs, so it can be cached safely.
+    """
+    id: int
+    email: str
+    username: str
+    # Rate-limit and fair-queueing tier (see `rate_limits.py`); None is the default tier.
+    tier: Optional[str] = None
+
+
+class PrincipalCache:
+    """
+    A bounded TTL + LRU cache from an access token to its verified principal.
+
+    A hit skips both the JWT decode and the `users` lookup. Entries expire at
+    the earlier of the cache TTL and the token's own expiry, and every entry
+    of a user can be dropped with `invalidate_user` when that user changes.
+    """
+
+    def __init__(self, ttl_seconds: int = PRINCIPAL_CACHE_TTL_SECONDS, max_entries: int = PRINCIPAL_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()
+        self._by_email: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        # Store a digest rather than the bearer token itself.
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[Principal]:
+        """
+        Returns the cached principal for a token, or None if absent or expired.
+        """
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return principal
+
+    def put(self, token: str, principal: Principal, token_expires_at: float) -> None:
+        """
+        Caches a verified principal.
+
+        Args:
+            token (str): The bearer token that was verified.
+            principal (Principal): The user it belongs to.
+            token_expires_at (float): The token's 'exp' claim, as a UNIX timestamp.
+        """
+        key = self._key(token)
+        expires_at = min(time.time() + self.ttl_seconds, token_expires_at)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (principal, expires_at)
+            self._by_email.setdefault(principal.email, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, email: str) -> None:
+        """
+        Drops every cached token of a user, e.g. after the user row changes.
+        """
+        with self._lock:
+            for key in list(self._by_email.get(email, ())):
+                self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        """
+        Drops one entry and its email index reference. Caller must hold the lock.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        email = entry[0].email
+        keys = self._by_email.get(email)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_email[email]
+
+
+# --- Shared Instance ---
+# One cache per worker process, used by the `get_current_user` dependency.
+principal_cache = PrincipalCache()
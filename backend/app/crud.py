@@ -1,12 +1,21 @@
 # ==============================================================================
 # 1. IMPORTS
 # ==============================================================================
+# --- Standard Library Imports ---
+import asyncio
+import base64
+import datetime
+from typing import Any, Callable, Optional, Tuple, Union
+
 # --- Third-party Library Imports ---
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, delete, exists, func, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, undefer
 
 # --- Local Application Imports ---
 # Import models for database table structure, schemas for data validation, and auth for password utilities.
-from . import models, schemas, auth
+from . import models, schemas, auth, memory, report_store
 
 
 # ==============================================================================
@@ -61,6 +70,8 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.User:
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    # Tokens issued for a previous account with this email must not resolve to a stale principal.
+    auth.principal_cache.invalidate_user(db_user.email)
     return db_user
 
 
@@ -86,6 +97,119 @@ def authenticate_user(db: Session, email: str, password: str) -> models.User | N
 # 3. ANALYSIS-RELATED CRUD FUNCTIONS
 # ==============================================================================
 
+# Loads everything `report_markdown` needs along with a full analysis, in the same query.
+FULL_ANALYSIS_OPTIONS = (joinedload(models.Analysis.report_blob), undefer(models.Analysis.legacy_report_markdown))
+
+
+def _report_blob_row(report_markdown: str) -> dict:
+    """
+    Builds the `report_blobs` row of a report.
+    """
+    codec, body = report_store.compress_report(report_markdown)
+    return {
+        "digest": report_store.report_digest(report_markdown),
+        "codec": codec,
+        "body": body,
+        "size": len(report_markdown.encode("utf-8")),
+        "created_at": datetime.datetime.utcnow(),
+    }
+
+
+def _dialect_name(db: Union[AsyncSession, Session]) -> str:
+    bind = db.bind if isinstance(db, AsyncSession) else db.get_bind()
+    return bind.dialect.name
+
+
+def _insert_report_blobs_statement(dialect_name: str, blobs: list[dict]):
+    """
+    Builds an INSERT of report blobs that skips the ones already stored, so identical
+    reports share one row even when two workers save them at the same time.
+    """
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    unique = list({blob["digest"]: blob for blob in blobs}.values())
+    return insert(models.ReportBlob).values(unique).on_conflict_do_nothing(index_elements=["digest"])
+
+
+def _lock_report_blobs_statement(digests: list[str], shared: bool = True):
+    """
+    Selects report blobs and locks them until the transaction ends: shared by the
+    saves that are about to refer to them, exclusively by a delete. SQLite ignores
+    the lock, which it does not need since it runs one writer at a time.
+    """
+    return select(models.ReportBlob.digest).where(
+        models.ReportBlob.digest.in_(digests)
+    ).with_for_update(read=shared)
+
+
+def _store_report_blobs(db: Session, blobs: list[dict]) -> None:
+    """
+    Makes sure the blobs exist and stay until the transaction commits, so the
+    analyses referring to them can be inserted.
+
+    The INSERT skips blobs that are already stored, but one of those may be deleted
+    by a concurrent `delete_analysis` before it commits. Locking them afterwards
+    waits for that delete, and the blobs it removed are inserted again.
+    """
+    while blobs:
+        db.execute(_insert_report_blobs_statement(_dialect_name(db), blobs))
+        locked = set(db.execute(_lock_report_blobs_statement([blob["digest"] for blob in blobs])).scalars())
+        blobs = [blob for blob in blobs if blob["digest"] not in locked]
+
+
+def _delete_orphan_blob_statement(digest: str):
+    """
+    Deletes a report blob once no analysis refers to it any more. Run it after
+    locking the blob exclusively, so a save that is still using it commits first.
+    """
+    return delete(models.ReportBlob).where(
+        models.ReportBlob.digest == digest,
+        ~exists().where(models.Analysis.report_digest == digest)
+    )
+
+
+def _report_text(row) -> str | None:
+    """
+    Returns the report of a row selected with `_report_columns()`.
+    """
+    if row.codec is not None:
+        return report_store.decompress_report(row.codec, row.body)
+    return row.legacy_report_markdown
+
+
+def _report_columns():
+    """
+    The columns `_report_text` reads; select them with an outer join on the blob
+    (see `_with_report_blob`).
+    """
+    return models.Analysis.legacy_report_markdown, models.ReportBlob.codec, models.ReportBlob.body
+
+
+def _with_report_blob(query):
+    return query.outerjoin(models.ReportBlob, models.ReportBlob.digest == models.Analysis.report_digest)
+
+
+def _new_analysis(analysis: schemas.AnalysisCreate, user_id: int):
+    """
+    Builds an unsaved analysis row with its memory digest and embedding, and the
+    blob row of its report, which must be inserted first.
+    Returns the row, the embedding vector (for adding to the memory index once saved)
+    and the blob row.
+    """
+    digest = memory.build_report_digest(analysis.report_markdown)
+    vector = memory.embed_text(f"{analysis.idea_prompt}\n{analysis.report_markdown}")
+    blob = _report_blob_row(analysis.report_markdown)
+    db_analysis = models.Analysis(
+        idea_prompt=analysis.idea_prompt,
+        report_digest=blob["digest"],
+        memory_digest=digest,
+        embedding=memory.embedding_to_bytes(vector),
+        token_usage=analysis.token_usage,
+        stage_models=analysis.stage_models,
+        owner_id=user_id
+    )
+    return db_analysis, vector, blob
+
+
 def save_analysis(db: Session, analysis: schemas.AnalysisCreate, user_id: int) -> models.Analysis:
     """
     Saves a new analysis report to the database for a specific user.
@@ -98,29 +222,213 @@ def save_analysis(db: Session, analysis: schemas.AnalysisCreate, user_id: int) -
     Returns:
         models.Analysis: The newly created analysis object.
     """
-    db_analysis = models.Analysis(
-        idea_prompt=analysis.idea_prompt,
-        report_markdown=analysis.report_markdown,
-        owner_id=user_id
-    )
+    db_analysis, vector, blob = _new_analysis(analysis, user_id)
+    _store_report_blobs(db, [blob])
     db.add(db_analysis)
     db.commit()
     db.refresh(db_analysis)
+    memory.memory_index.add(user_id, db_analysis.id, vector)
     return db_analysis
 
 
-def get_analyses_by_user(db: Session, user_id: int) -> list[models.Analysis]:
+def save_analyses(db: Session, analyses: list[schemas.AnalysisCreate], user_id: int) -> list[int]:
+    """
+    Saves several analysis reports for a user in one transaction.
+
+    The rows are flushed together, so SQLAlchemy sends them as one multi-row INSERT,
+    and their IDs are read before the commit instead of refreshing every row after it.
+    Their report blobs go in one INSERT before them.
+
+    Args:
+        db (Session): The database session.
+        analyses (list[schemas.AnalysisCreate]): The analyses to save.
+        user_id (int): The ID of the user who owns them.
+
+    Returns:
+        list[int]: The IDs of the new analyses, in the order given.
+    """
+    rows = [_new_analysis(analysis, user_id) for analysis in analyses]
+    _store_report_blobs(db, [blob for _, _, blob in rows])
+    db.add_all([db_analysis for db_analysis, _, _ in rows])
+    db.flush()
+    ids = [db_analysis.id for db_analysis, _, _ in rows]
+    db.commit()
+    for analysis_id, (_, vector, _) in zip(ids, rows):
+        memory.memory_index.add(user_id, analysis_id, vector)
+    return ids
+
+
+def _legacy_digest_source():
+    """
+    For legacy rows without a digest, selects a bounded prefix of the report
+    to build one from, instead of the whole body.
+    """
+    return case(
+        (models.Analysis.memory_digest.is_(None),
+         func.substr(models.Analysis.legacy_report_markdown, 1, memory.LEGACY_DIGEST_SOURCE_CHARS)),
+        else_=None
+    )
+
+
+def _unindexed_embeddings_query(user_id: int, after_id: int):
+    """
+    Builds the query for a user's analyses not yet loaded into this worker's memory index.
+    """
+    return select(
+        models.Analysis.id, models.Analysis.embedding, models.Analysis.idea_prompt,
+        models.Analysis.memory_digest, _legacy_digest_source()
+    ).where(
+        models.Analysis.owner_id == user_id, models.Analysis.id > after_id
+    ).order_by(models.Analysis.id)
+
+
+def _index_rows(user_id: int, rows) -> None:
+    """
+    Loads embedding query rows into the memory index. Rows saved before embeddings
+    existed are embedded from their idea and digest on the fly.
+    """
+    vectors = []
+    for analysis_id, embedding, idea, digest, legacy in rows:
+        vector = memory.embedding_from_bytes(embedding)
+        if vector is None:
+            vector = memory.embed_text(f"{idea}\n{digest if digest is not None else legacy or ''}")
+        vectors.append((analysis_id, vector))
+    memory.memory_index.sync(user_id, vectors)
+
+
+def _digests_by_id_query(user_id: int, analysis_ids: list[int]):
+    """
+    Builds the query for the digests of specific analyses owned by a user.
+    """
+    return select(
+        models.Analysis.id, models.Analysis.idea_prompt, models.Analysis.memory_digest, _legacy_digest_source()
+    ).where(models.Analysis.owner_id == user_id, models.Analysis.id.in_(analysis_ids))
+
+
+def _ranked_digest_pairs(user_id: int, hits: list[tuple[int, float]], rows) -> list[tuple[str, str]]:
     """
-    Retrieves all analyses for a specific user, ordered by most recent first.
+    Orders digest rows by search rank, building missing digests on the fly.
+    Hits whose row is gone (deleted by another worker) are dropped from the index.
+    """
+    by_id = {analysis_id: (idea, digest, legacy) for analysis_id, idea, digest, legacy in rows}
+    pairs = []
+    for analysis_id, _ in hits:
+        if analysis_id not in by_id:
+            memory.memory_index.remove(user_id, analysis_id)
+            continue
+        idea, digest, legacy = by_id[analysis_id]
+        pairs.append((idea, digest if digest is not None else memory.build_report_digest(legacy or "")))
+    return pairs
+
+
+def get_relevant_digests(db: Session, user_id: int, query: str, limit: int = memory.MEMORY_HISTORY_LIMIT) -> list[tuple[str, str]]:
+    """
+    Retrieves the memory digests of the user's past analyses most similar to `query`.
+
+    The worker's memory index is first topped up with any analyses saved since it
+    was last synced (usually none), then searched; only the winners' digests are read.
 
     Args:
         db (Session): The database session.
-        user_id (int): The ID of the user whose analyses are to be fetched.
+        user_id (int): The ID of the user.
+        query (str): The text to rank past analyses against (the new idea or question).
+        limit (int): The maximum number of analyses to return.
+
+    Returns:
+        list[tuple[str, str]]: (idea_prompt, digest) pairs, most relevant first.
+    """
+    _index_rows(user_id, db.execute(_unindexed_embeddings_query(user_id, memory.memory_index.synced_through(user_id))).all())
+    hits = memory.memory_index.search(user_id, memory.embed_text(query), limit)
+    if not hits:
+        return []
+    rows = db.execute(_digests_by_id_query(user_id, [analysis_id for analysis_id, _ in hits])).all()
+    return _ranked_digest_pairs(user_id, hits, rows)
+
+
+def encode_history_cursor(created_at: datetime.datetime, analysis_id: int) -> str:
+    """
+    Encodes the keyset position of a history row into an opaque cursor string.
+
+    Args:
+        created_at (datetime.datetime): The row's creation timestamp.
+        analysis_id (int): The row's ID, which breaks ties between equal timestamps.
+
+    Returns:
+        str: A URL-safe cursor.
+    """
+    raw = f"{created_at.isoformat()}|{analysis_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    """
+    Decodes a cursor produced by `encode_history_cursor`.
+
+    Args:
+        cursor (str): The opaque cursor string.
 
     Returns:
-        list[models.Analysis]: A list of analysis objects.
+        Tuple[datetime.datetime, int]: The (created_at, id) position.
+
+    Raises:
+        ValueError: If the cursor is malformed.
     """
-    return db.query(models.Analysis).filter(models.Analysis.owner_id == user_id).order_by(models.Analysis.created_at.desc()).all()
+    try:
+        created_at, analysis_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").rsplit("|", 1)
+        return datetime.datetime.fromisoformat(created_at), int(analysis_id)
+    except Exception as e:
+        raise ValueError("Invalid history cursor.") from e
+
+
+def _analysis_summaries_query(user_id: int, limit: int, before: Optional[Tuple[datetime.datetime, int]]):
+    """
+    Builds the keyset query for one page of summaries, newest first.
+    Only the listing columns are selected; the report body is never read.
+    """
+    query = select(models.Analysis.id, models.Analysis.idea_prompt, models.Analysis.created_at).where(
+        models.Analysis.owner_id == user_id
+    )
+    if before is not None:
+        created_at, analysis_id = before
+        query = query.where(or_(
+            models.Analysis.created_at < created_at,
+            and_(models.Analysis.created_at == created_at, models.Analysis.id < analysis_id)
+        ))
+    return query.order_by(models.Analysis.created_at.desc(), models.Analysis.id.desc()).limit(limit)
+
+
+def get_analysis_summaries(db: Session, user_id: int, limit: int, before: Optional[Tuple[datetime.datetime, int]] = None) -> list:
+    """
+    Retrieves one page of a user's analysis summaries using keyset pagination on (created_at, id).
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the user whose analyses are to be listed.
+        limit (int): The maximum number of rows to return.
+        before (Optional[Tuple[datetime.datetime, int]]): Only return rows older than this position.
+
+    Returns:
+        list: Rows with `id`, `idea_prompt` and `created_at`, most recent first.
+    """
+    return db.execute(_analysis_summaries_query(user_id, limit, before)).all()
+
+
+def get_analysis_by_id(db: Session, analysis_id: int, user_id: int) -> models.Analysis | None:
+    """
+    Retrieves a single full analysis, ensuring it belongs to the requesting user.
+
+    Args:
+        db (Session): The database session.
+        analysis_id (int): The ID of the analysis.
+        user_id (int): The ID of the requesting user, for ownership verification.
+
+    Returns:
+        models.Analysis | None: The analysis if found and owned by the user, otherwise None.
+    """
+    return db.query(models.Analysis).options(*FULL_ANALYSIS_OPTIONS).filter(
+        models.Analysis.id == analysis_id,
+        models.Analysis.owner_id == user_id
+    ).first()
 
 
 def delete_analysis(db: Session, analysis_id: int, user_id: int) -> dict | None:
@@ -142,10 +450,448 @@ def delete_analysis(db: Session, analysis_id: int, user_id: int) -> dict | None:
     ).first()
     
     if db_analysis:
+        digest = db_analysis.report_digest
+        if digest is not None:
+            # Lock the blob before the analysis goes, like the saves do, so a save of
+            # the same report either commits before the orphan check or re-inserts it.
+            db.execute(_lock_report_blobs_statement([digest], shared=False))
         db.delete(db_analysis)
+        if digest is not None:
+            db.flush()
+            db.execute(_delete_orphan_blob_statement(digest))
         db.commit()
+        memory.memory_index.remove(user_id, analysis_id)
         return {"ok": True}
     
     # Return None if the analysis doesn't exist or the user is not the owner.
     return None
 
+
+def move_legacy_reports(db: Session, batch_size: int = 200) -> int:
+    """
+    Moves the inline report bodies of older analyses into `report_blobs`, one
+    batch per transaction, and clears them from `analyses`.
+
+    Args:
+        db (Session): The database session.
+        batch_size (int): Analyses moved per transaction.
+
+    Returns:
+        int: The number of analyses moved.
+    """
+    moved = 0
+    while True:
+        rows = db.execute(
+            select(models.Analysis.id, models.Analysis.legacy_report_markdown).where(
+                models.Analysis.report_digest.is_(None), models.Analysis.legacy_report_markdown.is_not(None)
+            ).limit(batch_size)
+        ).all()
+        if not rows:
+            return moved
+        blobs = [_report_blob_row(report) for _, report in rows]
+        _store_report_blobs(db, blobs)
+        for (analysis_id, _), blob in zip(rows, blobs):
+            db.execute(update(models.Analysis).where(models.Analysis.id == analysis_id).values(
+                report_digest=blob["digest"], legacy_report_markdown=None
+            ))
+        db.commit()
+        moved += len(rows)
+
+
+# ==============================================================================
+# 4. ANALYSIS RUNS (STAGE CHECKPOINTS)
+# ==============================================================================
+# A run is the pending record of an analysis in progress. Every finished stage is
+# checkpointed into it, and it is swapped for a regular `Analysis` once the report is saved.
+
+def create_analysis_run(db: Session, idea_prompt: str, user_id: int, seeds: dict[str, str]) -> models.AnalysisRun:
+    """
+    Creates a pending run and checkpoints its seed values (e.g. the history context).
+
+    Args:
+        db (Session): The database session.
+        idea_prompt (str): The business idea being analyzed.
+        user_id (int): The ID of the user who owns the run.
+        seeds (dict[str, str]): Pipeline values the stages need besides the idea.
+
+    Returns:
+        models.AnalysisRun: The new run.
+    """
+    db_run = models.AnalysisRun(idea_prompt=idea_prompt, owner_id=user_id, status="pending")
+    db_run.stages = [models.AnalysisRunStage(stage_key=key, output=value) for key, value in seeds.items()]
+    db.add(db_run)
+    db.commit()
+    db.refresh(db_run)
+    return db_run
+
+
+def save_stage_output(db: Session, run_id: int, stage_key: str, output: str) -> None:
+    """
+    Checkpoints the output of a finished stage.
+
+    Args:
+        db (Session): The database session.
+        run_id (int): The ID of the run.
+        stage_key (str): The stage's key in the pipeline.
+        output (str): The stage output.
+    """
+    db.add(models.AnalysisRunStage(run_id=run_id, stage_key=stage_key, output=output))
+    db.commit()
+
+
+def _claim_run_statement(run_id: int, user_id: int):
+    """
+    Builds the update that moves a failed run back to pending. Only one caller
+    can win it, so a run is never resumed twice at the same time.
+    """
+    return update(models.AnalysisRun).where(
+        models.AnalysisRun.id == run_id,
+        models.AnalysisRun.owner_id == user_id,
+        models.AnalysisRun.status == "failed"
+    ).values(status="pending", error=None, updated_at=datetime.datetime.utcnow())
+
+
+def _run_outputs_query(run_id: int):
+    return select(models.AnalysisRunStage.stage_key, models.AnalysisRunStage.output).where(
+        models.AnalysisRunStage.run_id == run_id
+    )
+
+
+def claim_analysis_run(db: Session, run_id: int, user_id: int) -> tuple[str, dict[str, str]] | None:
+    """
+    Claims a failed run for resuming and loads its checkpoints.
+
+    Args:
+        db (Session): The database session.
+        run_id (int): The ID of the run.
+        user_id (int): The ID of the requesting user, for ownership verification.
+
+    Returns:
+        tuple[str, dict[str, str]] | None: The idea and the checkpointed values, or None if
+        the run does not exist, is not owned by the user, or is not in a resumable state.
+    """
+    claimed = db.execute(_claim_run_statement(run_id, user_id))
+    db.commit()
+    if claimed.rowcount != 1:
+        return None
+    idea_prompt = db.execute(select(models.AnalysisRun.idea_prompt).where(models.AnalysisRun.id == run_id)).scalar_one()
+    return idea_prompt, dict(db.execute(_run_outputs_query(run_id)).all())
+
+
+def fail_analysis_run(db: Session, run_id: int, error: str) -> None:
+    """
+    Marks a run as failed so it can be resumed later.
+
+    Args:
+        db (Session): The database session.
+        run_id (int): The ID of the run.
+        error (str): What stopped it.
+    """
+    db.execute(update(models.AnalysisRun).where(models.AnalysisRun.id == run_id).values(
+        status="failed", error=error, updated_at=datetime.datetime.utcnow()
+    ))
+    db.commit()
+
+
+def _delete_run_statements(run_id: int):
+    return (
+        delete(models.AnalysisRunStage).where(models.AnalysisRunStage.run_id == run_id),
+        delete(models.AnalysisRun).where(models.AnalysisRun.id == run_id),
+    )
+
+
+def complete_analysis_run(db: Session, run_id: int, analysis: schemas.AnalysisCreate, user_id: int) -> models.Analysis:
+    """
+    Saves the finished analysis and deletes its run and checkpoints, in one transaction.
+
+    Args:
+        db (Session): The database session.
+        run_id (int): The ID of the finished run.
+        analysis (schemas.AnalysisCreate): The analysis data to be saved.
+        user_id (int): The ID of the user who owns this analysis.
+
+    Returns:
+        models.Analysis: The newly created analysis object.
+    """
+    db_analysis, vector, blob = _new_analysis(analysis, user_id)
+    _store_report_blobs(db, [blob])
+    db.add(db_analysis)
+    for statement in _delete_run_statements(run_id):
+        db.execute(statement)
+    db.commit()
+    db.refresh(db_analysis)
+    memory.memory_index.add(user_id, db_analysis.id, vector)
+    return db_analysis
+
+
+# ==============================================================================
+# 5. FOLLOW-UP CONVERSATIONS
+# ==============================================================================
+
+def _follow_up_analysis_query(analysis_id: int, user_id: int):
+    return _with_report_blob(select(models.Analysis.idea_prompt, *_report_columns())).where(
+        models.Analysis.id == analysis_id, models.Analysis.owner_id == user_id
+    )
+
+
+def _latest_turns_query(analysis_id: int, limit: int):
+    return select(models.FollowUpTurn.id, models.FollowUpTurn.question, models.FollowUpTurn.answer).where(
+        models.FollowUpTurn.analysis_id == analysis_id
+    ).order_by(models.FollowUpTurn.id.desc()).limit(limit)
+
+
+def _latest_turn_id_query(analysis_id: int):
+    return select(func.coalesce(func.max(models.FollowUpTurn.id), 0)).where(
+        models.FollowUpTurn.analysis_id == analysis_id
+    )
+
+
+def get_follow_up_state(db: Session, analysis_id: int, user_id: int, turn_limit: int) -> tuple[str, str, list[tuple[int, str, str]]] | None:
+    """
+    Loads what a follow-up session needs: the report and its latest turns.
+
+    Args:
+        db (Session): The database session.
+        analysis_id (int): The analysis the conversation is about.
+        user_id (int): The ID of the requesting user, for ownership verification.
+        turn_limit (int): The maximum number of (most recent) turns to load.
+
+    Returns:
+        tuple[str, str, list[tuple[int, str, str]]] | None: The idea, the report and the
+        (id, question, answer) turns oldest first, or None if the analysis is not the user's.
+    """
+    analysis = db.execute(_follow_up_analysis_query(analysis_id, user_id)).first()
+    if analysis is None:
+        return None
+    turns = db.execute(_latest_turns_query(analysis_id, turn_limit)).all()
+    return analysis.idea_prompt, _report_text(analysis), [tuple(turn) for turn in reversed(turns)]
+
+
+def get_latest_follow_up_turn_id(db: Session, analysis_id: int) -> int:
+    """
+    Returns the ID of the latest turn of a conversation (0 if there is none).
+    """
+    return db.execute(_latest_turn_id_query(analysis_id)).scalar_one()
+
+
+def save_follow_up_turn(db: Session, analysis_id: int, question: str, answer: str) -> int:
+    """
+    Stores a follow-up question and its answer.
+
+    Args:
+        db (Session): The database session.
+        analysis_id (int): The analysis the conversation is about.
+        question (str): The user's question.
+        answer (str): The answer given.
+
+    Returns:
+        int: The ID of the new turn.
+    """
+    turn = models.FollowUpTurn(analysis_id=analysis_id, question=question, answer=answer)
+    db.add(turn)
+    db.commit()
+    return turn.id
+
+
+# ==============================================================================
+# 6. ASYNC VARIANTS (FOR `async def` ENDPOINTS)
+# ==============================================================================
+# Each function accepts either an `AsyncSession` (PostgreSQL via asyncpg) or a regular
+# `Session` (SQLite dev). With a regular session the sync version above runs in a
+# worker thread, so callers never block the event loop either way.
+
+AnySession = Union[AsyncSession, Session]
+
+
+async def _run_sync(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Runs a sync CRUD function in a worker thread.
+    """
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+
+async def _store_report_blobs_async(db: AsyncSession, blobs: list[dict]) -> None:
+    """
+    Async version of `_store_report_blobs`.
+    """
+    while blobs:
+        await db.execute(_insert_report_blobs_statement(_dialect_name(db), blobs))
+        locked = set((await db.execute(_lock_report_blobs_statement([blob["digest"] for blob in blobs]))).scalars())
+        blobs = [blob for blob in blobs if blob["digest"] not in locked]
+
+
+async def get_user_by_email_async(db: AnySession, email: str) -> models.User | None:
+    """
+    Async version of `get_user_by_email`.
+    """
+    if not isinstance(db, AsyncSession):
+        return await _run_sync(get_user_by_email, db, email=email)
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    return result.scalars().first()
+
+
+async def authenticate_user_async(db: AnySession, email: str, password: str) -> models.User | None:
+    """
+    Async version of `authenticate_user`. The bcrypt check runs on the password process pool.
+    """
+    user = await get_user_by_email_async(db, email=email)
+    if not user:
+        return None
+    if not await auth.verify_password_async(password, user.hashed_password):
+        return None
+    return user
+
+
+async def save_analysis_async(db: AnySession, analysis: schemas.AnalysisCreate, user_id: int) -> models.Analysis:
+    """
+    Async version of `save_analysis`.
+    """
+    if not isinstance(db, AsyncSession):
+        return await _run_sync(save_analysis, db, analysis=analysis, user_id=user_id)
+    db_analysis, vector, blob = _new_analysis(analysis, user_id)
+    await _store_report_blobs_async(db, [blob])
+    db.add(db_analysis)
+    await db.commit()
+    await db.refresh(db_analysis)
+    memory.memory_index.add(user_id, db_analysis.id, vector)
+    return db_analysis
+
+
+async def save_analyses_async(db: AnySession, analyses: list[schemas.AnalysisCreate], user_id: int) -> list[int]:
+    """
+    Async version of `save_analyses`.
+    """
+    if not isinstance(db, AsyncSession):
+        return await _run_sync(save_analyses, db, analyses=analyses, user_id=user_id)
+    rows = [_new_analysis(analysis, user_id) for analysis in analyses]
+    await _store_report_blobs_async(db, [blob for _, _, blob in rows])
+    db.add_all([db_analysis for db_analysis, _, _ in rows])
+    await db.flush()
+    ids = [db_analysis.id for db_analysis, _, _ in rows]
+    await db.commit()
+    for analysis_id, (_, vector, _) in zip(ids, rows):
+        memory.memory_index.add(user_id, analysis_id, vector)
+    return ids
+
+
+async def get_relevant_digests_async(db: AnySession, user_id: int, query: str, limit: int = memory.MEMORY_HISTORY_LIMIT) -> list[tuple[str, str]]:
+    """
+    Async version of `get_relevant_digests`. Embedding and scoring run in a worker
+    thread, since a large index takes tens of milliseconds to score.
+    """
+    if not isinstance(db, AsyncSession):
+        return await _run_sync(get_relevant_digests, db, user_id=user_id, query=query, limit=limit)
+    result = await db.execute(_unindexed_embeddings_query(user_id, memory.memory_index.synced_through(user_id)))
+    rows = result.all()
+
+    def index_and_search() -> list[tuple[int, float]]:
+        _index_rows(user_id, rows)
+        return memory.memory_index.search(user_id, memory.embed_text(query), limit)
+
+    hits = await _run_sync(index_and_search)
+    if not hits:
+        return []
+    result = await db.execute(_digests_by_id_query(user_id, [analysis_id for analysis_id, _ in hits]))
+    return _ranked_digest_pairs(user_id, hits, result.all())
+
+
+async def create_analysis_run_async(db: AnySession, idea_prompt: str, user_id: int, seeds: dict[str, str]) -> models.AnalysisRun:
+    """
+    Async version of `create_analysis_run`.
+    """
+    if not isinstance(db, AsyncSession):
+        return await _run_sync(create_analysis_run, db, idea_prompt=idea_prompt, user_id=user_id, seeds=seeds)
+    db_run = models.AnalysisRun(idea_prompt=idea_prompt, owner_id=user_id, status="pending")
+    db_run.stages = [models.AnalysisRunStage(stage_key=key, output=value) for key, value in seeds.items()]
+    db.add(db_run)
+    await db.commit()
+    await db.refresh(db_run)
+    return db_run
+
+
+async def save_stage_output_async(db: AnySession, run_id: int, stage_key: str, output: str) -> None:
+    """
+    Async version of `save_stage_output`.
+    """
+    if not isinstance(db, AsyncSession):
+        return await _run_sync(save_stage_output, db, run_id=run_id, stage_key=stage_key, output=output)
+    db.add(models.AnalysisRunStage(run_id=run_id, stage_key=stage_key, output=output))
+    await db.commit()
+
+
+async def claim_analysis_run_async(db: AnySession, run_id: int, user_id: int) -> tuple[str, dict[str, str]] | None:
+    """
+    Async version of `claim_analysis_run`.
+    """
+    if not isinstance(db, AsyncSession):
+        return await _run_sync(claim_analysis_run, db, run_id=run_id, user_id=user_id)
+    claimed = await db.execute(_claim_run_statement(run_id, user_id))
+    await db.commit()
+    if claimed.rowcount != 1:
+        return None
+    idea_prompt = (await db.execute(select(models.AnalysisRun.idea_prompt).where(models.AnalysisRun.id == run_id))).scalar_one()
+    outputs = await db.execute(_run_outputs_query(run_id))
+    return idea_prompt, dict(outputs.all())
+
+
+async def fail_analysis_run_async(db: AnySession, run_id: int, error: str) -> None:
+    """
+    Async version of `fail_analysis_run`.
+    """
+    if not isinstance(db, AsyncSession):
+        return await _run_sync(fail_analysis_run, db, run_id=run_id, error=error)
+    await db.execute(update(models.AnalysisRun).where(models.AnalysisRun.id == run_id).values(
+        status="failed", error=error, updated_at=datetime.datetime.utcnow()
+    ))
+    await db.commit()
+
+
+async def complete_analysis_run_async(db: AnySession, run_id: int, analysis: schemas.AnalysisCreate, user_id: int) -> models.Analysis:
+    """
+    Async version of `complete_analysis_run`.
+    """
+    if not isinstance(db, AsyncSession):
+        return await _run_sync(complete_analysis_run, db, run_id=run_id, analysis=analysis, user_id=user_id)
+    db_analysis, vector, blob = _new_analysis(analysis, user_id)
+    await _store_report_blobs_async(db, [blob])
+    db.add(db_analysis)
+    for statement in _delete_run_statements(run_id):
+        await db.execute(statement)
+    await db.commit()
+    await db.refresh(db_analysis)
+    memory.memory_index.add(user_id, db_analysis.id, vector)
+    return db_analysis
+
+
+async def get_follow_up_state_async(db: AnySession, analysis_id: int, user_id: int, turn_limit: int) -> tuple[str, str, list[tuple[int, str, str]]] | None:
+    """
+    Async version of `get_follow_up_state`.
+    """
+    if not isinstance(db, AsyncSession):
+        return await _run_sync(get_follow_up_state, db, analysis_id=analysis_id, user_id=user_id, turn_limit=turn_limit)
+    analysis = (await db.execute(_follow_up_analysis_query(analysis_id, user_id))).first()
+    if analysis is None:
+        return None
+    turns = (await db.execute(_latest_turns_query(analysis_id, turn_limit))).all()
+    return analysis.idea_prompt, _report_text(analysis), [tuple(turn) for turn in reversed(turns)]
+
+
+async def get_latest_follow_up_turn_id_async(db: AnySession, analysis_id: int) -> int:
+    """
+    Async version of `get_latest_follow_up_turn_id`.
+    """
+    if not isinstance(db, AsyncSession):
+        return await _run_sync(get_latest_follow_up_turn_id, db, analysis_id=analysis_id)
+    return (await db.execute(_latest_turn_id_query(analysis_id))).scalar_one()
+
+
+async def save_follow_up_turn_async(db: AnySession, analysis_id: int, question: str, answer: str) -> int:
+    """
+    Async version of `save_follow_up_turn`.
+    """
+    if not isinstance(db, AsyncSession):
+        return await _run_sync(save_follow_up_turn, db, analysis_id=analysis_id, question=question, answer=answer)
+    turn = models.FollowUpTurn(analysis_id=analysis_id, question=question, answer=answer)
+    db.add(turn)
+    await db.commit()
+    return turn.id
@@ -3,11 +3,18 @@
 # ==============================================================================
 # --- Standard Library Imports ---
 import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Union
 
 # --- Third-party Library Imports ---
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+# --- Local Application Imports ---
+from .metrics import DB_QUERY_DURATION
 
 
 # ==============================================================================
@@ -19,6 +26,28 @@ from sqlalchemy.orm import sessionmaker
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./venturemind.db")
 
 
+def _to_async_url(url: str) -> Optional[str]:
+    """
+    Derives the asyncpg URL for a PostgreSQL connection string.
+
+    Args:
+        url (str): The synchronous database URL.
+
+    Returns:
+        Optional[str]: The async URL, or None for databases that stay on the sync path (e.g. SQLite).
+    """
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            # asyncpg spells the libpq 'sslmode' option as 'ssl'.
+            return "postgresql+asyncpg://" + url[len(prefix):].replace("sslmode=", "ssl=")
+    return None
+
+
+# The async engine is used for PostgreSQL. It can be overridden (or disabled with an
+# empty value) through ASYNC_DATABASE_URL. SQLite keeps using the sync engine in a thread.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _to_async_url(DATABASE_URL) or "")
+
+
 # ==============================================================================
 # 3. DATABASE ENGINE & SESSION SETUP
 # ==============================================================================
@@ -38,6 +67,38 @@ engine = create_engine(
 # bind=engine: Connects the session factory to our database engine.
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# --- Async Engine & Session Maker ---
+# Used by the `async def` endpoints so database round-trips never block the event loop.
+# expire_on_commit=False: objects stay readable after commit without an implicit (sync) refresh.
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DATABASE_URL:
+    try:
+        async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_pre_ping=True)
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    except ImportError as e:
+        # The async driver is not installed; fall back to the sync engine in a thread.
+        print(f"Async database driver unavailable, using the sync engine: {e}")
+
+# --- Query Timing ---
+# Every statement, from either engine, is timed into the `db_query_duration_seconds`
+# histogram, labelled by its SQL verb (SELECT, INSERT, ...).
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    # Stored on the statement's execution context, which is discarded if the statement fails.
+    context._query_start_time = time.perf_counter()
+
+
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    start_time = getattr(context, "_query_start_time", None)
+    if start_time is not None:
+        operation = statement.split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_QUERY_DURATION.observe(time.perf_counter() - start_time, operation=operation)
+
+
+for _timed_engine in filter(None, (engine, async_engine.sync_engine if async_engine is not None else None)):
+    event.listen(_timed_engine, "before_cursor_execute", _start_query_timer)
+    event.listen(_timed_engine, "after_cursor_execute", _stop_query_timer)
+
 # --- Declarative Base ---
 # A factory function that constructs a base class for declarative class definitions.
 # Our ORM models (like User, Analysis) will inherit from this class.
@@ -45,7 +106,45 @@ Base = declarative_base()
 
 
 # ==============================================================================
-# 4. DATABASE DEPENDENCY
+# 4. SCHEMA SYNC
+# ==============================================================================
+
+def sync_schema(bind=None) -> None:
+    """
+    Creates missing tables and, for tables that already exist, missing nullable
+    columns and indexes.
+
+    `create_all` alone skips existing tables entirely, so columns and indexes added
+    to a model later would never reach databases created before them. Only additive,
+    backwards-compatible changes are applied; anything else needs a real migration.
+
+    Args:
+        bind: The engine to use. Defaults to the application engine.
+    """
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            if not column.nullable:
+                print(f"Cannot add NOT NULL column {table.name}.{column.name} automatically; migrate it manually.")
+                continue
+            column_type = column.type.compile(dialect=bind.dialect)
+            with bind.begin() as connection:
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=bind)
+
+
+# ==============================================================================
+# 5. DATABASE DEPENDENCY
 # ==============================================================================
 
 def get_db():
@@ -66,3 +165,49 @@ def get_db():
         # Always close the session to release the connection back to the connection pool.
         db.close()
 
+
+@asynccontextmanager
+async def async_session_scope() -> AsyncIterator[Union[AsyncSession, Session]]:
+    """
+    Opens a session for async code, e.g. streaming generators that outlive the request dependencies.
+
+    Yields an `AsyncSession` when the async engine is configured and a regular
+    `Session` otherwise (SQLite dev). The async helpers in `crud` accept either.
+
+    Yields:
+        AsyncSession | Session: A new database session.
+    """
+    if AsyncSessionLocal is None:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+    else:
+        async with AsyncSessionLocal() as db:
+            yield db
+
+
+async def get_async_db():
+    """
+    A FastAPI dependency that provides a session for `async def` endpoints.
+
+    Yields:
+        AsyncSession | Session: A new database session, see `async_session_scope`.
+    """
+    async with async_session_scope() as db:
+        yield db
+
+
+# Syncs the schema once, e.g. as a release step before starting workers with
+# SYNC_SCHEMA_ON_STARTUP=false:  python -m app.database
+# It also moves the report bodies of older analyses into the compressed blob table.
+if __name__ == "__main__":
+    # Run as a script, this file is `__main__`, not `app.database`: use the package's
+    # module, whose Base the models are registered on.
+    from . import models, database, crud
+    database.sync_schema()
+    print("Database schema is up to date.")
+    with database.SessionLocal() as db:
+        moved = crud.move_legacy_reports(db)
+    print(f"Moved {moved} inline reports to report_blobs.")
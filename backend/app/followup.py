@@ -0,0 +1,203 @@
+# ==============================================================================
+# 1. IMPORTS
+# ==============================================================================
+# --- Standard Library Imports ---
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Iterable, Optional, Tuple
+
+# --- Local Application Imports ---
+from . import crud, memory
+
+
+# ==============================================================================
+# 2. CONFIGURATION CONSTANTS
+# ==============================================================================
+# Latest Q&A turns quoted verbatim in the prompt. Older turns are folded into the summary.
+FOLLOW_UP_RECENT_TURNS = int(os.getenv("FOLLOW_UP_RECENT_TURNS", "3"))
+
+# Longest answer quoted verbatim; longer ones are cut at a word boundary.
+FOLLOW_UP_TURN_MAX_CHARS = int(os.getenv("FOLLOW_UP_TURN_MAX_CHARS", "1500"))
+
+# Size of the rolling summary of older turns, and of each turn's line in it.
+# Once the summary is full, the oldest lines are dropped.
+FOLLOW_UP_SUMMARY_MAX_CHARS = int(os.getenv("FOLLOW_UP_SUMMARY_MAX_CHARS", "1200"))
+FOLLOW_UP_SUMMARY_TURN_CHARS = 240
+
+# Sessions kept in memory per worker process, and how long an idle one is kept.
+FOLLOW_UP_MAX_SESSIONS = int(os.getenv("FOLLOW_UP_MAX_SESSIONS", "256"))
+FOLLOW_UP_SESSION_TTL_SECONDS = int(os.getenv("FOLLOW_UP_SESSION_TTL_SECONDS", "1800"))
+
+# Turns read back from the database to rebuild a session: the verbatim ones plus
+# as many as can still be represented in the summary.
+FOLLOW_UP_LOAD_TURNS = FOLLOW_UP_RECENT_TURNS + FOLLOW_UP_SUMMARY_MAX_CHARS // FOLLOW_UP_SUMMARY_TURN_CHARS
+
+
+# ==============================================================================
+# 3. SESSION
+# ==============================================================================
+
+def compact_turn(question: str, answer: str) -> str:
+    """
+    Reduces a Q&A turn to one line for the rolling summary.
+    """
+    return f"- Q: {memory.truncate_text(question, 120)} A: {memory.build_report_digest(answer, FOLLOW_UP_SUMMARY_TURN_CHARS)}"
+
+
+@dataclass
+class FollowUpSession:
+    """
+    A conversation about one analysis: the report, a compacted summary of older
+    turns and the latest turns verbatim. The prompt built from it stays bounded
+    however long the conversation gets.
+    """
+    analysis_id: int
+    owner_id: int
+    idea: str
+    report: str
+    last_turn_id: int = 0
+    recent_turns: Deque[Tuple[str, str]] = field(default_factory=deque)
+    summary_lines: Deque[str] = field(default_factory=deque)
+    expires_at: float = 0.0
+    # Turns of one session are answered one at a time, so each sees the previous one.
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    def add_turn(self, turn_id: int, question: str, answer: str) -> None:
+        """
+        Records a turn, folding the oldest verbatim turns into the summary.
+        """
+        self.last_turn_id = max(self.last_turn_id, turn_id)
+        self.recent_turns.append((question, answer))
+        while len(self.recent_turns) > FOLLOW_UP_RECENT_TURNS:
+            self.summary_lines.append(compact_turn(*self.recent_turns.popleft()))
+        while sum(len(line) + 1 for line in self.summary_lines) > FOLLOW_UP_SUMMARY_MAX_CHARS:
+            self.summary_lines.popleft()
+
+    def conversation_context(self) -> str:
+        """
+        Builds the conversation block for the next question.
+
+        Returns:
+            str: The summary of older turns and the latest turns, or "" before the first turn.
+        """
+        parts = []
+        if self.summary_lines:
+            parts.append("--- EARLIER IN THIS CONVERSATION (SUMMARY) ---\n" + "\n".join(self.summary_lines))
+        if self.recent_turns:
+            turns = "\n\n".join(
+                f"User: {question}\nAssistant: {memory.truncate_text(answer, FOLLOW_UP_TURN_MAX_CHARS)}"
+                for question, answer in self.recent_turns
+            )
+            parts.append("--- MOST RECENT QUESTIONS AND ANSWERS ---\n" + turns)
+        return "\n\n".join(parts)
+
+
+# ==============================================================================
+# 4. SESSION STORE
+# ==============================================================================
+
+class FollowUpSessionStore:
+    """
+    An in-memory TTL + LRU cache of follow-up sessions, keyed by analysis ID.
+
+    The turns themselves are stored in the database, so a session evicted here
+    (or started in another worker) is rebuilt from its latest turns.
+    """
+
+    def __init__(self, max_sessions: int = FOLLOW_UP_MAX_SESSIONS, ttl_seconds: int = FOLLOW_UP_SESSION_TTL_SECONDS):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[int, FollowUpSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, analysis_id: int, owner_id: int) -> Optional[FollowUpSession]:
+        """
+        Returns a live session for the analysis if this worker has one.
+        """
+        with self._lock:
+            session = self._sessions.get(analysis_id)
+            if session is None or session.owner_id != owner_id or session.expires_at <= time.monotonic():
+                self.misses += 1
+                return None
+            self._sessions.move_to_end(analysis_id)
+            session.expires_at = time.monotonic() + self.ttl_seconds
+            self.hits += 1
+            return session
+
+    def put(self, session: FollowUpSession) -> None:
+        """
+        Stores a session, evicting the least recently used ones if full.
+        """
+        session.expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._sessions[session.analysis_id] = session
+            self._sessions.move_to_end(session.analysis_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def invalidate(self, analysis_id: int) -> None:
+        """
+        Drops a session, e.g. when its analysis is deleted.
+        """
+        with self._lock:
+            self._sessions.pop(analysis_id, None)
+
+    def stats(self) -> dict:
+        """
+        Returns the hit/miss counters and the current number of sessions.
+        """
+        with self._lock:
+            return {"sessions": len(self._sessions), "hits": self.hits, "misses": self.misses}
+
+
+def build_session(analysis_id: int, owner_id: int, idea: str, report: str,
+                  turns: Iterable[Tuple[int, str, str]]) -> FollowUpSession:
+    """
+    Rebuilds a session from stored turns, oldest first.
+    """
+    session = FollowUpSession(analysis_id=analysis_id, owner_id=owner_id, idea=idea, report=report or "")
+    for turn_id, question, answer in turns:
+        session.add_turn(turn_id, question, answer)
+    return session
+
+
+async def get_session(db: crud.AnySession, analysis_id: int, owner_id: int) -> Optional[FollowUpSession]:
+    """
+    Returns the follow-up session of an analysis, loading it from the database if this
+    worker has none or if another worker has added turns since it was cached.
+
+    Args:
+        db (crud.AnySession): The database session.
+        analysis_id (int): The analysis the conversation is about.
+        owner_id (int): The requesting user, for ownership verification.
+
+    Returns:
+        Optional[FollowUpSession]: The session, or None if the analysis does not exist or is not the user's.
+    """
+    session = follow_up_sessions.get(analysis_id, owner_id)
+    if session is not None:
+        latest_turn_id = await crud.get_latest_follow_up_turn_id_async(db, analysis_id)
+        if latest_turn_id == session.last_turn_id:
+            return session
+
+    state = await crud.get_follow_up_state_async(db, analysis_id, owner_id, turn_limit=FOLLOW_UP_LOAD_TURNS)
+    if state is None:
+        return None
+    idea, report, turns = state
+    fresh = build_session(analysis_id, owner_id, idea, report, turns)
+    if session is not None:
+        # Keep the existing lock so questions already waiting on it stay serialized.
+        fresh.lock = session.lock
+    follow_up_sessions.put(fresh)
+    return fresh
+
+
+# --- Shared Instance ---
+# One store per worker process, used by the follow-up endpoint.
+follow_up_sessions = FollowUpSessionStore()
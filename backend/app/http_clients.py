@@ -0,0 +1,147 @@
+# ==============================================================================
+# 1. IMPORTS
+# ==============================================================================
+# --- Standard Library Imports ---
+import importlib.util
+import os
+import threading
+from typing import Any, Optional
+
+# --- Third-party Library Imports ---
+import httpx
+
+
+# ==============================================================================
+# 2. CONFIGURATION CONSTANTS
+# ==============================================================================
+# Connections kept per worker process, shared by every LLM and search call.
+# LLM_WORKER_THREADS bounds how many calls are in flight, so the default covers it with room to spare.
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "32"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "16"))
+
+# How long an idle connection (and its TLS session) is kept for reuse, in seconds.
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "90"))
+
+# Timeouts, in seconds. The read timeout is the longest gap between two chunks of a
+# response, not the whole call, so it only needs to cover the model's first token.
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "10"))
+HTTP_READ_TIMEOUT_SECONDS = float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", "120"))
+HTTP_POOL_TIMEOUT_SECONDS = float(os.getenv("HTTP_POOL_TIMEOUT_SECONDS", "30"))
+
+# Negotiate HTTP/2 (one multiplexed connection per host) when the `h2` package is installed.
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+# ==============================================================================
+# 3. SHARED CLIENT
+# ==============================================================================
+
+class PooledHttpClient:
+    """
+    One keep-alive connection pool per worker process, used by the OpenAI client
+    and the search tool from every LLM worker thread (`httpx.Client` is thread-safe),
+    so connections and TLS sessions are reused across calls, stages and analyses.
+    The client is created on first use, after gunicorn forks.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.Client] = None
+        self._lock = threading.Lock()
+        self.http2 = False
+        self.requests = 0
+        self.errors = 0
+
+    def get(self) -> httpx.Client:
+        """
+        Returns the shared client, creating it on first use.
+        """
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self.http2 = HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+                    if HTTP2_ENABLED and not self.http2:
+                        print("HTTP/2 unavailable (the 'h2' package is not installed), using HTTP/1.1 keep-alive.")
+                    self._client = httpx.Client(
+                        http2=self.http2,
+                        limits=httpx.Limits(
+                            max_connections=HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+                        ),
+                        timeout=httpx.Timeout(
+                            connect=HTTP_CONNECT_TIMEOUT_SECONDS,
+                            read=HTTP_READ_TIMEOUT_SECONDS,
+                            write=HTTP_READ_TIMEOUT_SECONDS,
+                            pool=HTTP_POOL_TIMEOUT_SECONDS,
+                        ),
+                        event_hooks={"request": [self._on_request], "response": [self._on_response]},
+                    )
+        return self._client
+
+    def close(self) -> None:
+        """
+        Closes every pooled connection, if the client was created.
+        """
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    def stats(self) -> dict:
+        """
+        Returns the request counters and the state of the pooled connections.
+        """
+        connections = []
+        client = self._client
+        if client is not None:
+            # Reaches into httpcore's pool, as `llm_queue_depth` does with the executor queue.
+            connections = list(getattr(getattr(client._transport, "_pool", None), "connections", []))
+        return {
+            "http2": self.http2,
+            "requests": self.requests,
+            "errors": self.errors,
+            "connections": len(connections),
+            "idle_connections": sum(1 for connection in connections if connection.is_idle()),
+            "http2_connections": sum(1 for connection in connections if "HTTP/2" in connection.info()),
+        }
+
+    def _on_request(self, request: httpx.Request) -> None:
+        self.requests += 1
+
+    def _on_response(self, response: httpx.Response) -> None:
+        if response.status_code >= 500 or response.status_code == 429:
+            self.errors += 1
+
+
+# ==============================================================================
+# 4. POOLED SEARCH TOOL
+# ==============================================================================
+
+def pooled_tavily_search_tool() -> Any:
+    """
+    Builds the Tavily search tool on the shared connection pool.
+
+    LangChain's Tavily wrapper posts with a bare `requests.post`, which opens a new
+    connection (and TLS handshake) for every search; this one sends the same request
+    through the shared client instead.
+
+    Returns:
+        TavilySearchResults: The search tool.
+    """
+    # Imported here with the rest of the agent stack (see `agents.Agents`).
+    from langchain_community.tools.tavily_search import TavilySearchResults
+    from langchain_community.utilities.tavily_search import TAVILY_API_URL, TavilySearchAPIWrapper
+
+    class PooledTavilySearchAPIWrapper(TavilySearchAPIWrapper):
+        def raw_results(self, query: str, **kwargs: Any) -> dict:
+            params = {"api_key": self.tavily_api_key.get_secret_value(), "query": query, **kwargs}
+            response = http_client.get().post(f"{TAVILY_API_URL}/search", json=params)
+            response.raise_for_status()
+            return response.json()
+
+    return TavilySearchResults(api_wrapper=PooledTavilySearchAPIWrapper())
+
+
+# --- Shared Instance ---
+# One pool per worker process, shared by the LLM client and the search tool.
+http_client = PooledHttpClient()
@@ -0,0 +1,228 @@
+# ==============================================================================
+# 1. IMPORTS
+# ==============================================================================
+# --- Standard Library Imports ---
+import asyncio
+import os
+import time
+import uuid
+from collections import deque
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+
+# --- Local Application Imports ---
+from .metrics import ERRORS
+
+
+# ==============================================================================
+# 2. CONFIGURATION CONSTANTS
+# ==============================================================================
+# How long a job without subscribers keeps running (unless it asked to persist) before
+# it is cancelled, in seconds. Long enough to survive a reconnect or a page reload.
+JOB_ORPHAN_GRACE_SECONDS = float(os.getenv("JOB_ORPHAN_GRACE_SECONDS", "15"))
+
+# How long a finished job's event log stays available for replay, in seconds.
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "600"))
+
+# Events kept per job. A full analysis emits a few thousand token events; beyond this the
+# oldest are dropped and a late replay starts from the oldest event still kept.
+JOB_EVENT_LOG_MAX = int(os.getenv("JOB_EVENT_LOG_MAX", "20000"))
+
+
+# ==============================================================================
+# 3. JOB
+# ==============================================================================
+
+class Job:
+    """
+    A background run with an append-only, numbered event log.
+
+    The producer publishes events; any number of subscribers read the log from
+    a given event ID onwards and then follow it live, so a client that lost its
+    connection can resume exactly where it stopped.
+    """
+
+    def __init__(self, owner_id: int, persist: bool = False):
+        self.id = uuid.uuid4().hex
+        self.owner_id = owner_id
+        self.persist = persist
+        self.status = "running"  # running | completed | cancelled | failed
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.subscribers = 0
+        self._events: Deque[Tuple[int, dict]] = deque(maxlen=JOB_EVENT_LOG_MAX)
+        self._last_id = 0
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._orphan_timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status != "running"
+
+    def publish(self, data: dict) -> int:
+        """
+        Appends an event to the log and wakes the subscribers.
+
+        Returns:
+            int: The event's ID (sequential, starting at 1).
+        """
+        self._last_id += 1
+        self._events.append((self._last_id, data))
+        self._wake()
+        return self._last_id
+
+    async def subscribe(self, after_id: int = 0) -> AsyncIterator[Tuple[int, dict]]:
+        """
+        Yields (event_id, data) for every event after `after_id`, replaying the log
+        first and then following it until the job finishes.
+
+        Args:
+            after_id (int): The last event ID the client has seen (its Last-Event-ID).
+        """
+        self.subscribers += 1
+        self._cancel_orphan_timer()
+        try:
+            while True:
+                # Copy out the new events first: the log may grow while we yield.
+                pending = [event for event in self._events if event[0] > after_id]
+                for event_id, data in pending:
+                    after_id = event_id
+                    yield event_id, data
+                if self.done and after_id >= self._last_id:
+                    return
+                changed = self._changed
+                if after_id >= self._last_id:
+                    await changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0:
+                self._start_orphan_timer()
+
+    def cancel(self) -> None:
+        """
+        Stops the job's producer. Its cleanup runs and subscribers see the end of the log.
+        """
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def _wake(self) -> None:
+        # Swap in a fresh event so subscribers that are about to wait do not miss this wake-up.
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def _start_orphan_timer(self) -> None:
+        if self.done or self.persist or self._orphan_timer is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._orphan_timer = loop.call_later(JOB_ORPHAN_GRACE_SECONDS, self._cancel_if_orphaned)
+
+    def _cancel_orphan_timer(self) -> None:
+        if self._orphan_timer is not None:
+            self._orphan_timer.cancel()
+            self._orphan_timer = None
+
+    def _cancel_if_orphaned(self) -> None:
+        self._orphan_timer = None
+        if self.subscribers == 0 and not self.persist:
+            print(f"Cancelling job {self.id}: no subscribers for {JOB_ORPHAN_GRACE_SECONDS}s.")
+            self.cancel()
+
+
+# ==============================================================================
+# 4. JOB MANAGER
+# ==============================================================================
+
+class JobManager:
+    """
+    Runs jobs as event-loop tasks detached from any HTTP request, and keeps
+    finished jobs around for JOB_RETENTION_SECONDS so their logs can be replayed.
+
+    Jobs live in the worker process that created them; reconnecting clients must
+    reach the same worker (sticky sessions, or a single worker per host).
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+
+    def start(self, owner_id: int, events: AsyncGenerator[dict, None], persist: bool = False,
+              cleanup: Optional[Callable[[], Any]] = None) -> Job:
+        """
+        Starts a job that publishes everything `events` yields.
+
+        Args:
+            owner_id (int): The user the job belongs to.
+            events (AsyncGenerator[dict, None]): The producer of the job's events.
+            persist (bool): Keep running even when nobody is subscribed.
+            cleanup (Optional[Callable[[], Any]]): Called once the job ends, however it ends,
+                even if it is cancelled before the producer started.
+
+        Returns:
+            Job: The running job.
+        """
+        job = Job(owner_id, persist=persist)
+        self._jobs[job.id] = job
+        job._task = asyncio.get_running_loop().create_task(self._run(job, events, cleanup))
+        # A task cancelled before its first step never enters `_run`, so finish it here.
+        job._task.add_done_callback(lambda task: self._finish(job, cleanup))
+        # Nobody is subscribed yet; the creator is expected to subscribe right away.
+        job._start_orphan_timer()
+        return job
+
+    def get(self, job_id: str, owner_id: int) -> Optional[Job]:
+        """
+        Returns a job if it exists and belongs to `owner_id`.
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.owner_id != owner_id:
+            return None
+        return job
+
+    def stats(self) -> dict:
+        """
+        Returns the number of jobs by status and of connected subscribers.
+        """
+        by_status: Dict[str, int] = {}
+        for job in self._jobs.values():
+            by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {
+            "jobs": by_status,
+            "subscribers": sum(job.subscribers for job in self._jobs.values()),
+        }
+
+    async def _run(self, job: Job, events: AsyncGenerator[dict, None], cleanup: Optional[Callable[[], Any]]) -> None:
+        try:
+            async for data in events:
+                job.publish(data)
+            job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            job.publish({"type": "cancelled", "message": "The analysis was cancelled."})
+        except Exception as e:
+            job.status = "failed"
+            print(f"Job {job.id} failed: {e}")
+            ERRORS.inc(source="job")
+            job.publish({"type": "error", "message": f"Job failed: {e}"})
+        finally:
+            await events.aclose()
+            self._finish(job, cleanup)
+
+    def _finish(self, job: Job, cleanup: Optional[Callable[[], Any]]) -> None:
+        """
+        Runs the cleanup and schedules the job's removal, once per job.
+        """
+        if job.finished_at is not None:
+            return
+        if job.status == "running":  # Cancelled before `_run` started
+            job.status = "cancelled"
+            job.publish({"type": "cancelled", "message": "The analysis was cancelled."})
+        if cleanup is not None:
+            cleanup()
+        job.finished_at = time.time()
+        job._cancel_orphan_timer()
+        job._wake()
+        asyncio.get_running_loop().call_later(JOB_RETENTION_SECONDS, self._jobs.pop, job.id, None)
+
+
+# --- Shared Instance ---
+# One manager per worker process.
+job_manager = JobManager()
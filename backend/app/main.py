@@ -3,29 +3,39 @@
 # ==============================================================================
 # --- Standard Library Imports ---
 import os
-import json
+import time
 import asyncio
+from contextlib import asynccontextmanager
 from datetime import timedelta
-from typing import List, AsyncGenerator
+from typing import Awaitable, Callable, Dict, List, AsyncGenerator, Optional, Tuple
 
 # --- Third-party Library Imports ---
 from dotenv import load_dotenv
-from fastapi import FastAPI, Depends, HTTPException, status, Response
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, status, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from jose import JWTError, jwt
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from crewai import Agent, Task, Crew, Process
-from langchain_openai import ChatOpenAI
-from langchain_community.tools.tavily_search import TavilySearchResults
-import markdown2
-from weasyprint import HTML
 
 # --- Local Application Imports ---
-from . import models, schemas, crud, auth
-from .database import engine, get_db
+from . import models, schemas, crud, auth, memory, pdf_render, followup, metrics
+from .agents import PRELOAD_AGENTS, get_agents, get_agents_async
+from .http_clients import http_client
+from .model_routing import model_router
+from .database import engine, get_db, get_async_db, async_session_scope, sync_schema
+from .pipeline import Stage, PipelineError, run_pipeline
+from .rate_limits import RateLimitDecision, rate_limiter, tier_weight
+from .sse import event_stream_response
+from .token_budget import FOLLOW_UP_PROMPT_TOKEN_BUDGET, count_tokens, fit_to_budget, total_usage
+from .jobs import Job, job_manager
+from .report_cache import normalize_idea, report_cache
+from .search_cache import search_cache
+from .workers import (
+    admission, follow_up_admission, AdmissionController, AdmissionTicket, QueueFullError, QUEUE_FULL_RETRY_AFTER_SECONDS,
+    run_llm_call, llm_queue_depth
+)
 
 
 # ==============================================================================
@@ -35,78 +45,71 @@ from .database import engine, get_db
 load_dotenv()
 
 # --- Database Initialization ---
-# Create database tables based on the models defined
-models.Base.metadata.create_all(bind=engine)
-
-# --- LLM and Tool Initialization ---
-# Initialize the Tavily search tool for web searches
-search_tool = TavilySearchResults()
-
-# (UPDATED) Initialize a SINGLE, efficient LLM to be used by all agents
-llm = ChatOpenAI(
-    model="gpt-4.1-mini", 
-    temperature=0.7, 
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+# Tables are created (and indexes added since) when a worker starts, not at import.
+# Set SYNC_SCHEMA_ON_STARTUP=false when the schema is synced once per deploy instead
+# (`python -m app.database`), so scaled-out workers boot without touching it.
+SYNC_SCHEMA_ON_STARTUP = os.getenv("SYNC_SCHEMA_ON_STARTUP", "true").lower() in ("1", "true", "yes")
 
+# --- Batch Analyses ---
+# Most ideas one `/analyses/batch` request may contain.
+BATCH_MAX_IDEAS = int(os.getenv("BATCH_MAX_IDEAS", "50"))
 
-# ==============================================================================
-# 3. AI AGENT DEFINITIONS
-# ==============================================================================
-# --- Core Analysis Agents ---
-visionary_agent = Agent(
-    role='Creative Product Visionary',
-    goal='Develop a raw business idea into a grand, compelling vision.',
-    backstory="You are a highly optimistic product visionary...",
-    llm=llm,
-    allow_delegation=False,
-    verbose=False
-)
+# Ideas of one batch analysed at the same time (a request may ask for fewer). Each of
+# them still takes a slot from the admission controller, like a single analysis.
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "3"))
 
-market_analyst_agent = Agent(
-    role='Data-Driven Market Analyst',
-    goal='Use web search to find real-time data...',
-    backstory="You are a market analyst...",
-    llm=llm, # (UPDATED) Standardized to the single LLM instance
-    tools=[search_tool],
-    allow_delegation=False,
-    verbose=False
-)
+# Seconds a batch waits before asking again for a slot when the admission queue is full.
+BATCH_ADMISSION_RETRY_SECONDS = float(os.getenv("BATCH_ADMISSION_RETRY_SECONDS", "2"))
 
-critic_agent = Agent(
-    role='Realistic Risk Manager',
-    goal='Objectively identify all weaknesses...',
-    backstory="You are a meticulous and logical risk manager...",
-    llm=llm, # (UPDATED) Standardized to the single LLM instance
-    allow_delegation=False,
-    verbose=False
-)
-
-planner_agent = Agent(
-    role='Pragmatic Strategy Consultant',
-    goal='Synthesize all information into a final report.',
-    backstory='You are an expert at taking inputs from multiple sources...',
-    llm=llm,
-    allow_delegation=False,
-    verbose=False
-)
-
-# --- Follow-up Q&A Agent ---
-qna_agent = Agent(
-    role='Creative Strategist & Follow-up Specialist',
-    goal="Answer user questions and expand on ideas based on a provided report. Use your general knowledge and web search capabilities to provide creative, insightful, and forward-thinking answers.",
-    backstory="You are a brilliant strategic assistant. You use a provided report as the primary context, but you are encouraged to think beyond it, add new insights, perform web searches for new information, and help the user develop their original idea further.",
-    llm=llm,
-    tools=[search_tool],
-    allow_delegation=False,
-    verbose=False
-)
+# The LLM, the search tool and the agents are built lazily (see `agents.py`),
+# so importing this module does not load crewai or LangChain's integrations.
 
 
 # ==============================================================================
-# 4. FASTAPI APP & MIDDLEWARE
+# 3. FASTAPI APP & MIDDLEWARE
 # ==============================================================================
-app = FastAPI(title="VentureMind - AI Business Idea Analyst Server")
+def report_preload_failure(task: asyncio.Task) -> None:
+    """
+    Logs a failed agent preload. The agents are then built by the first request that needs them.
+    """
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Could not preload the agents: {task.exception()}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Prepares a worker process when it starts and stops its pools when it exits.
+    """
+    # --- Startup ---
+    if SYNC_SCHEMA_ON_STARTUP:
+        await asyncio.to_thread(sync_schema, engine)
+    # Starts sharing this worker's metrics with the other workers (see `/metrics`).
+    metrics.registry.start()
+    preload = None
+    if PRELOAD_AGENTS:
+        # In the background, so the worker starts serving (health checks, history, logins) right away.
+        preload = asyncio.create_task(asyncio.to_thread(get_agents))
+        preload.add_done_callback(report_preload_failure)
+    yield
+    # --- Shutdown ---
+    # Stops the bcrypt and PDF worker processes when the server shuts down.
+    auth.shutdown_password_pool()
+    pdf_render.shutdown_render_pool()
+    http_client.close()
+    metrics.registry.stop()
+
+app = FastAPI(title="VentureMind - AI Business Idea Analyst Server", lifespan=lifespan)
+
+# --- Metrics read from the objects that already track them ---
+metrics.registry.gauge("llm_queue_depth", "LLM calls waiting for a free worker thread.", function=llm_queue_depth)
+metrics.registry.gauge("analyses_active", "Analyses holding a slot.", function=lambda: admission.stats()["active"])
+metrics.registry.gauge("analyses_queued", "Analyses waiting for a slot.", function=lambda: admission.stats()["queued"])
+metrics.registry.gauge("jobs_running", "Background analysis jobs still running.",
+                       function=lambda: job_manager.stats()["jobs"].get("running", 0))
+metrics.registry.gauge("http_pool_connections", "Open connections in the shared LLM/search HTTP pool.",
+                       function=lambda: http_client.stats()["connections"])
+metrics.registry.gauge("http_pool_idle_connections", "Idle keep-alive connections in the shared HTTP pool.",
+                       function=lambda: http_client.stats()["idle_connections"])
 
 # Configure CORS to allow frontend requests
 origins = [
@@ -121,15 +124,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Job-Id", "RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "RateLimit-Policy", "Retry-After"],
 )
 
 
 # ==============================================================================
-# 5. PYDANTIC API MODELS
+# 4. PYDANTIC API MODELS
 # ==============================================================================
 class BusinessIdea(BaseModel):
     idea: str
     use_history: bool = False
+    # Skip the report cache and always run the full pipeline.
+    bypass_cache: bool = False
+    # Keep the job running to completion even if every client disconnects.
+    persist: bool = False
+
+class BatchAnalysisRequest(BaseModel):
+    ideas: List[str]
+    use_history: bool = False
+    bypass_cache: bool = False
+    # Ideas analysed at the same time, capped at BATCH_MAX_CONCURRENCY.
+    concurrency: Optional[int] = None
 
 class ReportPayload(BaseModel):
     markdown_content: str
@@ -139,14 +154,23 @@ class FollowUpQuery(BaseModel):
     question: str
     use_history: bool = False
 
+class FollowUpQuestion(BaseModel):
+    question: str
+    use_history: bool = False
+
 
 # ==============================================================================
-# 6. AUTHENTICATION DEPENDENCIES & LOGIC
+# 5. AUTHENTICATION DEPENDENCIES & LOGIC
 # ==============================================================================
-async def get_current_user(token: str = Depends(auth.oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(auth.oauth2_scheme), db: crud.AnySession = Depends(get_async_db)) -> auth.Principal:
     """
     Decodes the JWT token to get the current user based on their email.
+    Verified tokens are cached, so repeat requests skip the decode and the database lookup.
     """
+    cached_principal = auth.principal_cache.get(token)
+    if cached_principal is not None:
+        return cached_principal
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -161,24 +185,48 @@ async def get_current_user(token: str = Depends(auth.oauth2_scheme), db: Session
     except JWTError:
         raise credentials_exception
     
-    user = crud.get_user_by_email(db, email=token_data.email)
+    user = await crud.get_user_by_email_async(db, email=token_data.email)
     if user is None:
         raise credentials_exception
-    return user
+
+    principal = auth.Principal(id=user.id, email=user.email, username=user.username, tier=user.tier)
+    auth.principal_cache.put(token, principal, token_expires_at=float(payload.get("exp", 0)))
+    return principal
+
+def rate_limit(kind: str):
+    """
+    Builds a dependency that takes one token from the current user's bucket for
+    `kind` ("analysis" or "follow_up"), answering 429 with `Retry-After` when it is empty.
+
+    The `RateLimit-*` headers are set on the endpoint's response; endpoints that
+    return a response object themselves add `decision.headers()` to it.
+    """
+    async def check_rate_limit(response: Response, current_user: auth.Principal = Depends(get_current_user)) -> RateLimitDecision:
+        decision = rate_limiter.take(kind, current_user.id, current_user.tier)
+        if not decision.allowed:
+            metrics.RATE_LIMITED.inc(kind=kind)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit reached. Please try again later.",
+                headers=decision.headers(),
+            )
+        response.headers.update(decision.headers())
+        return decision
+    return check_rate_limit
 
 
 # ==============================================================================
-# 7. API ENDPOINTS
+# 6. API ENDPOINTS
 # ==============================================================================
 
 # --- Authentication Endpoints ---
 @app.post("/token", response_model=schemas.Token, tags=["Authentication"])
-async def login_for_access_token(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(db: crud.AnySession = Depends(get_async_db), form_data: OAuth2PasswordRequestForm = Depends()):
     """
     Authenticate user and return an access token.
     """
     # Frontend sends email in the 'username' field of the form
-    user = crud.authenticate_user(db, email=form_data.username, password=form_data.password)
+    user = await crud.authenticate_user_async(db, email=form_data.username, password=form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -208,312 +256,678 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return crud.create_user(db=db, user=user)
 
 # --- History Endpoints ---
-@app.get("/analyses/", response_model=List[schemas.Analysis], tags=["Analysis History"])
-def read_analyses_for_user(current_user: schemas.User = Depends(get_current_user), db: Session = Depends(get_db)):
+@app.get("/analyses/", response_model=schemas.AnalysisPage, tags=["Analysis History"])
+def read_analyses_for_user(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: auth.Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
     """
-    Retrieve all analyses for the current user.
+    Retrieve one page of the current user's analyses, newest first, without the report bodies.
+    Pass the returned `next_cursor` back as `cursor` to get the next page.
     """
-    return crud.get_analyses_by_user(db, user_id=current_user.id)
+    try:
+        before = crud.decode_history_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Fetch one extra row to know whether another page exists.
+    rows = crud.get_analysis_summaries(db, user_id=current_user.id, limit=limit + 1, before=before)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = crud.encode_history_cursor(rows[-1].created_at, rows[-1].id)
+    return {"items": rows, "next_cursor": next_cursor}
+
+@app.get("/analyses/{analysis_id}", response_model=schemas.Analysis, tags=["Analysis History"])
+def read_analysis(analysis_id: int, current_user: auth.Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Retrieve a single full analysis, including its report, belonging to the current user.
+    """
+    analysis = crud.get_analysis_by_id(db, analysis_id=analysis_id, user_id=current_user.id)
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Analysis not found.")
+    return analysis
 
 @app.delete("/analyses/{analysis_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Analysis History"])
-def delete_user_analysis(analysis_id: int, current_user: schemas.User = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_user_analysis(analysis_id: int, current_user: auth.Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     """
     Delete a specific analysis belonging to the current user.
     """
     result = crud.delete_analysis(db=db, analysis_id=analysis_id, user_id=current_user.id)
     if not result:
         raise HTTPException(status_code=404, detail="Analysis not found or you don't have permission to delete it.")
+    followup.follow_up_sessions.invalidate(analysis_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 # --- Feature Endpoints ---
-async def stream_analysis_generator(idea: str, use_history: bool, db: Session, user_id: int) -> AsyncGenerator[str, None]:
+def admit_request(user: auth.Principal, controller: AdmissionController = admission) -> AdmissionTicket:
     """
-    Improved streaming generator with better error handling and connection management.
+    Reserves an analysis (or follow-up) slot or queue position for a user, queued
+    fairly against other users by tier weight, rejecting early when the queue is full.
+    A rejected request gets its rate-limit token back.
     """
     try:
-        # Send initial connection confirmation
-        yield f"data: {json.dumps({'type': 'connection_established', 'message': 'Analysis starting...'})}\n\n"
-        
-        # Get history context if needed
-        history_context = ""
-        if use_history:
-            try:
-                recent_analyses = await asyncio.to_thread(crud.get_analyses_by_user, db, user_id)
-                if recent_analyses:
-                    history_summary = "\n".join([
-                        f"- Idea: '{an.idea_prompt}'. Key finding: {an.report_markdown[:150]}..." 
-                        for an in recent_analyses[:2]
-                    ])
-                    history_context = f"For context, this user has previously analyzed:\n{history_summary}\nKeep these past analyses in mind when creating the new vision."
-            except Exception as e:
-                print(f"Error fetching history: {e}")
-                # Continue without history context
-
-        # --- Task 1: Visionary ---
-        try:
-            yield f"data: {json.dumps({'type': 'agent_start', 'agent': 'Creative Product Visionary'})}\n\n"
-            
-            vision_task = Task(
-                description=f"Create a compelling vision for: '{idea}'.\n{history_context}",
-                agent=visionary_agent,
-                expected_output="An inspiring paragraph about the idea's potential."
-            )
-            
-            vision_result = await asyncio.to_thread(vision_task.execute)
-            yield f"data: {json.dumps({'type': 'agent_end', 'agent': 'Creative Product Visionary'})}\n\n"
-            
-            # Send progress update
-            yield f"data: {json.dumps({'type': 'progress', 'step': 1, 'total': 4, 'message': 'Vision created'})}\n\n"
-            
-        except Exception as e:
-            error_msg = f"Error in vision task: {str(e)}"
-            print(error_msg)
-            yield f"data: {json.dumps({'type': 'error', 'message': error_msg})}\n\n"
-            return
+        return controller.try_admit(user.id, tier_weight(user.tier))
+    except QueueFullError as e:
+        rate_limiter.refund(controller.name, user.id)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(QUEUE_FULL_RETRY_AFTER_SECONDS)},
+        )
 
-        # --- Task 2: Market Analyst ---
-        try:
-            yield f"data: {json.dumps({'type': 'agent_start', 'agent': 'Data-Driven Market Analyst'})}\n\n"
-            
-            market_analysis_task = Task(
-                description=f"Analyze the market for '{idea}', considering this vision: {vision_result}",
-                agent=market_analyst_agent,
-                expected_output="A summary of market trends and competitors."
-            )
-            
-            market_result = await asyncio.to_thread(market_analysis_task.execute)
-            yield f"data: {json.dumps({'type': 'agent_end', 'agent': 'Data-Driven Market Analyst'})}\n\n"
-            
-            # Send progress update
-            yield f"data: {json.dumps({'type': 'progress', 'step': 2, 'total': 4, 'message': 'Market analysis completed'})}\n\n"
-            
-        except Exception as e:
-            error_msg = f"Error in market analysis task: {str(e)}"
-            print(error_msg)
-            yield f"data: {json.dumps({'type': 'error', 'message': error_msg})}\n\n"
-            return
+def usage_record(usage: Dict[str, Dict[str, int]]) -> Optional[Dict[str, Dict[str, int]]]:
+    """
+    Returns the token usage to store with an analysis: per stage plus a "total" entry,
+    or None if no stage ran (e.g. the report came from the cache).
+    """
+    if not usage:
+        return None
+    return {**usage, "total": total_usage(usage)}
 
-        # --- Task 3: Critic ---
-        try:
-            yield f"data: {json.dumps({'type': 'agent_start', 'agent': 'Realistic Risk Manager'})}\n\n"
-            
-            critique_task = Task(
-                description=f"Critically evaluate the idea for '{idea}', considering the vision ({vision_result}) and market analysis ({market_result}).",
-                agent=critic_agent,
-                expected_output="A bullet list of potential risks."
-            )
-            
-            critique_result = await asyncio.to_thread(critique_task.execute)
-            yield f"data: {json.dumps({'type': 'agent_end', 'agent': 'Realistic Risk Manager'})}\n\n"
-            
-            # Send progress update
-            yield f"data: {json.dumps({'type': 'progress', 'step': 3, 'total': 4, 'message': 'Risk analysis completed'})}\n\n"
-            
-        except Exception as e:
-            error_msg = f"Error in critique task: {str(e)}"
-            print(error_msg)
-            yield f"data: {json.dumps({'type': 'error', 'message': error_msg})}\n\n"
-            return
+async def run_analysis_job(idea: str, use_history: bool, user_id: int, ticket: AdmissionTicket, bypass_cache: bool = False,
+                           resume_run: Optional[Tuple[int, Dict[str, str]]] = None) -> AsyncGenerator[dict, None]:
+    """
+    Produces the events of one analysis run. Runs as a background job, so it keeps
+    going (and its events stay replayable) when the client's connection drops.
 
-        # --- Task 4: Planner ---
-        try:
-            yield f"data: {json.dumps({'type': 'agent_start', 'agent': 'Pragmatic Strategy Consultant'})}\n\n"
-            
-            planning_task = Task(
-                description=f"""
-                    Synthesize all the following information into a single, cohesive final report for the business idea: '{idea}'.
-                    You MUST use the information provided below as the primary context for your report.
-
-                    **Vision Provided:**\n{vision_result}\n
-                    **Market Analysis Provided:**\n{market_result}\n
-                    **Critique & Risks Provided:**\n{critique_result}\n
-
-                    Based on ALL of this information, create a comprehensive report that includes a summary, the market analysis, the risks, and a final SWOT & Action Plan. Structure your response with clear markdown headings.
-                """,
-                expected_output="A comprehensive, well-structured report in Markdown format.",
-                agent=planner_agent
-            )
-            
-            final_report = await asyncio.to_thread(planning_task.execute)
-            yield f"data: {json.dumps({'type': 'agent_end', 'agent': 'Pragmatic Strategy Consultant'})}\n\n"
-            
-            # Send progress update
-            yield f"data: {json.dumps({'type': 'progress', 'step': 4, 'total': 4, 'message': 'Final report generated'})}\n\n"
-            
-        except Exception as e:
-            error_msg = f"Error in planning task: {str(e)}"
-            print(error_msg)
-            yield f"data: {json.dumps({'type': 'error', 'message': error_msg})}\n\n"
-            return
+    Every finished stage is checkpointed to a pending `AnalysisRun`. If the run fails,
+    the error event carries its `run_id`, and `resume_run` (the run ID and its
+    checkpointed values) reruns only the stages that are missing.
+    """
+    run_id = None
+    run_open = False  # The run exists and has been neither completed nor marked as failed.
+    try:
+        # Send initial connection confirmation
+        yield {'type': 'connection_established', 'message': 'Analysis starting...'}
+        agents = await get_agents_async()
+        
+        report_streamed = False
+        final_report = None
+        usage: Dict[str, Dict[str, int]] = {}  # Tokens per stage; stays empty for cached reports.
+        stage_models: Dict[str, str] = {}  # Model that served each stage run here.
+        if resume_run is not None:
+            run_id, restored = resume_run
+            run_open = True
+            history_context = restored.get("history_context", "")
+            yield {'type': 'resumed', 'run_id': run_id,
+                   'completed_stages': [stage.agent.role for stage in agents.analysis_stages if stage.key in restored]}
+        else:
+            restored = {}
+            # Get history context if needed
+            history_context = ""
+            if use_history:
+                try:
+                    # Short-lived sessions: no connection is held while the agents run.
+                    async with async_session_scope() as db:
+                        relevant_digests = await crud.get_relevant_digests_async(db, user_id, query=idea)
+                    history_context = memory.build_history_context(relevant_digests)
+                except Exception as e:
+                    print(f"Error fetching history: {e}")
+                    # Continue without history context
+
+            # --- Serve a cached report for the same (or a near-identical) idea ---
+            final_report = None if bypass_cache else report_cache.get(idea, history_context)
+            if final_report is not None:
+                ticket.release()
+                yield {'type': 'cache_hit', 'message': 'Found a recent analysis of this idea.'}
+
+        if final_report is None:
+            # --- Wait for a free analysis slot, telling the client its place in line ---
+            async for position in ticket.wait():
+                yield {'type': 'queued', 'position': position}
+
+            # --- Open a pending run to checkpoint the stages into ---
+            if run_id is None:
+                try:
+                    async with async_session_scope() as db:
+                        run = await crud.create_analysis_run_async(db, idea, user_id, {"history_context": history_context})
+                    run_id, run_open = run.id, True
+                except Exception as e:
+                    print(f"Could not create analysis run, continuing without checkpoints: {e}")
+
+            async def checkpoint(stage: Stage, output: str) -> None:
+                async with async_session_scope() as db:
+                    await crud.save_stage_output_async(db, run_id, stage.key, output)
+
+            # --- Run the agent stages as a dependency graph ---
+            values = {**restored, "idea": idea, "history_context": history_context}
+            try:
+                async for event in run_pipeline(agents.analysis_stages, values, checkpoint=checkpoint if run_open else None,
+                                                usage=usage, models=stage_models):
+                    if event['type'] == 'token' and event['agent'] == agents.planner_role:
+                        report_streamed = True
+                    yield event
+            except PipelineError as e:
+                error_msg = str(e)
+                print(error_msg)
+                if run_open:
+                    async with async_session_scope() as db:
+                        await crud.fail_analysis_run_async(db, run_id, error_msg)
+                    run_open = False
+                yield {'type': 'error', 'message': error_msg, 'run_id': run_id, 'resumable': run_id is not None}
+                return
+            final_report = values["report"]
+            report_cache.put(idea, history_context, final_report)
+            ticket.release()
 
         # Save the final report to the database
         try:
-            analysis_data = schemas.AnalysisCreate(idea_prompt=idea, report_markdown=final_report)
-            await asyncio.to_thread(crud.save_analysis, db, analysis_data, user_id)
+            analysis_data = schemas.AnalysisCreate(idea_prompt=idea, report_markdown=final_report,
+                                                   token_usage=usage_record(usage),
+                                                   stage_models=stage_models or None)
+            async with async_session_scope() as db:
+                if run_open:
+                    saved = await crud.complete_analysis_run_async(db, run_id, analysis_data, user_id)
+                    run_open = False
+                else:
+                    saved = await crud.save_analysis_async(db, analysis_data, user_id)
             
-            # (FINAL FIX) Stream the final report in chunks
-            chunk_size = 512  # Send 512 characters at a time
-            for i in range(0, len(final_report), chunk_size):
-                chunk = final_report[i:i + chunk_size]
-                yield f"data: {json.dumps({'type': 'report_chunk', 'chunk': chunk})}\n\n"
-                await asyncio.sleep(0.01) # Small delay to allow data to be sent
+            # The Planner's tokens already carried the report. Only fall back to sending
+            # it in chunks if nothing was streamed (e.g. the model ignored the answer format).
+            if not report_streamed:
+                chunk_size = 512  # Send 512 characters at a time
+                for i in range(0, len(final_report), chunk_size):
+                    chunk = final_report[i:i + chunk_size]
+                    yield {'type': 'report_chunk', 'chunk': chunk}
 
             # Send a final completion message
-            yield f"data: {json.dumps({'type': 'completed', 'message': 'Analysis completed successfully!'})}\n\n"
+            yield {'type': 'completed', 'message': 'Analysis completed successfully!', 'analysis_id': saved.id}
             
         except Exception as e:
             error_msg = f"Error saving analysis: {str(e)}"
             print(error_msg)
-            yield f"data: {json.dumps({'type': 'error', 'message': error_msg})}\n\n"
+            yield {'type': 'error', 'message': error_msg}
             return
 
     except Exception as e:
         error_message = f"Critical error in analysis pipeline: {str(e)}"
         print(f"\n--- STREAMING ERROR ---\n{error_message}\n-----------------------\n")
-        yield f"data: {json.dumps({'type': 'error', 'message': error_message})}\n\n"
+        metrics.ERRORS.inc(source="analysis")
+        yield {'type': 'error', 'message': error_message, 'run_id': run_id, 'resumable': run_open}
+    finally:
+        # Also runs when the job is cancelled, so an abandoned run never holds a slot.
+        ticket.release()
+        # A run that stopped for any other reason (cancellation, unexpected error) stays resumable.
+        if run_open:
+            try:
+                async with async_session_scope() as db:
+                    await crud.fail_analysis_run_async(db, run_id, "The analysis was interrupted.")
+            except Exception as e:
+                print(f"Could not mark analysis run {run_id} as failed: {e}")
+
+def job_stream_response(http_request: Request, job: Job, after_id: int = 0, endpoint: str = "analyze",
+                        extra_headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+    """
+    Streams a job's event log as Server-Sent Events, with the job's event ID on each
+    message so the client can resume with Last-Event-ID.
+    """
+    headers = {"X-Job-Id": job.id, **(extra_headers or {})}
+    return event_stream_response(http_request, job.subscribe(after_id), endpoint, headers=headers)
 
 @app.post("/analyze-idea-stream", tags=["Analysis"])
-async def analyze_business_idea_stream(request: BusinessIdea, current_user: schemas.User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def analyze_business_idea_stream(
+    request: BusinessIdea,
+    http_request: Request,
+    current_user: auth.Principal = Depends(get_current_user),
+    limit: RateLimitDecision = Depends(rate_limit("analysis"))
+):
     """
-    Improved streaming endpoint with better error handling and headers.
+    Starts an analysis as a background job and streams its events.
+
+    The job outlives this response: if the connection drops, resume it with
+    `GET /jobs/{job_id}/events` and a `Last-Event-ID` header. Unless `persist`
+    is set, a job nobody is listening to is cancelled after a short grace period.
     """
     print(f"Analysis requested by user: {current_user.username}. Use History: {request.use_history}")
-    
-    # Custom headers for better streaming support
-    headers = {
-        "Cache-Control": "no-cache",
-        "Connection": "keep-alive",
-        "X-Accel-Buffering": "no",  # Disable nginx buffering
-    }
-    
-    return StreamingResponse(
-        stream_analysis_generator(request.idea, request.use_history, db, current_user.id),
-        media_type="text/event-stream",
-        headers=headers
+    ticket = admit_request(current_user)
+    job = job_manager.start(
+        current_user.id,
+        run_analysis_job(request.idea, request.use_history, current_user.id, ticket, request.bypass_cache),
+        persist=request.persist,
+        cleanup=ticket.release
+    )
+    return job_stream_response(http_request, job, extra_headers=limit.headers())
+
+@app.post("/analysis-runs/{run_id}/resume", tags=["Analysis"])
+async def resume_analysis_run(
+    run_id: int,
+    http_request: Request,
+    persist: bool = False,
+    current_user: auth.Principal = Depends(get_current_user),
+    limit: RateLimitDecision = Depends(rate_limit("analysis")),
+    db: crud.AnySession = Depends(get_async_db)
+):
+    """
+    Resumes a failed analysis run as a new job, rerunning only the stages that had
+    not finished. The job's events are streamed like `/analyze-idea-stream`.
+    """
+    ticket = admit_request(current_user)
+    claimed = await crud.claim_analysis_run_async(db, run_id=run_id, user_id=current_user.id)
+    if claimed is None:
+        ticket.release()
+        rate_limiter.refund("analysis", current_user.id)
+        raise HTTPException(status_code=404, detail="No resumable analysis run with this ID.")
+
+    idea, restored = claimed
+    print(f"Resuming analysis run {run_id} for user: {current_user.username}. Restored: {sorted(restored)}")
+    job = job_manager.start(
+        current_user.id,
+        run_analysis_job(idea, False, current_user.id, ticket, resume_run=(run_id, restored)),
+        persist=persist,
+        cleanup=ticket.release
     )
+    return job_stream_response(http_request, job, endpoint="resume", extra_headers=limit.headers())
+
+@app.get("/jobs/{job_id}/events", tags=["Analysis"])
+async def stream_job_events(
+    job_id: str,
+    http_request: Request,
+    last_event_id: Optional[int] = Header(None),
+    current_user: auth.Principal = Depends(get_current_user)
+):
+    """
+    Resumes a job's event stream after the event in `Last-Event-ID` (from the start if absent).
+    """
+    job = job_manager.get(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or it has expired.")
+    return job_stream_response(http_request, job, after_id=last_event_id or 0, endpoint="reconnect")
     
 @app.post("/analyze-idea-simple", tags=["Analysis"])
-async def analyze_business_idea_simple(request: BusinessIdea, current_user: schemas.User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def analyze_business_idea_simple(
+    request: BusinessIdea,
+    current_user: auth.Principal = Depends(get_current_user),
+    limit: RateLimitDecision = Depends(rate_limit("analysis")),
+    db: crud.AnySession = Depends(get_async_db)
+):
     """
     Non-streaming fallback endpoint for when streaming fails.
     Returns the complete analysis in a single response.
     """
     print(f"Simple analysis requested by user: {current_user.username}. Use History: {request.use_history}")
+    ticket = admit_request(current_user)
+    usage: Dict[str, Dict[str, int]] = {}
+    stage_models: Dict[str, str] = {}
     
     try:
         # Get history context if needed
         history_context = ""
         if request.use_history:
-            recent_analyses = crud.get_analyses_by_user(db, user_id=current_user.id)
-            if recent_analyses:
-                history_summary = "\n".join([
-                    f"- Idea: '{an.idea_prompt}'. Key finding: {an.report_markdown[:150]}..." 
-                    for an in recent_analyses[:2]
-                ])
-                history_context = f"For context, this user has previously analyzed:\n{history_summary}\nKeep these past analyses in mind when creating the new vision."
-
-        # Create all tasks
-        vision_task = Task(
-            description=f"Create a compelling vision for: '{request.idea}'.\n{history_context}",
-            agent=visionary_agent,
-            expected_output="An inspiring paragraph about the idea's potential."
-        )
-        
-        market_analysis_task = Task(
-            description=f"Analyze the market for '{request.idea}'. Consider the vision from the previous step.",
-            agent=market_analyst_agent,
-            expected_output="A summary of market trends and competitors."
-        )
-        
-        critique_task = Task(
-            description=f"Critically evaluate the idea for '{request.idea}'. Consider the vision and market analysis from previous steps.",
-            agent=critic_agent,
-            expected_output="A bullet list of potential risks."
-        )
-        
-        planning_task = Task(
-            description=f"""
-                Synthesize all information into a comprehensive final report for: '{request.idea}'.
-                Create a report that includes vision, market analysis, risks, and a SWOT & Action Plan.
-                Structure your response with clear markdown headings.
-            """,
-            expected_output="A comprehensive, well-structured report in Markdown format.",
-            agent=planner_agent
-        )
-
-        # Create and run the crew
-        crew = Crew(
-            agents=[visionary_agent, market_analyst_agent, critic_agent, planner_agent],
-            tasks=[vision_task, market_analysis_task, critique_task, planning_task],
-            process=Process.sequential,
-            verbose=False
-        )
-        
-        # Execute the analysis
-        final_report = crew.kickoff()
+            relevant_digests = await crud.get_relevant_digests_async(db, user_id=current_user.id, query=request.idea)
+            history_context = memory.build_history_context(relevant_digests)
+
+        # Serve a cached report when possible, otherwise run the same dependency graph as the streaming endpoint
+        final_report = None if request.bypass_cache else report_cache.get(request.idea, history_context)
+        cached = final_report is not None
+        if not cached:
+            async for _ in ticket.wait():
+                pass
+            agents = await get_agents_async()
+            values = {"idea": request.idea, "history_context": history_context}
+            async for _ in run_pipeline(agents.analysis_stages, values, usage=usage, models=stage_models):
+                pass
+            final_report = values["report"]
+            report_cache.put(request.idea, history_context, final_report)
         
         # Save to database
-        analysis_data = schemas.AnalysisCreate(idea_prompt=request.idea, report_markdown=final_report)
-        crud.save_analysis(db=db, analysis=analysis_data, user_id=current_user.id)
+        analysis_data = schemas.AnalysisCreate(idea_prompt=request.idea, report_markdown=final_report,
+                                               token_usage=usage_record(usage),
+                                               stage_models=stage_models or None)
+        saved = await crud.save_analysis_async(db=db, analysis=analysis_data, user_id=current_user.id)
         
         return {
             "success": True,
             "result": final_report,
+            "analysis_id": saved.id,
+            "cached": cached,
             "message": "Analysis completed successfully"
         }
         
     except Exception as e:
         print(f"Simple analysis error: {e}")
+        metrics.ERRORS.inc(source="analysis")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+    finally:
+        ticket.release()
+
+async def admit_batch_idea(user: auth.Principal) -> AdmissionTicket:
+    """
+    Waits for an analysis slot for one idea of a batch. Unlike a single analysis,
+    a batch waits out a full queue instead of being rejected halfway through.
+    """
+    while True:
+        try:
+            ticket = admission.try_admit(user.id, tier_weight(user.tier))
+            break
+        except QueueFullError:
+            await asyncio.sleep(BATCH_ADMISSION_RETRY_SECONDS)
+    try:
+        async for _ in ticket.wait():
+            pass
+    except BaseException:
+        ticket.release()
+        raise
+    return ticket
+
+async def analyze_batch_idea(idea: str, use_history: bool, bypass_cache: bool, user: auth.Principal,
+                             pay: Callable[[], Awaitable[None]]) -> Tuple[str, bool, Dict[str, Dict[str, int]], Dict[str, str]]:
+    """
+    Analyses one idea of a batch, from the report cache when possible. `pay` is
+    awaited before the pipeline runs, so only cache misses count against the rate limit.
+
+    Returns:
+        Tuple: The report, whether it came from the cache, and the token usage and model of each stage.
+    """
+    history_context = ""
+    if use_history:
+        async with async_session_scope() as db:
+            relevant_digests = await crud.get_relevant_digests_async(db, user.id, query=idea)
+        history_context = memory.build_history_context(relevant_digests)
+
+    usage: Dict[str, Dict[str, int]] = {}
+    stage_models: Dict[str, str] = {}
+    final_report = None if bypass_cache else report_cache.get(idea, history_context)
+    if final_report is not None:
+        return final_report, True, usage, stage_models
+
+    await pay()
+    ticket = await admit_batch_idea(user)
+    try:
+        agents = await get_agents_async()
+        values = {"idea": idea, "history_context": history_context}
+        async for _ in run_pipeline(agents.analysis_stages, values, usage=usage, models=stage_models):
+            pass
+    finally:
+        ticket.release()
+    final_report = values["report"]
+    report_cache.put(idea, history_context, final_report)
+    return final_report, False, usage, stage_models
+
+async def save_batch(completed: Dict[int, schemas.AnalysisCreate], user_id: int) -> Dict[int, int]:
+    """
+    Saves the finished analyses of a batch with one bulk insert.
+
+    Returns:
+        Dict[int, int]: The new analysis ID for each index in the batch.
+    """
+    indices = sorted(completed)
+    async with async_session_scope() as db:
+        ids = await crud.save_analyses_async(db, [completed[index] for index in indices], user_id)
+    return dict(zip(indices, ids))
+
+async def batch_result_stream(request: BatchAnalysisRequest, user: auth.Principal) -> AsyncGenerator[dict, None]:
+    """
+    Runs the ideas of a batch, at most `concurrency` at a time, and yields a
+    result per idea as soon as it finishes, then a summary once all of them are saved.
+
+    Ideas that normalize to the same text are analysed once. Each idea that is not
+    served from the cache takes a token from the user's analysis bucket (the first
+    uses the one the request took), waiting for it rather than failing. If the client
+    disconnects, the remaining ideas are cancelled and the finished ones are still saved.
+    """
+    prepaid = 1
+
+    async def pay_for_idea() -> None:
+        nonlocal prepaid
+        if prepaid:
+            prepaid -= 1
+            return
+        await rate_limiter.wait("analysis", user.id, user.tier)
+
+    concurrency = max(1, min(request.concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+    indices_by_idea: Dict[str, List[int]] = {}
+    for index, idea in enumerate(request.ideas):
+        indices_by_idea.setdefault(normalize_idea(idea), []).append(index)
+
+    async def run_one(indices: List[int]):
+        async with semaphore:
+            try:
+                outcome = await analyze_batch_idea(request.ideas[indices[0]], request.use_history, request.bypass_cache, user, pay_for_idea)
+                return indices, outcome, None
+            except Exception as e:
+                print(f"Batch analysis error for '{request.ideas[indices[0]]}': {e}")
+                metrics.ERRORS.inc(source="batch")
+                return indices, None, str(e)
+
+    tasks = [asyncio.create_task(run_one(indices)) for indices in indices_by_idea.values()]
+    completed: Dict[int, schemas.AnalysisCreate] = {}
+    failed = 0
+    saving = False
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            indices, outcome, error = await next_done
+            for index in indices:
+                line = {"type": "result", "index": index, "idea": request.ideas[index]}
+                if error is not None:
+                    failed += 1
+                    line.update(status="failed", error=error)
+                else:
+                    final_report, cached, usage, stage_models = outcome
+                    completed[index] = schemas.AnalysisCreate(
+                        idea_prompt=request.ideas[index], report_markdown=final_report,
+                        token_usage=usage_record(usage), stage_models=stage_models or None
+                    )
+                    line.update(status="completed", cached=cached, report=final_report)
+                yield line
+
+        saving = True
+        try:
+            saved = await save_batch(completed, user.id) if completed else {}
+        except Exception as e:
+            print(f"Batch save error: {e}")
+            metrics.ERRORS.inc(source="batch")
+            yield {"type": "error", "message": f"Saving the batch failed: {e}"}
+            return
+        yield {
+            "type": "summary",
+            "completed": len(completed),
+            "failed": failed,
+            "analysis_ids": [saved.get(index) for index in range(len(request.ideas))],
+        }
+    finally:
+        for task in tasks:
+            task.cancel()
+        if not saving and completed:
+            # The client went away: keep what already finished.
+            await asyncio.shield(save_batch(completed, user.id))
+
+@app.post("/analyses/batch", tags=["Analysis"])
+async def analyze_business_ideas_batch(
+    request: BatchAnalysisRequest,
+    http_request: Request,
+    current_user: auth.Principal = Depends(get_current_user),
+    limit: RateLimitDecision = Depends(rate_limit("analysis"))
+):
+    """
+    Analyses a list of ideas and streams the results as NDJSON.
+
+    Each idea runs through the same pipeline as `/analyze-idea-stream`, sharing the
+    report, search and LLM caches; one `result` line is sent per idea as it finishes
+    (in completion order, with its `index` in the request), followed by a `summary`
+    line with the IDs of the saved analyses. All of them are saved in one transaction.
+    Blank lines are sent as heartbeats while no idea is finishing.
+    """
+    if not request.ideas or len(request.ideas) > BATCH_MAX_IDEAS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"A batch must contain between 1 and {BATCH_MAX_IDEAS} ideas."
+        )
+    print(f"Batch of {len(request.ideas)} ideas requested by user: {current_user.username}. Use History: {request.use_history}")
+    return event_stream_response(http_request, batch_result_stream(request, current_user), "batch",
+                                 format="ndjson", headers=limit.headers())
 
 @app.post("/generate-pdf", tags=["Reporting"])
-def generate_pdf(payload: ReportPayload, current_user: schemas.User = Depends(get_current_user)):
+async def generate_pdf(payload: ReportPayload, request: Request, current_user: auth.Principal = Depends(get_current_user)):
     """
     Generates a PDF from markdown content.
+
+    PDFs are content-addressed: the ETag is the cache key, so a client that sends it
+    back in If-None-Match gets a 304 without any rendering or disk access.
     """
+    key = pdf_render.cache_key(payload.markdown_content, current_user.username)
+    headers = {
+        "ETag": f'"{key}"',
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": "attachment; filename=VentureMind_Report.pdf",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if headers["ETag"] in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
     try:
-        html_content = markdown2.markdown(payload.markdown_content, extras=["tables", "fenced-code-blocks"])
-        styled_html = f"<html><head><style>body {{ font-family: sans-serif; line-height: 1.6; }} h1, h2, h3 {{ color: #333; border-bottom: 1px solid #eee; padding-bottom: 5px;}}</style></head><body><h1>VentureMind Report for {current_user.username}</h1>{html_content}</body></html>"
-        pdf_bytes = HTML(string=styled_html).write_pdf()
-        return Response(content=pdf_bytes, media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=VentureMind_Report.pdf"})
+        pdf_bytes = await pdf_render.get_or_render_pdf(payload.markdown_content, current_user.username, key=key)
+        return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
     except Exception as e:
         print(f"PDF generation failed: {e}")
         return {"error": "Failed to generate PDF."}
 
+async def relevant_history_for_follow_up(db: crud.AnySession, user_id: int, question: str, report: str) -> str:
+    """
+    Builds the history block for a follow-up: digests of the user's analyses most
+    related to the question, without the report being discussed.
+    """
+    # One extra is fetched because the report being discussed is usually among the matches.
+    relevant_digests = await crud.get_relevant_digests_async(
+        db, user_id=user_id,
+        query=f"{question}\n{report[:memory.LEGACY_DIGEST_SOURCE_CHARS]}",
+        limit=memory.MEMORY_HISTORY_LIMIT + 1
+    )
+    relevant_digests = [(idea, digest) for idea, digest in relevant_digests if digest not in report]
+    return memory.build_follow_up_history(relevant_digests[:memory.MEMORY_HISTORY_LIMIT])
+
+async def answer_follow_up(question: str, report: str, conversation: str = "", history: str = "") -> str:
+    """
+    Runs the Q&A agent on a question about a report (on the LLM worker pool),
+    on the model the router currently picks for "qna".
+
+    The context is capped at FOLLOW_UP_PROMPT_TOKEN_BUDGET tokens, giving up the
+    history digests first, then the conversation so far, then the end of the report.
+    """
+    parts = fit_to_budget(
+        {"report": report, "conversation": conversation, "history": history},
+        FOLLOW_UP_PROMPT_TOKEN_BUDGET - count_tokens(question),
+        ("history", "conversation", "report"),
+    )
+    context = "\n\n".join(part for part in (parts["report"], parts["conversation"]) if part) + parts["history"]
+    agents = await get_agents_async()
+    # Loaded with the agents, so this import is only a lookup by now.
+    from crewai import Task
+    agent, tier, _ = agents.select("qna")
+    qna_task = Task(
+        description=f"""
+            Based on the context below, answer the user's question. 
+            You are encouraged to be creative, expand on the ideas, and use your search tool if needed to find new information that can enrich the answer.
+
+            --- CONTEXT ---
+            {context}
+            --- END OF CONTEXT ---
+
+            User's Question: {question}
+        """,
+        expected_output="An insightful and helpful answer that goes beyond just summarizing the report. Provide new perspectives or actionable advice if possible.",
+        agent=agent
+    )
+    # For single-agent tasks, it's more direct to just execute the task
+    start = time.perf_counter()
+    try:
+        return await run_llm_call(qna_task.execute)
+    finally:
+        agents.record("qna", tier, time.perf_counter() - start)
+
+@app.post("/analyses/{analysis_id}/follow-up", tags=["Analysis"])
+async def ask_analysis_follow_up(
+    analysis_id: int,
+    query: FollowUpQuestion,
+    current_user: auth.Principal = Depends(get_current_user),
+    limit: RateLimitDecision = Depends(rate_limit("follow_up")),
+    db: crud.AnySession = Depends(get_async_db)
+):
+    """
+    Answers a follow-up question about a saved analysis.
+
+    The server keeps the conversation: the report, a compacted summary of older turns
+    and the latest turns verbatim, so the client only sends the question and the
+    prompt stays bounded however long the conversation gets.
+    """
+    session = await followup.get_session(db, analysis_id, current_user.id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Analysis not found.")
+
+    ticket = admit_request(current_user, follow_up_admission)
+    try:
+        async for _ in ticket.wait():
+            pass
+        async with session.lock:
+            history = ""
+            if query.use_history:
+                history = await relevant_history_for_follow_up(db, current_user.id, query.question, session.report)
+            answer = await answer_follow_up(query.question, session.report, session.conversation_context(), history)
+            turn_id = await crud.save_follow_up_turn_async(db, analysis_id, query.question, answer)
+            session.add_turn(turn_id, query.question, answer)
+        return {"answer": answer, "analysis_id": analysis_id}
+    except Exception as e:
+        print(f"Follow-up error: {e}")
+        metrics.ERRORS.inc(source="follow_up")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        ticket.release()
+
 @app.post("/ask-follow-up", tags=["Analysis"])
-def ask_follow_up_question(query: FollowUpQuery, current_user: schemas.User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def ask_follow_up_question(
+    query: FollowUpQuery,
+    current_user: auth.Principal = Depends(get_current_user),
+    limit: RateLimitDecision = Depends(rate_limit("follow_up")),
+    db: crud.AnySession = Depends(get_async_db)
+):
     """
-    Handles follow-up questions about a generated report.
+    Handles follow-up questions about a report sent in the request.
+    Kept for clients that do not have an analysis ID; prefer `/analyses/{analysis_id}/follow-up`.
     """
+    ticket = admit_request(current_user, follow_up_admission)
     try:
-        full_context = query.report_context
+        async for _ in ticket.wait():
+            pass
+        history = ""
         if query.use_history:
-            # Fetch user's history and add it to the context
-            user_history = crud.get_analyses_by_user(db, user_id=current_user.id)
-            if user_history:
-                history_summary = "\n\n--- PREVIOUS ANALYSIS CONTEXT ---\n"
-                for an in user_history[:2]: # Use last 2 analyses
-                    history_summary += f"\n**Regarding '{an.idea_prompt}':**\n{an.report_markdown}\n"
-                full_context += history_summary
-
-        qna_task = Task(
-            description=f"""
-                Based on the context below, answer the user's question. 
-                You are encouraged to be creative, expand on the ideas, and use your search tool if needed to find new information that can enrich the answer.
-
-                --- CONTEXT ---
-                {full_context}
-                --- END OF CONTEXT ---
-
-                User's Question: {query.question}
-            """,
-            expected_output="An insightful and helpful answer that goes beyond just summarizing the report. Provide new perspectives or actionable advice if possible.",
-            agent=qna_agent
-        )
-        # For single-agent tasks, it's more direct to just execute the task
-        answer = qna_task.execute()
+            # Add the digests of the user's most related analyses (not the full reports) to the context.
+            history = await relevant_history_for_follow_up(db, current_user.id, query.question, query.report_context)
+        answer = await answer_follow_up(query.question, query.report_context, history=history)
         return {"answer": answer}
     except Exception as e:
         print(f"Follow-up error: {e}")
+        metrics.ERRORS.inc(source="follow_up")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        ticket.release()
+
+
+# --- Diagnostics Endpoints ---
+@app.get("/stats", tags=["Diagnostics"])
+def read_stats():
+    """
+    Returns the hit/miss counters of this worker's caches.
+    """
+    return {
+        "report_cache": report_cache.stats(),
+        "search_cache": search_cache.stats(),
+        "pdf_cache": pdf_render.pdf_cache.stats(),
+        "follow_up_sessions": followup.follow_up_sessions.stats(),
+        "admission": admission.stats(),
+        "follow_up_admission": follow_up_admission.stats(),
+        "rate_limits": rate_limiter.stats(),
+        "jobs": job_manager.stats(),
+        "llm_queue_depth": llm_queue_depth(),
+        "http_pool": http_client.stats(),
+        "model_routing": model_router.stats(),
+    }
 
+@app.get("/metrics", tags=["Diagnostics"], response_class=PlainTextResponse)
+def read_metrics():
+    """
+    Returns the metrics of all worker processes on this host in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,337 @@
+# ==============================================================================
+# 1. IMPORTS
+# ==============================================================================
+# --- Standard Library Imports ---
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# --- Third-party Library Imports ---
+import numpy as np
+
+
+# ==============================================================================
+# 2. CONFIGURATION CONSTANTS
+# ==============================================================================
+# Maximum length of the digest stored next to each analysis, in characters.
+MEMORY_DIGEST_MAX_CHARS = int(os.getenv("MEMORY_DIGEST_MAX_CHARS", "400"))
+
+# Number of past analyses used as "long-term memory" context.
+MEMORY_HISTORY_LIMIT = int(os.getenv("MEMORY_HISTORY_LIMIT", "2"))
+
+# How much of a legacy report (saved before digests existed) is read to build one on the fly.
+LEGACY_DIGEST_SOURCE_CHARS = 2000
+
+# Size of the hashed embedding vectors. Must be a power of two; changing it
+# invalidates stored embeddings (they are recomputed from the digest).
+EMBEDDING_DIMENSIONS = 512
+
+# Past analyses scoring below this cosine similarity are not considered related.
+MEMORY_MIN_SIMILARITY = float(os.getenv("MEMORY_MIN_SIMILARITY", "0.05"))
+
+# Users whose vectors are kept in memory per worker process (least recently used is evicted).
+MEMORY_INDEX_MAX_USERS = int(os.getenv("MEMORY_INDEX_MAX_USERS", "1000"))
+
+
+# ==============================================================================
+# 3. DIGEST BUILDING
+# ==============================================================================
+
+_HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s*(.*?)\s*#*\s*$")
+_MARKUP_RE = re.compile(r"(\*\*|__|\*|_|`|>\s)")
+_LIST_MARKER_RE = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _sections(report_markdown: str) -> List[Tuple[str, str]]:
+    """
+    Splits a Markdown report into (heading, plain body text) pairs.
+    Text before the first heading gets an empty heading.
+    """
+    sections: List[Tuple[str, List[str]]] = [("", [])]
+    for line in report_markdown.splitlines():
+        heading = _HEADING_RE.match(line)
+        if heading:
+            sections.append((heading.group(1).lower(), []))
+            continue
+        if line.lstrip().startswith("|"):  # Tables read poorly as prose
+            continue
+        is_list_item = bool(_LIST_MARKER_RE.match(line))
+        text = _MARKUP_RE.sub("", _LIST_MARKER_RE.sub("", line)).strip()
+        if not text or set(text) <= set("-=*_ "):  # Skip blank lines and horizontal rules
+            continue
+        if is_list_item and text[-1] not in ".!?;:":
+            text += ";"
+        sections[-1][1].append(text)
+    return [(title, " ".join(lines)) for title, lines in sections if lines]
+
+
+def truncate_text(text: str, max_chars: int) -> str:
+    """
+    Cuts text at a word boundary, adding an ellipsis if anything was removed.
+    """
+    text = _SPACE_RE.sub(" ", text).strip()
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars].rsplit(" ", 1)[0].rstrip(",;:")
+    return cut + "..."
+
+
+def build_report_digest(report_markdown: str, max_chars: int = MEMORY_DIGEST_MAX_CHARS) -> str:
+    """
+    Builds a compact, prompt-ready digest of a report.
+
+    Prefers the report's summary section, so the digest holds the key finding
+    rather than the title that a blind prefix cut usually returns.
+
+    Args:
+        report_markdown (str): The full report in Markdown.
+        max_chars (int): The maximum digest length.
+
+    Returns:
+        str: A plain-text digest of at most `max_chars` characters (plus an ellipsis).
+    """
+    sections = _sections(report_markdown or "")
+    if not sections:
+        return ""
+    preferred = [body for title, body in sections if "summary" in title or "overview" in title]
+    return truncate_text(preferred[0] if preferred else sections[0][1], max_chars)
+
+
+# ==============================================================================
+# 4. HASHED EMBEDDINGS
+# ==============================================================================
+
+_TOKEN_RE = re.compile(r"[a-z0-9]{2,}")
+_STOPWORDS = frozenset(
+    "the and for with that this are from your you our will can has have its into their they them "
+    "than then also not but all any each more most such was were been being of to in on by as at "
+    "or is it be an".split()
+)
+
+
+def embed_text(text: str) -> np.ndarray:
+    """
+    Embeds text with the hashing trick: word unigrams and bigrams are hashed into
+    a fixed number of signed buckets, weighted by log term frequency, and the
+    vector is L2-normalized so a dot product is a cosine similarity.
+
+    Needs no model, vocabulary or network call, and gives the same vector in every process.
+
+    Args:
+        text (str): The text to embed.
+
+    Returns:
+        np.ndarray: A float32 vector of EMBEDDING_DIMENSIONS values (all zeros for empty text).
+    """
+    words = [word for word in _TOKEN_RE.findall(text.lower()) if word not in _STOPWORDS]
+    features = Counter(words)
+    features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+
+    vector = np.zeros(EMBEDDING_DIMENSIONS, dtype=np.float32)
+    for feature, count in features.items():
+        hashed = zlib.crc32(feature.encode("utf-8"))
+        sign = 1.0 if hashed & 0x80000000 else -1.0
+        vector[hashed & (EMBEDDING_DIMENSIONS - 1)] += sign * (1.0 + math.log(count))
+
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+def embedding_to_bytes(vector: np.ndarray) -> bytes:
+    """
+    Serializes an embedding for storage in the database.
+    """
+    return vector.astype(np.float32).tobytes()
+
+
+def embedding_from_bytes(blob: Optional[bytes]) -> Optional[np.ndarray]:
+    """
+    Deserializes a stored embedding, or returns None if it is missing or has the wrong size.
+    """
+    if not blob or len(blob) != EMBEDDING_DIMENSIONS * 4:
+        return None
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+# ==============================================================================
+# 5. VECTOR INDEX
+# ==============================================================================
+
+class _UserVectors:
+    """
+    One user's embeddings as a contiguous matrix, grown by doubling so appends
+    are amortized O(1) and scoring is a single matrix-vector product.
+    """
+
+    def __init__(self):
+        self.ids = np.zeros(16, dtype=np.int64)
+        self.matrix = np.zeros((16, EMBEDDING_DIMENSIONS), dtype=np.float32)
+        self.size = 0
+        self.rows: Dict[int, int] = {}
+        # Highest analysis ID read from the database; later rows still need loading.
+        self.synced_through = 0
+        self.lock = threading.Lock()
+
+    def add(self, analysis_id: int, vector: np.ndarray) -> None:
+        if analysis_id in self.rows:
+            return
+        if self.size == len(self.ids):
+            self.ids = np.resize(self.ids, self.size * 2)
+            grown = np.zeros((self.size * 2, EMBEDDING_DIMENSIONS), dtype=np.float32)
+            grown[:self.size] = self.matrix[:self.size]
+            self.matrix = grown
+        self.ids[self.size] = analysis_id
+        self.matrix[self.size] = vector
+        self.rows[analysis_id] = self.size
+        self.size += 1
+
+    def remove(self, analysis_id: int) -> None:
+        row = self.rows.pop(analysis_id, None)
+        if row is None:
+            return
+        # Move the last row into the hole to keep the matrix contiguous.
+        last = self.size - 1
+        if row != last:
+            self.ids[row] = self.ids[last]
+            self.matrix[row] = self.matrix[last]
+            self.rows[int(self.ids[row])] = row
+        self.size = last
+
+    def top_k(self, query: np.ndarray, k: int, min_score: float) -> List[Tuple[int, float]]:
+        if self.size == 0 or k <= 0:
+            return []
+        scores = self.matrix[:self.size] @ query
+        if self.size > k:
+            candidates = np.argpartition(-scores, k)[:k]
+        else:
+            candidates = np.arange(self.size)
+        ranked = candidates[np.argsort(-scores[candidates])]
+        return [(int(self.ids[i]), float(scores[i])) for i in ranked if scores[i] >= min_score]
+
+
+class MemoryIndex:
+    """
+    An in-process, per-user vector index over past reports.
+
+    Vectors are added as analyses are saved and loaded lazily from the stored
+    embeddings (`sync`) for rows written by other worker processes, so every
+    worker converges on the same index without a shared service.
+    """
+
+    def __init__(self, max_users: int = MEMORY_INDEX_MAX_USERS):
+        self.max_users = max_users
+        self._users: "OrderedDict[int, _UserVectors]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _user(self, user_id: int) -> _UserVectors:
+        with self._lock:
+            vectors = self._users.get(user_id)
+            if vectors is None:
+                vectors = self._users[user_id] = _UserVectors()
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            else:
+                self._users.move_to_end(user_id)
+            return vectors
+
+    def synced_through(self, user_id: int) -> int:
+        """
+        Returns the highest analysis ID already loaded from the database for a user.
+        """
+        return self._user(user_id).synced_through
+
+    def sync(self, user_id: int, rows: Iterable[Tuple[int, np.ndarray]]) -> None:
+        """
+        Adds vectors read from the database and advances the user's sync watermark.
+
+        Args:
+            user_id (int): The owner of the rows.
+            rows (Iterable[Tuple[int, np.ndarray]]): (analysis_id, vector) pairs in ascending ID order.
+        """
+        vectors = self._user(user_id)
+        with vectors.lock:
+            for analysis_id, vector in rows:
+                vectors.add(analysis_id, vector)
+                vectors.synced_through = max(vectors.synced_through, analysis_id)
+
+    def add(self, user_id: int, analysis_id: int, vector: np.ndarray) -> None:
+        """
+        Adds a freshly saved analysis. Does not move the sync watermark, so rows
+        saved meanwhile by other workers are still picked up by the next `sync`.
+        """
+        vectors = self._user(user_id)
+        with vectors.lock:
+            vectors.add(analysis_id, vector)
+
+    def remove(self, user_id: int, analysis_id: int) -> None:
+        """
+        Drops a deleted analysis from the index.
+        """
+        vectors = self._user(user_id)
+        with vectors.lock:
+            vectors.remove(analysis_id)
+
+    def search(self, user_id: int, query: np.ndarray, k: int, min_score: float = MEMORY_MIN_SIMILARITY) -> List[Tuple[int, float]]:
+        """
+        Returns the user's `k` most similar analyses by cosine similarity.
+
+        Args:
+            user_id (int): The user whose analyses are searched.
+            query (np.ndarray): The embedded query.
+            k (int): The maximum number of results.
+            min_score (float): Results below this similarity are dropped.
+
+        Returns:
+            List[Tuple[int, float]]: (analysis_id, score) pairs, best first.
+        """
+        vectors = self._user(user_id)
+        with vectors.lock:
+            return vectors.top_k(query, k, min_score)
+
+
+# --- Shared Instance ---
+# One index per worker process, updated by `crud.save_analysis` and read by the memory lookups.
+memory_index = MemoryIndex()
+
+
+# ==============================================================================
+# 6. PROMPT CONTEXT
+# ==============================================================================
+
+def build_history_context(digests: Iterable[Tuple[str, str]]) -> str:
+    """
+    Formats past (idea, digest) pairs as the Visionary's memory context.
+
+    Args:
+        digests (Iterable[Tuple[str, str]]): Past ideas and their digests, most relevant first.
+
+    Returns:
+        str: The context paragraph, or an empty string if there is no history.
+    """
+    history_summary = "\n".join(f"- Idea: '{idea}'. Key finding: {digest}" for idea, digest in digests)
+    if not history_summary:
+        return ""
+    return f"For context, this user has previously analyzed:\n{history_summary}\nKeep these past analyses in mind when creating the new vision."
+
+
+def build_follow_up_history(digests: Iterable[Tuple[str, str]]) -> str:
+    """
+    Formats past (idea, digest) pairs as extra context for a follow-up question.
+
+    Args:
+        digests (Iterable[Tuple[str, str]]): Past ideas and their digests, most relevant first.
+
+    Returns:
+        str: The context block, or an empty string if there is no history.
+    """
+    entries = "".join(f"\n**Regarding '{idea}':**\n{digest}\n" for idea, digest in digests)
+    if not entries:
+        return ""
+    return "\n\n--- PREVIOUS ANALYSIS CONTEXT ---\n" + entries
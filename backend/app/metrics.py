@@ -0,0 +1,407 @@
+# ==============================================================================
+# 1. IMPORTS
+# ==============================================================================
+# --- Standard Library Imports ---
+import bisect
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+# ==============================================================================
+# 2. CONFIGURATION CONSTANTS
+# ==============================================================================
+# Directory where every worker process writes its metric snapshot, shared by all
+# gunicorn workers on the host. `/metrics` merges the snapshots it finds there.
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "venturemind-metrics"))
+
+# How often each worker writes its snapshot, in seconds. The worker answering
+# `/metrics` always writes a fresh one first; the others lag by up to this much.
+METRICS_FLUSH_INTERVAL_SECONDS = float(os.getenv("METRICS_FLUSH_INTERVAL_SECONDS", "5"))
+
+# Prefix of every metric name.
+METRICS_NAMESPACE = "venturemind"
+
+# Histogram buckets (upper bounds, in seconds) for the different kinds of timings.
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+REQUEST_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LLM_BUCKETS = (1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 240.0, 400.0)
+
+LabelValues = Tuple[str, ...]
+
+
+# ==============================================================================
+# 3. METRIC TYPES
+# ==============================================================================
+
+class _Metric:
+    """
+    Base class of the metric types: a name, a help text and one value per label combination.
+    """
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = f"{METRICS_NAMESPACE}_{name}"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def snapshot(self) -> dict:
+        """
+        Returns the metric's current values in a JSON-serialisable form.
+        """
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """
+    A value that only goes up, e.g. a number of errors.
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"samples": [[list(key), value] for key, value in self._values.items()]}
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down, e.g. the number of open streams.
+
+    A gauge created with `function` is read from it whenever a snapshot is taken,
+    for values some other object already tracks (e.g. a queue length).
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function = function
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def snapshot(self) -> dict:
+        if self._function is not None:
+            try:
+                self.set(float(self._function()))
+            except Exception as e:
+                print(f"Could not read gauge {self.name}: {e}")
+        with self._lock:
+            return {"samples": [[list(key), value] for key, value in self._values.items()]}
+
+
+class Histogram(_Metric):
+    """
+    A distribution of observed values (durations, in seconds) over fixed buckets.
+    Observing a value is one bisect and three additions under a lock.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label combination: [count per bucket (the last one is +Inf), sum, count].
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """
+        Observes the wall-clock duration of a `with` block, whether or not it raises.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "buckets": list(self.buckets),
+                "samples": [[list(key), [list(counts), total, count]] for key, (counts, total, count) in self._values.items()],
+            }
+
+
+# ==============================================================================
+# 4. REGISTRY & CROSS-WORKER AGGREGATION
+# ==============================================================================
+
+class MetricsRegistry:
+    """
+    The metrics of one worker process, plus the plumbing to share them.
+
+    Each worker periodically writes a JSON snapshot of its metrics to
+    `<directory>/<pid>.json`. Whichever worker answers `/metrics` merges the
+    snapshots of all live workers (counters, gauges and histogram buckets are
+    summed), so the scrape covers the whole host whatever worker it reaches.
+    """
+
+    def __init__(self, directory: str = METRICS_DIR, flush_interval: float = METRICS_FLUSH_INTERVAL_SECONDS):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics: List[_Metric] = []
+        self._writer: Optional[threading.Thread] = None
+        self._writer_pid: Optional[int] = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              function: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = REQUEST_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> dict:
+        """
+        Returns this worker's metrics, keyed by metric name.
+        """
+        return {
+            metric.name: {
+                "type": metric.kind,
+                "help": metric.documentation,
+                "labels": list(metric.labelnames),
+                **metric.snapshot(),
+            }
+            for metric in self._metrics
+        }
+
+    # --- Snapshot files ---
+    def write_snapshot(self) -> None:
+        """
+        Writes this worker's snapshot file (atomically, so readers never see half of it).
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(temp_path, self._path(os.getpid()))
+        except OSError as e:
+            print(f"Could not write metrics snapshot: {e}")
+
+    def start(self) -> None:
+        """
+        Starts the background thread that writes this worker's snapshot. Call it
+        in each worker process (after gunicorn forks); later calls do nothing.
+        """
+        with self._lock:
+            if self._writer is not None and self._writer_pid == os.getpid():
+                return
+            self._stopped.clear()
+            self._writer_pid = os.getpid()
+            self._writer = threading.Thread(target=self._write_periodically, name="metrics-writer", daemon=True)
+            self._writer.start()
+
+    def stop(self) -> None:
+        """
+        Stops the writer thread and removes this worker's snapshot, so a worker
+        that exits cleanly stops being counted.
+        """
+        self._stopped.set()
+        try:
+            os.unlink(self._path(os.getpid()))
+        except OSError:
+            pass
+
+    def _write_periodically(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            self.write_snapshot()
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def _read_snapshots(self) -> List[dict]:
+        """
+        Reads the snapshot of every live worker, deleting those of workers that died.
+        """
+        snapshots = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return snapshots
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                pid = int(name[:-5])
+            except ValueError:
+                continue
+            if not _process_alive(pid):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                # Being replaced right now, or unreadable; it will be there next scrape.
+                continue
+        return snapshots
+
+    # --- Exposition ---
+    def collect(self) -> dict:
+        """
+        Merges the snapshots of all live workers on the host.
+
+        Returns:
+            dict: The merged metrics, in the same shape as `snapshot()`.
+        """
+        self.write_snapshot()
+        merged: Dict[str, dict] = {}
+        for snapshot in self._read_snapshots():
+            for name, metric in snapshot.items():
+                target = merged.setdefault(name, {**metric, "samples": {}})
+                for labels, value in metric["samples"]:
+                    key = tuple(labels)
+                    if metric["type"] != "histogram":
+                        target["samples"][key] = target["samples"].get(key, 0.0) + value
+                        continue
+                    if metric["buckets"] != target["buckets"]:
+                        # A worker still running an older bucket layout; skip it until it restarts.
+                        continue
+                    counts, total, count = value
+                    current = target["samples"].get(key)
+                    if current is None:
+                        target["samples"][key] = [list(counts), total, count]
+                    else:
+                        current[0] = [a + b for a, b in zip(current[0], counts)]
+                        current[1] += total
+                        current[2] += count
+        return merged
+
+    def render(self) -> str:
+        """
+        Returns the host-wide metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for name, metric in sorted(self.collect().items()):
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            labelnames = metric["labels"]
+            for key, value in sorted(metric["samples"].items()):
+                labels = list(zip(labelnames, key))
+                if metric["type"] != "histogram":
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(list(metric["buckets"]) + [math.inf], counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == math.inf else _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _process_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The process exists but belongs to someone else.
+        return True
+    return True
+
+
+def _format_labels(labels: List[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+# --- Shared Instance ---
+# One registry per worker process; the metrics below are recorded across the app.
+registry = MetricsRegistry()
+
+
+# ==============================================================================
+# 5. APPLICATION METRICS
+# ==============================================================================
+STAGE_DURATION = registry.histogram(
+    "stage_duration_seconds", "Duration of one agent stage, including retries.", ("stage", "outcome", "model"), LLM_BUCKETS)
+STAGE_RETRIES = registry.counter(
+    "stage_retries_total", "Failed agent stage attempts that were retried.", ("stage",))
+SEARCH_DURATION = registry.histogram(
+    "search_duration_seconds", "Duration of a web search tool call.", ("cache",), REQUEST_BUCKETS)
+DB_QUERY_DURATION = registry.histogram(
+    "db_query_duration_seconds", "Duration of one database statement.", ("operation",), FAST_BUCKETS)
+PDF_RENDER_DURATION = registry.histogram(
+    "pdf_render_duration_seconds", "Duration of rendering one PDF on the process pool.", (), REQUEST_BUCKETS)
+SSE_TIME_TO_FIRST_EVENT = registry.histogram(
+    "sse_time_to_first_event_seconds", "Time from opening an event stream to sending its first event.", ("endpoint",), REQUEST_BUCKETS)
+SSE_TIME_TO_FINAL_EVENT = registry.histogram(
+    "sse_time_to_final_event_seconds", "Time from opening an event stream to sending its last event.", ("endpoint",), LLM_BUCKETS)
+ERRORS = registry.counter(
+    "errors_total", "Errors by the component that reported them.", ("source",))
+RATE_LIMITED = registry.counter(
+    "rate_limited_total", "Requests rejected by the per-user rate limits.", ("kind",))
+ACTIVE_STREAMS = registry.gauge(
+    "active_streams", "Event streams currently open.")
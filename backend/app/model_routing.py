@@ -0,0 +1,191 @@
+# ==============================================================================
+# 1. IMPORTS
+# ==============================================================================
+# --- Standard Library Imports ---
+import math
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Tuple
+
+
+# ==============================================================================
+# 2. CONFIGURATION CONSTANTS
+# ==============================================================================
+
+def parse_mapping(text: str) -> Dict[str, str]:
+    """
+    Parses a "key=value,key=value" configuration string.
+    """
+    mapping = {}
+    for item in text.split(","):
+        if "=" in item:
+            key, value = item.split("=", 1)
+            mapping[key.strip()] = value.strip()
+    return mapping
+
+
+# The model behind each tier.
+MODEL_TIERS = parse_mapping(os.getenv(
+    "MODEL_TIERS", "premium=gpt-4.1,standard=gpt-4.1-mini,fast=gpt-4.1-nano"
+))
+
+# Tiers from slowest (and most capable) to fastest. A slow stage falls back one step to the right.
+MODEL_TIER_ORDER = tuple(
+    tier.strip() for tier in os.getenv("MODEL_TIER_ORDER", "premium,standard,fast").split(",") if tier.strip() in MODEL_TIERS
+)
+
+# The tier each stage (by stage key, plus "qna" for follow-ups) runs on. Every stage keeps
+# the standard tier unless listed here, e.g. "vision=fast,critique=fast" to trade some
+# quality on the short outputs for speed. Stages not listed use DEFAULT_MODEL_TIER.
+STAGE_MODEL_TIERS = parse_mapping(os.getenv("STAGE_MODEL_TIERS", ""))
+DEFAULT_MODEL_TIER = os.getenv("DEFAULT_MODEL_TIER", "standard")
+if DEFAULT_MODEL_TIER not in MODEL_TIER_ORDER:
+    raise ValueError(
+        f"DEFAULT_MODEL_TIER is '{DEFAULT_MODEL_TIER}', but it must be one of the tiers in "
+        f"MODEL_TIER_ORDER that MODEL_TIERS defines: {', '.join(MODEL_TIER_ORDER) or '(none)'}."
+    )
+
+# A stage whose rolling p95 latency on its current tier passes this many seconds moves
+# to the next faster tier, once at least MODEL_FALLBACK_MIN_SAMPLES calls were measured.
+MODEL_FALLBACK_P95_SECONDS = float(os.getenv("MODEL_FALLBACK_P95_SECONDS", "45"))
+MODEL_FALLBACK_MIN_SAMPLES = int(os.getenv("MODEL_FALLBACK_MIN_SAMPLES", "5"))
+
+# Calls per stage and tier the p95 is computed over.
+MODEL_LATENCY_WINDOW = int(os.getenv("MODEL_LATENCY_WINDOW", "20"))
+
+# How long a stage stays on the faster tier before its configured tier is tried again, in seconds.
+MODEL_FALLBACK_COOLDOWN_SECONDS = float(os.getenv("MODEL_FALLBACK_COOLDOWN_SECONDS", "300"))
+
+
+# ==============================================================================
+# 3. ROUTER
+# ==============================================================================
+
+def p95(samples: Deque[float]) -> float:
+    """
+    Returns the nearest-rank 95th percentile of the samples (0 if there are none).
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[max(1, math.ceil(0.95 * len(ordered))) - 1]
+
+
+@dataclass
+class _StageRoute:
+    base_tier: str
+    # Steps taken towards the fast end of MODEL_TIER_ORDER, and until when.
+    fallback_steps: int = 0
+    fallback_until: float = 0.0
+    latencies: Dict[str, Deque[float]] = field(default_factory=dict)
+
+
+class ModelRouter:
+    """
+    Maps each stage to a model tier, and moves a stage to a faster tier while
+    its rolling p95 latency on the current one is above the threshold.
+
+    After MODEL_FALLBACK_COOLDOWN_SECONDS the stage steps back towards its
+    configured tier; if that tier is still slow, it falls back again once enough
+    new calls were measured.
+    """
+
+    def __init__(self, stage_tiers: Dict[str, str] = STAGE_MODEL_TIERS, threshold_seconds: float = MODEL_FALLBACK_P95_SECONDS):
+        self.stage_tiers = stage_tiers
+        self.threshold_seconds = threshold_seconds
+        self._routes: Dict[str, _StageRoute] = {}
+        self._lock = threading.Lock()
+        self.fallbacks = 0
+
+    def configured_tier(self, stage_key: str) -> str:
+        """
+        Returns the tier a stage is configured to run on, ignoring any fallback.
+        """
+        with self._lock:
+            return self._route(stage_key).base_tier
+
+    def select(self, stage_key: str) -> Tuple[str, str]:
+        """
+        Picks the tier for the next call of a stage.
+
+        Args:
+            stage_key (str): The stage key (or "qna").
+
+        Returns:
+            Tuple[str, str]: The tier and its model name.
+        """
+        with self._lock:
+            route = self._route(stage_key)
+            if route.fallback_steps and time.monotonic() >= route.fallback_until:
+                route.fallback_steps -= 1
+                route.fallback_until = time.monotonic() + MODEL_FALLBACK_COOLDOWN_SECONDS if route.fallback_steps else 0.0
+                print(f"Model routing: trying {stage_key} on the {self._tier(route)} tier again.")
+            tier = self._tier(route)
+        return tier, MODEL_TIERS[tier]
+
+    def record(self, stage_key: str, tier: str, seconds: float) -> None:
+        """
+        Adds the latency of one call (including failed ones, which are usually timeouts)
+        and falls back to a faster tier if the stage's current tier has become too slow.
+        """
+        with self._lock:
+            route = self._route(stage_key)
+            latencies = route.latencies.setdefault(tier, deque(maxlen=MODEL_LATENCY_WINDOW))
+            latencies.append(seconds)
+            if tier != self._tier(route) or len(latencies) < MODEL_FALLBACK_MIN_SAMPLES:
+                return
+            current_p95 = p95(latencies)
+            if current_p95 <= self.threshold_seconds or not self._can_fall_back(route):
+                return
+            route.fallback_steps += 1
+            route.fallback_until = time.monotonic() + MODEL_FALLBACK_COOLDOWN_SECONDS
+            # Judge the tier afresh when the stage comes back to it.
+            latencies.clear()
+            self.fallbacks += 1
+            print(f"Model routing: {stage_key} p95 {current_p95:.1f}s on the {tier} tier, "
+                  f"falling back to {self._tier(route)} for {MODEL_FALLBACK_COOLDOWN_SECONDS:.0f}s.")
+
+    def stats(self) -> dict:
+        """
+        Returns the current tier and the rolling p95 per tier of every stage seen so far.
+        """
+        with self._lock:
+            return {
+                "fallbacks": self.fallbacks,
+                "stages": {
+                    stage_key: {
+                        "configured_tier": route.base_tier,
+                        "current_tier": self._tier(route),
+                        "p95_seconds": {tier: round(p95(samples), 2) for tier, samples in route.latencies.items() if samples},
+                    }
+                    for stage_key, route in self._routes.items()
+                },
+            }
+
+    def _route(self, stage_key: str) -> _StageRoute:
+        """
+        Returns the routing state of a stage. Caller must hold the lock.
+        """
+        route = self._routes.get(stage_key)
+        if route is None:
+            base_tier = self.stage_tiers.get(stage_key, DEFAULT_MODEL_TIER)
+            if base_tier not in MODEL_TIER_ORDER:
+                print(f"Unknown model tier '{base_tier}' for {stage_key}, using {DEFAULT_MODEL_TIER}.")
+                base_tier = DEFAULT_MODEL_TIER
+            route = self._routes[stage_key] = _StageRoute(base_tier=base_tier)
+        return route
+
+    def _tier(self, route: _StageRoute) -> str:
+        index = MODEL_TIER_ORDER.index(route.base_tier) + route.fallback_steps
+        return MODEL_TIER_ORDER[min(index, len(MODEL_TIER_ORDER) - 1)]
+
+    def _can_fall_back(self, route: _StageRoute) -> bool:
+        return MODEL_TIER_ORDER.index(route.base_tier) + route.fallback_steps < len(MODEL_TIER_ORDER) - 1
+
+
+# --- Shared Instance ---
+# One router per worker process; each worker measures its own calls.
+model_router = ModelRouter()
@@ -5,11 +5,12 @@
 import datetime
 
 # --- Third-party Library Imports ---
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index, JSON, LargeBinary, UniqueConstraint
+from sqlalchemy.orm import deferred, relationship
 
 # --- Local Application Imports ---
 from .database import Base
+from .report_store import decompress_report
 
 
 # ==============================================================================
@@ -30,6 +31,7 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False, comment="User's unique email address.")
     username = Column(String, unique=True, index=True, nullable=False, comment="User's unique public username.")
     hashed_password = Column(String, nullable=False, comment="Hashed password for security.")
+    tier = Column(String, nullable=True, comment="Rate-limit tier, e.g. 'free' or 'pro'. NULL means the default tier.")
     
     # --- Relationships ---
     # Defines the one-to-many relationship between a User and their Analyses.
@@ -46,7 +48,16 @@ class Analysis(Base):
     # --- Table Columns ---
     id = Column(Integer, primary_key=True, index=True, comment="Primary key for the analysis.")
     idea_prompt = Column(String, index=True, comment="The initial business idea prompt submitted by the user.")
-    report_markdown = Column(Text, comment="The full final report generated by the AI, stored in Markdown format.")
+    # The report body lives in `report_blobs`, addressed by its digest, so identical reports
+    # are stored once and loading an analysis row never reads it. Rows saved before that
+    # keep the body inline; the column is deferred so it is only read when asked for.
+    legacy_report_markdown = deferred(Column("report_markdown", Text, nullable=True, comment="Inline report body of analyses saved before report_blobs existed."))
+    report_digest = Column(String(64), ForeignKey("report_blobs.digest"), nullable=True, index=True, comment="Digest of the report in report_blobs.")
+    memory_digest = Column(Text, nullable=True, comment="Compact summary of the report, used as long-term memory context.")
+    token_usage = Column(JSON, nullable=True, comment="Prompt and completion tokens per pipeline stage, plus a 'total' entry.")
+    stage_models = Column(JSON, nullable=True, comment="Model that served each pipeline stage, by stage key.")
+    # Deferred so loading a report never pulls the vector along with it.
+    embedding = deferred(Column(LargeBinary, nullable=True, comment="Hashed text embedding of the analysis, used to rank long-term memory."))
     created_at = Column(DateTime, default=datetime.datetime.utcnow, comment="Timestamp for when the analysis was created.")
     
     # Foreign key to link this analysis to a user.
@@ -55,4 +66,103 @@ class Analysis(Base):
     # --- Relationships ---
     # Defines the many-to-one relationship back to the User who owns this analysis.
     owner = relationship("User", back_populates="analyses")
+    report_blob = relationship("ReportBlob")
+    # The follow-up conversation about this analysis; deleted along with it.
+    follow_up_turns = relationship("FollowUpTurn", back_populates="analysis", cascade="all, delete-orphan")
 
+    # --- Indexes ---
+    # Serves the history listing (one user's analyses, newest first) straight from the index.
+    __table_args__ = (
+        Index("ix_analyses_owner_id_created_at", owner_id, created_at.desc()),
+    )
+
+    @property
+    def report_markdown(self) -> str | None:
+        """
+        The full final report in Markdown, from its blob or, for older rows, inline.
+        Load it with `crud.FULL_ANALYSIS_OPTIONS` to avoid extra queries.
+        """
+        if self.report_digest is not None:
+            return self.report_blob.text()
+        return self.legacy_report_markdown
+
+
+class ReportBlob(Base):
+    """
+    A compressed report body, stored once however many analyses share it
+    (e.g. the same report served from the cache or saved again after a retry).
+    """
+    __tablename__ = "report_blobs"
+
+    # --- Table Columns ---
+    digest = Column(String(64), primary_key=True, comment="Hex SHA-256 of the uncompressed report.")
+    codec = Column(String(8), nullable=False, comment="Compression of `body`: 'zstd', 'zlib' or 'none'.")
+    body = Column(LargeBinary, nullable=False, comment="The report Markdown, UTF-8 encoded and compressed.")
+    size = Column(Integer, nullable=False, comment="Size of the uncompressed report in bytes.")
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, comment="Timestamp for when the report was first stored.")
+
+    def text(self) -> str:
+        """
+        Returns the uncompressed report.
+        """
+        return decompress_report(self.codec, self.body)
+
+
+class FollowUpTurn(Base):
+    """
+    One question asked about an analysis and the answer it got.
+    """
+    __tablename__ = "follow_up_turns"
+
+    # --- Table Columns ---
+    id = Column(Integer, primary_key=True, comment="Primary key for the turn; increases with each question.")
+    analysis_id = Column(Integer, ForeignKey("analyses.id", ondelete="CASCADE"), nullable=False, index=True)
+    question = Column(Text, nullable=False, comment="The user's question.")
+    answer = Column(Text, nullable=False, comment="The Q&A agent's answer.")
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, comment="Timestamp for when the question was answered.")
+
+    # --- Relationships ---
+    analysis = relationship("Analysis", back_populates="follow_up_turns")
+
+
+class AnalysisRun(Base):
+    """
+    An analysis that has started but not finished. Holds the checkpointed output
+    of every completed stage, so a failed run can be resumed without redoing them.
+    The run is replaced by an `Analysis` once the report is saved.
+    """
+    __tablename__ = "analysis_runs"
+
+    # --- Table Columns ---
+    id = Column(Integer, primary_key=True, index=True, comment="Primary key for the run.")
+    idea_prompt = Column(String, comment="The business idea being analyzed.")
+    status = Column(String, default="pending", nullable=False, comment="'pending' while running, 'failed' when it can be resumed.")
+    error = Column(Text, nullable=True, comment="The error that stopped the last attempt.")
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, comment="Timestamp for when the run was started.")
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, comment="Timestamp of the last status change.")
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
+
+    # --- Relationships ---
+    stages = relationship("AnalysisRunStage", back_populates="run", cascade="all, delete-orphan")
+
+
+class AnalysisRunStage(Base):
+    """
+    The output of one finished pipeline stage of an `AnalysisRun` (or one of its seed values).
+    """
+    __tablename__ = "analysis_run_stages"
+
+    # --- Table Columns ---
+    id = Column(Integer, primary_key=True, comment="Primary key for the checkpoint.")
+    run_id = Column(Integer, ForeignKey("analysis_runs.id", ondelete="CASCADE"), nullable=False)
+    stage_key = Column(String, nullable=False, comment="The pipeline value this output provides (e.g. 'vision').")
+    output = Column(Text, comment="The stage output.")
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, comment="Timestamp for when the stage finished.")
+
+    # --- Relationships ---
+    run = relationship("AnalysisRun", back_populates="stages")
+
+    # --- Constraints ---
+    __table_args__ = (
+        UniqueConstraint("run_id", "stage_key", name="uq_analysis_run_stages_run_id_stage_key"),
+    )
@@ -0,0 +1,298 @@
+# ==============================================================================
+# 1. IMPORTS
+# ==============================================================================
+# --- Standard Library Imports ---
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+# --- Local Application Imports ---
+from .metrics import ERRORS, PDF_RENDER_DURATION
+
+
+# ==============================================================================
+# 2. CONFIGURATION CONSTANTS
+# ==============================================================================
+# Processes dedicated to PDF rendering, per worker process. markdown2 + WeasyPrint
+# take hundreds of milliseconds to seconds of CPU per report and hold the GIL.
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+
+# Directory of rendered PDFs, shared by all worker processes on the host.
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "venturemind-pdf-cache"))
+
+# Total size of the cached PDFs. The least recently served files are deleted beyond it.
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# The HTML page a report is rendered into. Part of the cache key, so editing it
+# invalidates every cached PDF.
+PDF_TEMPLATE = (
+    "<html><head><style>body {{ font-family: sans-serif; line-height: 1.6; }} "
+    "h1, h2, h3 {{ color: #333; border-bottom: 1px solid #eee; padding-bottom: 5px;}}</style></head>"
+    "<body><h1>VentureMind Report for {username}</h1>{body}</body></html>"
+)
+
+
+# ==============================================================================
+# 3. RENDERING (RUNS IN THE POOL PROCESSES)
+# ==============================================================================
+
+def render_pdf(markdown_content: str, username: str) -> bytes:
+    """
+    Converts a Markdown report to a PDF.
+
+    Args:
+        markdown_content (str): The report in Markdown.
+        username (str): The name shown in the report heading.
+
+    Returns:
+        bytes: The PDF document.
+    """
+    # Imported here so only the pool processes pay for loading WeasyPrint.
+    import markdown2
+    from weasyprint import HTML
+
+    html_content = markdown2.markdown(markdown_content, extras=["tables", "fenced-code-blocks"])
+    styled_html = PDF_TEMPLATE.format(username=username, body=html_content)
+    return HTML(string=styled_html).write_pdf()
+
+
+_render_executor: Optional[ProcessPoolExecutor] = None
+_render_executor_lock = threading.Lock()
+
+
+def _get_render_executor() -> ProcessPoolExecutor:
+    """
+    Returns the rendering process pool, creating it on first use (after gunicorn forks).
+    """
+    global _render_executor
+    with _render_executor_lock:
+        if _render_executor is None:
+            _render_executor = ProcessPoolExecutor(
+                max_workers=PDF_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _render_executor
+
+
+def shutdown_render_pool() -> None:
+    """
+    Stops the rendering processes, if they were started.
+    """
+    global _render_executor
+    with _render_executor_lock:
+        if _render_executor is not None:
+            _render_executor.shutdown(wait=False, cancel_futures=True)
+            _render_executor = None
+
+
+# ==============================================================================
+# 4. CONTENT-ADDRESSED DISK CACHE
+# ==============================================================================
+
+def cache_key(markdown_content: str, username: str) -> str:
+    """
+    Returns the content address of a PDF: a hash of everything that affects its bytes.
+    The key doubles as the response's ETag.
+
+    Args:
+        markdown_content (str): The report in Markdown.
+        username (str): The name shown in the report heading.
+
+    Returns:
+        str: A hex SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    for part in (PDF_TEMPLATE, username, markdown_content):
+        encoded = part.encode("utf-8")
+        # Length-prefix each part so different splits of the same text never collide.
+        digest.update(len(encoded).to_bytes(8, "big"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+class PdfCache:
+    """
+    Rendered PDFs stored as `<key>.pdf` files, evicted least recently served first
+    once their total size passes `max_bytes`.
+
+    Every worker keeps its own LRU view of the shared directory, seeded from the
+    files' modification times (refreshed on each hit). A file deleted by another
+    worker is simply a miss.
+    """
+
+    def __init__(self, directory: str = PDF_CACHE_DIR, max_bytes: int = PDF_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._files: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Returns the cached PDF for a key, or None on a miss.
+        """
+        self._load()
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                pdf_bytes = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._forget(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            if key not in self._files:
+                self._files[key] = len(pdf_bytes)
+                self._bytes += len(pdf_bytes)
+            self._files.move_to_end(key)
+            self.hits += 1
+        return pdf_bytes
+
+    def put(self, key: str, pdf_bytes: bytes) -> None:
+        """
+        Stores a rendered PDF, then evicts the least recently served files if over budget.
+        """
+        if len(pdf_bytes) > self.max_bytes:
+            return
+        self._load()
+        # Write to a temporary name first so readers never see a partial file.
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(pdf_bytes)
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            print(f"Could not cache PDF: {e}")
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._forget(key)
+            self._files[key] = len(pdf_bytes)
+            self._bytes += len(pdf_bytes)
+            while self._bytes > self.max_bytes and len(self._files) > 1:
+                evicted_key, _ = next(iter(self._files.items()))
+                self._forget(evicted_key)
+                self.evictions += 1
+                try:
+                    os.unlink(self._path(evicted_key))
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        """
+        Returns the hit/miss counters and the current size of the cache.
+        """
+        with self._lock:
+            return {
+                "files": len(self._files),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def _forget(self, key: str) -> None:
+        """
+        Drops a key from the LRU view. Caller must hold the lock.
+        """
+        size = self._files.pop(key, None)
+        if size is not None:
+            self._bytes -= size
+
+    def _load(self) -> None:
+        """
+        Creates the directory and indexes the files already in it, oldest first.
+        """
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            entries = []
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(".pdf"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+            for _, key, size in sorted(entries):
+                self._files[key] = size
+                self._bytes += size
+            self._loaded = True
+
+
+# ==============================================================================
+# 5. PUBLIC ENTRY POINT
+# ==============================================================================
+
+# Renders in progress in this worker, so concurrent exports of the same report render once.
+_in_flight: Dict[str, "asyncio.Future[bytes]"] = {}
+
+
+async def get_or_render_pdf(markdown_content: str, username: str, key: Optional[str] = None) -> bytes:
+    """
+    Returns the PDF for a report from the disk cache, rendering it on the process pool on a miss.
+
+    Args:
+        markdown_content (str): The report in Markdown.
+        username (str): The name shown in the report heading.
+        key (Optional[str]): The precomputed `cache_key`, if the caller already has it.
+
+    Returns:
+        bytes: The PDF document.
+    """
+    key = key or cache_key(markdown_content, username)
+    pdf_bytes = await asyncio.to_thread(pdf_cache.get, key)
+    if pdf_bytes is not None:
+        return pdf_bytes
+
+    in_flight = _in_flight.get(key)
+    if in_flight is not None:
+        return await asyncio.shield(in_flight)
+
+    loop = asyncio.get_running_loop()
+    in_flight = _in_flight[key] = loop.create_future()
+    try:
+        start = time.perf_counter()
+        pdf_bytes = await loop.run_in_executor(_get_render_executor(), render_pdf, markdown_content, username)
+        PDF_RENDER_DURATION.observe(time.perf_counter() - start)
+        await asyncio.to_thread(pdf_cache.put, key, pdf_bytes)
+        in_flight.set_result(pdf_bytes)
+        return pdf_bytes
+    except asyncio.CancelledError:
+        in_flight.cancel()
+        raise
+    except Exception as e:
+        ERRORS.inc(source="pdf")
+        in_flight.set_exception(e)
+        # Mark the exception as retrieved in case nobody else was waiting.
+        in_flight.exception()
+        raise
+    finally:
+        _in_flight.pop(key, None)
+
+
+# --- Shared Instance ---
+# One LRU view per worker process over the shared cache directory.
+pdf_cache = PdfCache()
@@ -0,0 +1,265 @@
+# ==============================================================================
+# 1. IMPORTS
+# ==============================================================================
+# --- Standard Library Imports ---
+import asyncio
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+# --- Local Application Imports ---
+from .metrics import ERRORS, STAGE_DURATION, STAGE_RETRIES
+from .streaming import TokenStreamHandler, stream_handler_var
+from .token_budget import STAGE_PROMPT_TOKEN_BUDGET, fit_template, new_usage
+from .workers import run_llm_call
+
+
+# ==============================================================================
+# 2. CONFIGURATION CONSTANTS
+# ==============================================================================
+# Attempts per stage before the pipeline gives up (1 disables retries).
+STAGE_MAX_ATTEMPTS = int(os.getenv("STAGE_MAX_ATTEMPTS", "3"))
+
+# Exponential backoff between attempts, in seconds: base, 2 x base, ... capped at the max,
+# with jitter so parallel stages hitting the same provider error do not retry in lockstep.
+STAGE_RETRY_BASE_DELAY_SECONDS = float(os.getenv("STAGE_RETRY_BASE_DELAY_SECONDS", "2"))
+STAGE_RETRY_MAX_DELAY_SECONDS = float(os.getenv("STAGE_RETRY_MAX_DELAY_SECONDS", "20"))
+
+
+# ==============================================================================
+# 3. STAGE DECLARATION
+# ==============================================================================
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    A single node of the analysis pipeline.
+
+    A stage runs one agent on a task whose description is rendered from the
+    outputs of the stages listed in `inputs` (plus the seed values passed to
+    `run_pipeline`, such as `idea` and `history_context`). Its own output is
+    stored under `key`, so later stages can reference it by that name.
+
+    The rendered description is capped at STAGE_PROMPT_TOKEN_BUDGET tokens by
+    trimming the inputs named in `trim_order`, lowest priority first.
+
+    With a `router`, each attempt runs on the agent `router.select(key)` returns
+    (agent, tier, model), and its latency is reported back with `router.record`.
+    `agent` then only names the stage in events.
+    """
+    key: str
+    agent: Any
+    inputs: Tuple[str, ...]
+    description: str
+    expected_output: str
+    label: str
+    progress_message: str
+    trim_order: Tuple[str, ...] = ()
+    router: Any = None
+
+    def render(self, values: Dict[str, str]) -> str:
+        """
+        Renders the task description with the available pipeline values, within the token budget.
+
+        Args:
+            values (Dict[str, str]): Seed values and outputs of finished stages.
+
+        Returns:
+            str: The task description to hand to the agent.
+        """
+        inputs = {name: values[name] for name in self.inputs}
+        return fit_template(self.description, inputs, STAGE_PROMPT_TOKEN_BUDGET, self.trim_order)
+
+
+class PipelineError(Exception):
+    """
+    Raised when a stage fails. Carries the failing stage for error reporting.
+    """
+    def __init__(self, stage: Stage, error: Exception):
+        self.stage = stage
+        self.error = error
+        super().__init__(f"Error in {stage.label}: {error}")
+
+
+def validate_stages(stages: Iterable[Stage], seeds: Iterable[str]) -> List[Stage]:
+    """
+    Checks that every stage input is produced by a seed or another stage and
+    that the dependency graph has no cycles.
+
+    Args:
+        stages (Iterable[Stage]): The declared stages.
+        seeds (Iterable[str]): Names of the values available before any stage runs.
+
+    Returns:
+        List[Stage]: The stages in a valid topological order.
+    """
+    stages = list(stages)
+    available = set(seeds)
+    keys = {stage.key for stage in stages}
+    for stage in stages:
+        unknown = set(stage.inputs) - keys - available
+        if unknown:
+            raise ValueError(f"Stage '{stage.key}' depends on unknown inputs: {sorted(unknown)}")
+
+    ordered: List[Stage] = []
+    remaining = list(stages)
+    while remaining:
+        ready = [stage for stage in remaining if set(stage.inputs) <= available]
+        if not ready:
+            raise ValueError(f"Pipeline has a dependency cycle among: {[s.key for s in remaining]}")
+        for stage in ready:
+            ordered.append(stage)
+            available.add(stage.key)
+            remaining.remove(stage)
+    return ordered
+
+
+# ==============================================================================
+# 4. SCHEDULER
+# ==============================================================================
+
+# Called with each finished stage and its output, e.g. to persist a checkpoint.
+Checkpoint = Callable[[Stage, str], Awaitable[None]]
+
+
+def retry_delay(attempt: int) -> float:
+    """
+    Returns the backoff before retrying after the given (1-based) failed attempt.
+    """
+    delay = min(STAGE_RETRY_MAX_DELAY_SECONDS, STAGE_RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+async def _execute_stage(stage: Stage, values: Dict[str, str], events: asyncio.Queue, usage: Dict[str, int],
+                         models: Dict[str, str]) -> str:
+    """
+    Runs a single stage's task on the LLM worker pool so the event loop stays free,
+    streaming the agent's answer tokens into `events` as they are generated.
+
+    A failed attempt is retried up to STAGE_MAX_ATTEMPTS times with bounded
+    exponential backoff; a `stage_retry` event tells the client to discard the
+    tokens of the failed attempt. Token usage of every attempt is added to `usage`,
+    and the model of the last attempt is stored in `models` under the stage key.
+    """
+    # Imported here so importing the pipeline does not load crewai (the agents already did).
+    from crewai import Task
+
+    role = stage.agent.role
+    handler = TokenStreamHandler(
+        asyncio.get_running_loop(),
+        lambda token: events.put_nowait(("event", {'type': 'token', 'agent': role, 'token': token})),
+        usage=usage
+    )
+    # Each asyncio task runs in its own context copy, so this binding is local to the stage.
+    stream_handler_var.set(handler)
+
+    attempt = 1
+    start = time.perf_counter()
+    while True:
+        agent, tier, model = stage.agent, None, None
+        if stage.router is not None:
+            agent, tier, model = stage.router.select(stage.key)
+            models[stage.key] = model
+        task = Task(
+            description=stage.render(values),
+            agent=agent,
+            expected_output=stage.expected_output
+        )
+        attempt_start = time.perf_counter()
+        try:
+            output = await run_llm_call(task.execute)
+            if stage.router is not None:
+                stage.router.record(stage.key, tier, time.perf_counter() - attempt_start)
+            STAGE_DURATION.observe(time.perf_counter() - start, stage=role, outcome="completed", model=model or "")
+            return output
+        except Exception as e:
+            if stage.router is not None:
+                stage.router.record(stage.key, tier, time.perf_counter() - attempt_start)
+            if attempt >= STAGE_MAX_ATTEMPTS:
+                STAGE_DURATION.observe(time.perf_counter() - start, stage=role, outcome="failed", model=model or "")
+                ERRORS.inc(source="stage")
+                raise
+            delay = retry_delay(attempt)
+            print(f"{stage.label} failed (attempt {attempt}/{STAGE_MAX_ATTEMPTS}), retrying in {delay:.1f}s: {e}")
+            STAGE_RETRIES.inc(stage=role)
+            attempt += 1
+            events.put_nowait(("event", {
+                'type': 'stage_retry', 'agent': role, 'attempt': attempt,
+                'max_attempts': STAGE_MAX_ATTEMPTS, 'message': str(e)
+            }))
+            await asyncio.sleep(delay)
+
+
+async def run_pipeline(stages: Iterable[Stage], values: Dict[str, str],
+                       checkpoint: Optional[Checkpoint] = None,
+                       usage: Optional[Dict[str, Dict[str, int]]] = None,
+                       models: Optional[Dict[str, str]] = None) -> AsyncGenerator[dict, None]:
+    """
+    Runs the stages as a dependency graph, starting every stage as soon as all
+    of its inputs are available. The end-to-end latency is therefore the
+    critical path of the graph rather than the sum of all stages.
+
+    Stage outputs are written into `values` under each stage's key, so the
+    caller can read the final results once the generator is exhausted. Stages
+    whose key is already in `values` (restored from a checkpoint) are skipped.
+
+    Args:
+        stages (Iterable[Stage]): The declared pipeline stages.
+        values (Dict[str, str]): Seed values and restored outputs; receives the stage outputs.
+        checkpoint (Optional[Checkpoint]): Awaited with each stage's output as soon as it finishes.
+        usage (Optional[Dict[str, Dict[str, int]]]): Receives the token usage of each stage that runs, by key.
+        models (Optional[Dict[str, str]]): Receives the model that served each routed stage, by key.
+
+    Yields:
+        dict: `agent_start`, `token`, `agent_end` and `progress` events, in the order they happen.
+
+    Raises:
+        PipelineError: If any stage fails. Stages still running are cancelled.
+    """
+    ordered = validate_stages(stages, values.keys())
+    pending = [stage for stage in ordered if stage.key not in values]
+    total = len(ordered)
+    completed = total - len(pending)
+    running: Dict[asyncio.Task, Stage] = {}
+    # Token events and stage completions share one queue so they are yielded in order.
+    events: asyncio.Queue = asyncio.Queue()
+    usage = usage if usage is not None else {}
+    models = models if models is not None else {}
+
+    try:
+        while pending or running:
+            ready = [stage for stage in pending if all(name in values for name in stage.inputs)]
+            for stage in ready:
+                pending.remove(stage)
+                yield {'type': 'agent_start', 'agent': stage.agent.role}
+                usage[stage.key] = new_usage()
+                task = asyncio.create_task(_execute_stage(stage, dict(values), events, usage[stage.key], models))
+                task.add_done_callback(lambda finished: events.put_nowait(("done", finished)))
+                running[task] = stage
+
+            kind, item = await events.get()
+            if kind == "event":
+                yield item
+                continue
+
+            stage = running.pop(item)
+            try:
+                values[stage.key] = item.result()
+            except Exception as e:
+                raise PipelineError(stage, e) from e
+            if checkpoint is not None:
+                try:
+                    await checkpoint(stage, values[stage.key])
+                except Exception as e:
+                    # A lost checkpoint only costs resumability, not the run itself.
+                    print(f"Could not checkpoint {stage.label}: {e}")
+
+            completed += 1
+            yield {'type': 'agent_end', 'agent': stage.agent.role}
+            yield {'type': 'progress', 'step': completed, 'total': total, 'message': stage.progress_message}
+    finally:
+        # Stop any sibling stages if we are bailing out early (error or client disconnect).
+        for task in running:
+            task.cancel()
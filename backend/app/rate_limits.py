@@ -0,0 +1,230 @@
+# ==============================================================================
+# 1. IMPORTS
+# ==============================================================================
+# --- Standard Library Imports ---
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+# --- Local Application Imports ---
+from .model_routing import parse_mapping
+
+
+# ==============================================================================
+# 2. CONFIGURATION CONSTANTS
+# ==============================================================================
+
+def parse_limits(text: str) -> Dict[str, Tuple[float, int]]:
+    """
+    Parses a "tier=per_hour/burst,..." configuration string.
+    """
+    limits = {}
+    for tier, value in parse_mapping(text).items():
+        per_hour, _, burst = value.partition("/")
+        limits[tier] = (float(per_hour), int(burst or 1))
+    return limits
+
+
+# Requests per hour and burst size of each user tier, per kind of request. A user may
+# make `burst` requests back to back, then one every 3600 / per_hour seconds.
+# The buckets live in each worker process, so with N workers a user can get up to N
+# times these numbers in the worst case.
+ANALYSIS_RATE_LIMITS = parse_limits(os.getenv("ANALYSIS_RATE_LIMITS", "free=20/5,pro=120/20,internal=1200/100"))
+FOLLOW_UP_RATE_LIMITS = parse_limits(os.getenv("FOLLOW_UP_RATE_LIMITS", "free=120/20,pro=600/60,internal=6000/300"))
+
+# Share of the analysis and follow-up slots each tier gets when users are queued for them.
+USER_TIER_WEIGHTS = {tier: float(weight) for tier, weight in parse_mapping(
+    os.getenv("USER_TIER_WEIGHTS", "free=1,pro=3,internal=5")
+).items()}
+
+# The tier of users without one.
+DEFAULT_USER_TIER = os.getenv("DEFAULT_USER_TIER", "free")
+
+# Buckets kept per worker process. A full bucket is dropped first, which loses nothing.
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "10000"))
+
+RATE_LIMITS = {"analysis": ANALYSIS_RATE_LIMITS, "follow_up": FOLLOW_UP_RATE_LIMITS}
+for _kind, _limits in RATE_LIMITS.items():
+    if DEFAULT_USER_TIER not in _limits:
+        raise ValueError(
+            f"DEFAULT_USER_TIER is '{DEFAULT_USER_TIER}', but {_kind.upper()}_RATE_LIMITS has no limits "
+            f"for it (it defines: {', '.join(_limits) or '(none)'})."
+        )
+
+
+def tier_weight(tier: Optional[str]) -> float:
+    """
+    Returns the fair-queueing weight of a user tier.
+    """
+    return USER_TIER_WEIGHTS.get(tier or DEFAULT_USER_TIER, USER_TIER_WEIGHTS.get(DEFAULT_USER_TIER, 1.0))
+
+
+# ==============================================================================
+# 3. TOKEN BUCKETS
+# ==============================================================================
+
+@dataclass
+class RateLimitDecision:
+    """
+    The outcome of taking tokens from a bucket, with the values for the response headers.
+    """
+    allowed: bool
+    limit: int
+    remaining: int
+    # Seconds until the bucket is full again, and (when rejected) until enough tokens are back.
+    reset_seconds: float
+    retry_after_seconds: float
+    window_seconds: float
+
+    def headers(self) -> Dict[str, str]:
+        """
+        Returns the IETF `RateLimit-*` headers, plus `Retry-After` when rejected.
+        """
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset_seconds)),
+            "RateLimit-Policy": f"{self.limit};w={math.ceil(self.window_seconds)}",
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after_seconds)))
+        return headers
+
+
+class TokenBucket:
+    """
+    Holds up to `capacity` tokens and gains `rate` tokens per second.
+    """
+
+    def __init__(self, capacity: int, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, cost: int = 1) -> RateLimitDecision:
+        """
+        Takes `cost` tokens if there are enough.
+        """
+        self.refill(time.monotonic())
+        allowed = self.tokens >= cost
+        if allowed:
+            self.tokens -= cost
+        return RateLimitDecision(
+            allowed=allowed,
+            limit=self.capacity,
+            remaining=int(self.tokens),
+            reset_seconds=(self.capacity - self.tokens) / self.rate,
+            retry_after_seconds=0.0 if allowed else (cost - self.tokens) / self.rate,
+            window_seconds=self.capacity / self.rate,
+        )
+
+
+class RateLimiter:
+    """
+    One token bucket per user and kind of request ("analysis", "follow_up"),
+    sized by the user's tier. Unused buckets are dropped, least recently used first.
+    """
+
+    def __init__(self, limits: Dict[str, Dict[str, Tuple[float, int]]] = RATE_LIMITS, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self.limits = limits
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[Tuple[str, int], TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+
+    def take(self, kind: str, user_id: int, tier: Optional[str], cost: int = 1) -> RateLimitDecision:
+        """
+        Takes `cost` tokens from a user's bucket for a kind of request.
+
+        Args:
+            kind (str): "analysis" or "follow_up".
+            user_id (int): The user's ID.
+            tier (Optional[str]): The user's tier (None for the default tier).
+            cost (int): Tokens the request uses.
+
+        Returns:
+            RateLimitDecision: Whether the request may go ahead, and the header values.
+        """
+        decision = self._take(kind, user_id, tier, cost)
+        if decision.allowed:
+            self.allowed += 1
+        else:
+            self.rejected += 1
+        return decision
+
+    async def wait(self, kind: str, user_id: int, tier: Optional[str]) -> None:
+        """
+        Waits until a token can be taken from the user's bucket, then takes it.
+        Used for work that is paced rather than rejected, like the ideas of a batch.
+        """
+        while True:
+            decision = self._take(kind, user_id, tier, 1)
+            if decision.allowed:
+                return
+            await asyncio.sleep(decision.retry_after_seconds)
+
+    def refund(self, kind: str, user_id: int, cost: int = 1) -> None:
+        """
+        Gives back tokens taken for a request that was turned away before it did any
+        work (e.g. because the queue was full), so it does not count against the user.
+        """
+        with self._lock:
+            bucket = self._buckets.get((kind, user_id))
+            if bucket is None:
+                return
+            bucket.refill(time.monotonic())
+            bucket.tokens = min(bucket.capacity, bucket.tokens + cost)
+            self.allowed -= 1
+
+    def stats(self) -> dict:
+        """
+        Returns the decision counters and the number of buckets held.
+        """
+        return {"buckets": len(self._buckets), "allowed": self.allowed, "rejected": self.rejected}
+
+    def _take(self, kind: str, user_id: int, tier: Optional[str], cost: int) -> RateLimitDecision:
+        tier_limits = self.limits[kind]
+        tier = tier or DEFAULT_USER_TIER
+        if tier not in tier_limits:
+            tier = DEFAULT_USER_TIER
+        per_hour, burst = tier_limits[tier]
+        with self._lock:
+            key = (kind, user_id)
+            bucket = self._buckets.get(key)
+            if bucket is None or bucket.capacity != burst:
+                if bucket is None:
+                    self._make_room()
+                bucket = self._buckets[key] = TokenBucket(burst, per_hour / 3600)
+            self._buckets.move_to_end(key)
+            return bucket.take(cost)
+
+    def _make_room(self) -> None:
+        """
+        Drops buckets until a new one fits in `max_buckets`. Caller must hold the lock.
+        """
+        if len(self._buckets) < self.max_buckets:
+            return
+        now = time.monotonic()
+        for key in list(self._buckets):
+            bucket = self._buckets[key]
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self._buckets[key]
+        while len(self._buckets) >= self.max_buckets:
+            self._buckets.popitem(last=False)
+
+
+# --- Shared Instance ---
+# One limiter per worker process, checked by the analysis and follow-up endpoints.
+rate_limiter = RateLimiter()
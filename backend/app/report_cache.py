@@ -0,0 +1,194 @@
+# ==============================================================================
+# 1. IMPORTS
+# ==============================================================================
+# --- Standard Library Imports ---
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Optional, Set, Tuple
+
+
+# ==============================================================================
+# 2. CONFIGURATION CONSTANTS
+# ==============================================================================
+# How long a generated report may be served again, in seconds (default: one day).
+REPORT_CACHE_TTL_SECONDS = int(os.getenv("REPORT_CACHE_TTL_SECONDS", "86400"))
+
+# Maximum number of reports kept in memory per worker. The least recently used is evicted first.
+REPORT_CACHE_MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "256"))
+
+# Minimum word-set similarity (Jaccard, 0..1) for two ideas to count as near-duplicates.
+REPORT_CACHE_SIMILARITY = float(os.getenv("REPORT_CACHE_SIMILARITY", "0.85"))
+
+
+# ==============================================================================
+# 3. NORMALIZATION HELPERS
+# ==============================================================================
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_idea(idea: str) -> str:
+    """
+    Normalizes an idea so trivial differences (case, punctuation, spacing) map to the same key.
+
+    Args:
+        idea (str): The raw idea text submitted by the user.
+
+    Returns:
+        str: The lower-cased words of the idea joined by single spaces.
+    """
+    return " ".join(_WORD_RE.findall(idea.lower()))
+
+
+def _context_key(history_context: str) -> str:
+    """
+    Reduces the (potentially long) history context to a short, stable digest.
+    An empty context keeps an empty key so history-free reports are shared.
+    """
+    if not history_context:
+        return ""
+    return hashlib.sha256(history_context.encode("utf-8")).hexdigest()
+
+
+def _similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """
+    Jaccard similarity of two word sets.
+    """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# ==============================================================================
+# 4. REPORT CACHE
+# ==============================================================================
+
+@dataclass
+class _Entry:
+    report: str
+    words: FrozenSet[str]
+    expires_at: float
+
+
+class ReportCache:
+    """
+    An in-memory TTL + LRU cache of final reports, keyed by the normalized idea
+    and the history context it was generated with.
+
+    Exact matches are a dictionary lookup. If there is none, the entries that
+    share the same history context are scanned for a near-duplicate idea using
+    a cheap word-set similarity, so resubmissions with small edits still hit.
+    """
+
+    def __init__(self, ttl_seconds: int = REPORT_CACHE_TTL_SECONDS,
+                 max_entries: int = REPORT_CACHE_MAX_ENTRIES,
+                 similarity_threshold: float = REPORT_CACHE_SIMILARITY):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._by_context: Dict[str, Set[Tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def get(self, idea: str, history_context: str = "") -> Optional[str]:
+        """
+        Looks up a cached report for an idea, falling back to near-duplicate matching.
+
+        Args:
+            idea (str): The raw idea text.
+            history_context (str): The history context the report would be generated with.
+
+        Returns:
+            Optional[str]: The cached report, or None on a miss.
+        """
+        normalized = normalize_idea(idea)
+        context = _context_key(history_context)
+        key = (context, normalized)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.report
+
+            words = frozenset(normalized.split())
+            best_key, best_score = None, self.similarity_threshold
+            for candidate_key in list(self._by_context.get(context, ())):
+                candidate = self._entries[candidate_key]
+                if candidate.expires_at <= now:
+                    self._remove(candidate_key)
+                    continue
+                score = _similarity(words, candidate.words)
+                if score >= best_score:
+                    best_key, best_score = candidate_key, score
+
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.near_hits += 1
+            return self._entries[best_key].report
+
+    def put(self, idea: str, history_context: str, report: str) -> None:
+        """
+        Stores a freshly generated report, evicting the least recently used entries if full.
+
+        Args:
+            idea (str): The raw idea text.
+            history_context (str): The history context the report was generated with.
+            report (str): The final report in Markdown.
+        """
+        normalized = normalize_idea(idea)
+        context = _context_key(history_context)
+        key = (context, normalized)
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _Entry(
+                report=report,
+                words=frozenset(normalized.split()),
+                expires_at=time.monotonic() + self.ttl_seconds
+            )
+            self._by_context.setdefault(context, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+
+    def stats(self) -> dict:
+        """
+        Returns the hit/miss counters and the current size of the cache.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+            }
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        """
+        Drops an entry and its context index reference. Caller must hold the lock.
+        """
+        if self._entries.pop(key, None) is None:
+            return
+        siblings = self._by_context.get(key[0])
+        if siblings is not None:
+            siblings.discard(key)
+            if not siblings:
+                del self._by_context[key[0]]
+
+
+# --- Shared Instance ---
+# One cache per worker process, shared by the streaming and the simple analysis endpoints.
+report_cache = ReportCache()
@@ -0,0 +1,74 @@
+# ==============================================================================
+# 1. IMPORTS
+# ==============================================================================
+# --- Standard Library Imports ---
+import hashlib
+import os
+import zlib
+from typing import Tuple
+
+try:
+    import zstandard
+except ImportError:  # Optional: reports are compressed with zlib without it.
+    zstandard = None
+
+
+# ==============================================================================
+# 2. CONFIGURATION CONSTANTS
+# ==============================================================================
+# Codec for newly stored reports: "zstd" (zlib if `zstandard` is not installed), "zlib" or "none".
+# Each blob records its codec, so changing this never affects reports already stored.
+REPORT_COMPRESSION = os.getenv("REPORT_COMPRESSION", "zstd").lower()
+
+# Compression levels. Reports are written once and read many times, so these favour size.
+REPORT_ZSTD_LEVEL = int(os.getenv("REPORT_ZSTD_LEVEL", "12"))
+REPORT_ZLIB_LEVEL = int(os.getenv("REPORT_ZLIB_LEVEL", "9"))
+
+
+# ==============================================================================
+# 3. REPORT BLOB ENCODING
+# ==============================================================================
+
+def report_digest(report_markdown: str) -> str:
+    """
+    Returns the content address of a report: the hex SHA-256 of its UTF-8 text.
+    """
+    return hashlib.sha256(report_markdown.encode("utf-8")).hexdigest()
+
+
+def compress_report(report_markdown: str) -> Tuple[str, bytes]:
+    """
+    Compresses a report with the configured codec.
+
+    Returns:
+        Tuple[str, bytes]: The codec used and the stored bytes. Reports that do not
+        get smaller are stored as they are, with the codec "none".
+    """
+    raw = report_markdown.encode("utf-8")
+    codec = REPORT_COMPRESSION
+    if codec == "zstd" and zstandard is None:
+        codec = "zlib"
+    if codec == "zstd":
+        body = zstandard.ZstdCompressor(level=REPORT_ZSTD_LEVEL).compress(raw)
+    elif codec == "zlib":
+        body = zlib.compress(raw, REPORT_ZLIB_LEVEL)
+    else:
+        return "none", raw
+    if len(body) >= len(raw):
+        return "none", raw
+    return codec, body
+
+
+def decompress_report(codec: str, body: bytes) -> str:
+    """
+    Restores a report stored by `compress_report`.
+    """
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This report is zstd-compressed but the 'zstandard' package is not installed.")
+        raw = zstandard.ZstdDecompressor().decompress(body)
+    elif codec == "zlib":
+        raw = zlib.decompress(body)
+    else:
+        raw = body
+    return raw.decode("utf-8")
@@ -3,7 +3,7 @@
 # ==============================================================================
 # --- Standard Library Imports ---
 import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 # --- Third-party Library Imports ---
 from pydantic import BaseModel, EmailStr
@@ -25,9 +25,11 @@ class AnalysisBase(BaseModel):
 class AnalysisCreate(AnalysisBase):
     """
     Schema for creating a new analysis.
-    Currently has no additional fields beyond AnalysisBase.
     """
-    pass
+    # Per-stage token counts, as recorded by the pipeline.
+    token_usage: Optional[Dict[str, Dict[str, int]]] = None
+    # Model that served each stage, as picked by the model router.
+    stage_models: Optional[Dict[str, str]] = None
 
 
 class Analysis(AnalysisBase):
@@ -38,12 +40,35 @@ class Analysis(AnalysisBase):
     id: int
     owner_id: int
     created_at: datetime.datetime
+    token_usage: Optional[Dict[str, Dict[str, int]]] = None
+    stage_models: Optional[Dict[str, str]] = None
 
     class Config:
         # Allows Pydantic to read data from ORM models (SQLAlchemy).
         from_attributes = True
 
 
+class AnalysisSummary(BaseModel):
+    """
+    Schema for history list views. Leaves out the report body to keep payloads small.
+    """
+    id: int
+    idea_prompt: str
+    created_at: datetime.datetime
+
+    class Config:
+        from_attributes = True
+
+
+class AnalysisPage(BaseModel):
+    """
+    Schema for one page of the history listing.
+    `next_cursor` is passed back to fetch the next (older) page; it is None on the last page.
+    """
+    items: List[AnalysisSummary]
+    next_cursor: Optional[str] = None
+
+
 # ==============================================================================
 # 3. USER-RELATED SCHEMAS
 # ==============================================================================
@@ -0,0 +1,214 @@
+# ==============================================================================
+# 1. IMPORTS
+# ==============================================================================
+# --- Standard Library Imports ---
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+# --- Third-party Library Imports ---
+from langchain_core.tools import BaseTool, StructuredTool
+
+# --- Local Application Imports ---
+from .metrics import SEARCH_DURATION
+
+
+# ==============================================================================
+# 2. CONFIGURATION CONSTANTS
+# ==============================================================================
+# How long a search result stays fresh, in seconds (default: six hours).
+SEARCH_CACHE_TTL_SECONDS = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", "21600"))
+
+# Upper bounds on the cache, per worker process. Whichever is hit first triggers LRU eviction.
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024"))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+
+# ==============================================================================
+# 3. HELPERS
+# ==============================================================================
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a search query so that trivially different spellings share a cache entry.
+
+    Args:
+        query (str): The query produced by the agent.
+
+    Returns:
+        str: The lower-cased query with collapsed whitespace and no surrounding quotes or punctuation.
+    """
+    return _WHITESPACE_RE.sub(" ", query.lower()).strip(" \"'.?!")
+
+
+def _estimate_size(result: Any) -> int:
+    """
+    Approximates the memory used by a result via its JSON length.
+    """
+    return len(json.dumps(result, default=str))
+
+
+# ==============================================================================
+# 4. SEARCH CACHE
+# ==============================================================================
+
+@dataclass
+class _Entry:
+    result: Any
+    size: int
+    expires_at: float
+
+
+@dataclass
+class _InFlight:
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: Optional[BaseException] = None
+
+
+class SearchCache:
+    """
+    A thread-safe TTL + LRU cache for web search results with request coalescing.
+
+    Agents call their tools from worker threads, so concurrent identical queries
+    are collapsed with a per-key in-flight record: the first caller performs the
+    search and the others block on its event and reuse the result.
+    """
+
+    def __init__(self, ttl_seconds: int = SEARCH_CACHE_TTL_SECONDS,
+                 max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+                 max_bytes: int = SEARCH_CACHE_MAX_BYTES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._in_flight: Dict[str, _InFlight] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get_or_fetch(self, query: str, fetch: Callable[[str], Any]) -> Any:
+        """
+        Returns the cached result for a query, performing (at most one) search on a miss.
+
+        Args:
+            query (str): The raw search query.
+            fetch (Callable[[str], Any]): Performs the real search for a query.
+
+        Returns:
+            Any: The search result.
+        """
+        key = normalize_query(query)
+        start = time.perf_counter()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                SEARCH_DURATION.observe(time.perf_counter() - start, cache="hit")
+                return entry.result
+
+            in_flight = self._in_flight.get(key)
+            if in_flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                in_flight = self._in_flight[key] = _InFlight()
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            in_flight.done.wait()
+            SEARCH_DURATION.observe(time.perf_counter() - start, cache="coalesced")
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.result
+
+        try:
+            in_flight.result = fetch(query)
+            self._store(key, in_flight.result)
+            return in_flight.result
+        except BaseException as e:
+            in_flight.error = e
+            raise
+        finally:
+            SEARCH_DURATION.observe(time.perf_counter() - start, cache="miss")
+            with self._lock:
+                self._in_flight.pop(key, None)
+            in_flight.done.set()
+
+    def stats(self) -> dict:
+        """
+        Returns the hit/miss counters and the current size of the cache.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+            }
+
+    def _store(self, key: str, result: Any) -> None:
+        """
+        Caches a successful result. Error strings returned by the tool are not cached.
+        """
+        if not isinstance(result, (list, dict)):
+            return
+        size = _estimate_size(result)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = _Entry(result=result, size=size, expires_at=time.monotonic() + self.ttl_seconds)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+
+
+def cached_search_tool(tool: BaseTool, cache: SearchCache) -> BaseTool:
+    """
+    Wraps a search tool so its calls go through the shared cache.
+    The wrapper keeps the original name, description and argument schema,
+    so agents use it exactly like the tool it replaces.
+
+    Args:
+        tool (BaseTool): The underlying search tool (e.g. TavilySearchResults).
+        cache (SearchCache): The cache shared by all agents in this worker.
+
+    Returns:
+        BaseTool: The caching tool.
+    """
+    def search(query: str) -> Any:
+        return cache.get_or_fetch(query, tool.run)
+
+    return StructuredTool.from_function(
+        func=search,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema
+    )
+
+
+# --- Shared Instance ---
+# One cache per worker process, shared by every agent that searches the web.
+search_cache = SearchCache()
@@ -0,0 +1,224 @@
+# ==============================================================================
+# 1. IMPORTS
+# ==============================================================================
+# --- Standard Library Imports ---
+import asyncio
+import contextlib
+import os
+import time
+import zlib
+from typing import AsyncGenerator, AsyncIterable, Dict, Optional, Tuple, Union
+
+# --- Third-party Library Imports ---
+import orjson
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+try:
+    import brotli
+except ImportError:  # Optional: streams fall back to gzip without it.
+    brotli = None
+
+# --- Local Application Imports ---
+from . import metrics
+
+
+# ==============================================================================
+# 2. CONFIGURATION CONSTANTS
+# ==============================================================================
+# Seconds of silence after which a stream sends a heartbeat. Proxies (Railway's
+# included) close connections that stay idle for about a minute, and the agents can
+# think for longer than that between two events.
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+# Encodings a stream may be compressed with, in order of preference, if the client
+# accepts them. Off by default: most events are small status frames that gain little.
+# Set e.g. "br,gzip" (or "gzip" without the `brotli` package) where streams carry large
+# reports, like batch runs. Each event is flushed on its own, so compression never delays it.
+SSE_COMPRESSION = tuple(
+    encoding.strip() for encoding in os.getenv("SSE_COMPRESSION", "").split(",") if encoding.strip()
+)
+
+# Compression levels. Streams compress as they go, so these stay moderate.
+SSE_GZIP_LEVEL = int(os.getenv("SSE_GZIP_LEVEL", "6"))
+SSE_BROTLI_QUALITY = int(os.getenv("SSE_BROTLI_QUALITY", "5"))
+
+MEDIA_TYPES = {"sse": "text/event-stream", "ndjson": "application/x-ndjson"}
+
+
+# ==============================================================================
+# 3. COMPRESSION
+# ==============================================================================
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Picks the preferred encoding in SSE_COMPRESSION that the client accepts, if any.
+    """
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name.strip())
+    for encoding in SSE_COMPRESSION:
+        if encoding == "br" and brotli is None:
+            continue
+        if encoding in accepted:
+            return encoding
+    return None
+
+
+class StreamCompressor:
+    """
+    Compresses a stream chunk by chunk, flushing after each one so the client can
+    decode every event as soon as it arrives. The dictionary is shared across the
+    whole stream, which is what makes the repeated event framing and the report cheap.
+    """
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=SSE_BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(SSE_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+# ==============================================================================
+# 4. EMITTER
+# ==============================================================================
+Event = Union[dict, Tuple[int, dict]]
+
+
+class EventEmitter:
+    """
+    Turns an async iterable of events into the body of a streaming response.
+
+    - Frames each event with orjson, as Server-Sent Events (`id:` + `data:` lines)
+      or as NDJSON. SSE events carry the ID they come with (`(event_id, data)`
+      tuples, e.g. from a job log) or a sequential one.
+    - Sends a heartbeat (an SSE comment, or a blank NDJSON line) whenever nothing
+      was sent for SSE_HEARTBEAT_SECONDS.
+    - Compresses the stream with brotli or gzip when SSE_COMPRESSION enables it
+      and the client accepts it.
+    - Stops, and closes the event source, as soon as the client disconnects,
+      which is checked at every heartbeat.
+
+    It also records the stream in ACTIVE_STREAMS and its time to the first and to
+    the final event, labelled with `endpoint`.
+    """
+
+    def __init__(self, request: Request, endpoint: str, format: str = "sse",
+                 heartbeat_seconds: float = SSE_HEARTBEAT_SECONDS):
+        self.request = request
+        self.endpoint = endpoint
+        self.format = format
+        self.heartbeat_seconds = heartbeat_seconds
+        self.encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+        self._compressor = StreamCompressor(self.encoding) if self.encoding else None
+        self._next_id = 1
+        self.disconnected = False
+
+    def frame(self, event: Event) -> bytes:
+        """
+        Serializes one event.
+        """
+        if self.format == "ndjson":
+            data = event[1] if isinstance(event, tuple) else event
+            return orjson.dumps(data) + b"\n"
+        if isinstance(event, tuple):
+            event_id, data = event
+        else:
+            event_id, data = self._next_id, event
+        self._next_id = event_id + 1
+        return b"id: %d\ndata: %s\n\n" % (event_id, orjson.dumps(data))
+
+    def heartbeat(self) -> bytes:
+        return b"\n" if self.format == "ndjson" else b": ping\n\n"
+
+    def response(self, events: AsyncIterable[Event], headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+        """
+        Builds the streaming response for the events.
+        """
+        headers = {
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",  # Disable nginx buffering
+            **(headers or {}),
+        }
+        if self.encoding:
+            headers["Content-Encoding"] = self.encoding
+            headers["Vary"] = "Accept-Encoding"
+        return StreamingResponse(self.stream(events), media_type=MEDIA_TYPES[self.format], headers=headers)
+
+    async def stream(self, events: AsyncIterable[Event]) -> AsyncGenerator[bytes, None]:
+        """
+        Yields the encoded frames and heartbeats of a stream.
+        """
+        start = time.perf_counter()
+        first = True
+        iterator = events.__aiter__()
+        next_event: Optional[asyncio.Future] = None
+        metrics.ACTIVE_STREAMS.inc()
+        try:
+            while True:
+                if next_event is None:
+                    next_event = asyncio.ensure_future(iterator.__anext__())
+                done, _ = await asyncio.wait({next_event}, timeout=self.heartbeat_seconds)
+                if not done:
+                    if await self.request.is_disconnected():
+                        self.disconnected = True
+                        return
+                    yield self._encode(self.heartbeat())
+                    continue
+                try:
+                    event = next_event.result()
+                except StopAsyncIteration:
+                    break
+                next_event = None
+                yield self._encode(self.frame(event))
+                if first:
+                    metrics.SSE_TIME_TO_FIRST_EVENT.observe(time.perf_counter() - start, endpoint=self.endpoint)
+                    first = False
+            # Only reached when the whole stream was sent, not when the client went away.
+            metrics.SSE_TIME_TO_FINAL_EVENT.observe(time.perf_counter() - start, endpoint=self.endpoint)
+            if self._compressor is not None:
+                yield self._compressor.finish()
+        finally:
+            metrics.ACTIVE_STREAMS.dec()
+            if next_event is not None and not next_event.done():
+                next_event.cancel()
+                await asyncio.wait({next_event})
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                with contextlib.suppress(Exception):
+                    await aclose()
+
+    def _encode(self, chunk: bytes) -> bytes:
+        return self._compressor.compress(chunk) if self._compressor is not None else chunk
+
+
+def event_stream_response(request: Request, events: AsyncIterable[Event], endpoint: str,
+                          format: str = "sse", headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+    """
+    Streams events to the client through an `EventEmitter`.
+
+    Args:
+        request (Request): The incoming request, for content negotiation and disconnects.
+        events (AsyncIterable[Event]): The events: dicts, or `(event_id, data)` tuples.
+        endpoint (str): The metrics label of the stream.
+        format (str): "sse" or "ndjson".
+        headers (Optional[Dict[str, str]]): Extra response headers.
+
+    Returns:
+        StreamingResponse: The response.
+    """
+    return EventEmitter(request, endpoint, format).response(events, headers)
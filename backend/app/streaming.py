@@ -0,0 +1,114 @@
+# ==============================================================================
+# 1. IMPORTS
+# ==============================================================================
+# --- Standard Library Imports ---
+import asyncio
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+# --- Third-party Library Imports ---
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+# --- Local Application Imports ---
+from .token_budget import count_tokens
+
+
+# ==============================================================================
+# 2. CONFIGURATION CONSTANTS
+# ==============================================================================
+# CrewAI agents reason in a ReAct loop ("Thought: ... Action: ..."). Only the text
+# after this marker is the answer the user should see, so tokens before it are held back.
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+
+# ==============================================================================
+# 3. TOKEN STREAMING CALLBACK
+# ==============================================================================
+
+class TokenStreamHandler(BaseCallbackHandler):
+    """
+    A LangChain callback that forwards the tokens of an agent's final answer
+    as they are generated.
+
+    The LLM runs in a worker thread, so every token is handed back to the event
+    loop with `call_soon_threadsafe` instead of being delivered directly.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, emit: Callable[[str], Any],
+                 usage: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            loop (asyncio.AbstractEventLoop): The event loop that consumes the tokens.
+            emit (Callable[[str], Any]): Called on the loop with each forwarded token.
+            usage (Optional[Dict[str, int]]): If given, receives the prompt and completion
+                token counts of every LLM call (see `token_budget.new_usage`).
+        """
+        self.loop = loop
+        self.emit = emit
+        self.usage = usage
+        self._buffer = ""
+        self._answering = False
+        self._emitted = False
+
+    def on_llm_start(self, serialized: dict, prompts: list, **kwargs: Any) -> None:
+        """
+        Resets the answer detection; each agent iteration is a fresh LLM call.
+        """
+        self._buffer = ""
+        self._answering = False
+        self._emitted = False
+        if self.usage is not None:
+            self.usage["llm_calls"] += 1
+            self.usage["prompt_tokens"] += sum(count_tokens(prompt) for prompt in prompts)
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+        """
+        Counts the completion tokens, preferring the provider's own count when it reports one.
+        """
+        if self.usage is None:
+            return
+        reported = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+        if reported.get("completion_tokens"):
+            self.usage["completion_tokens"] += reported["completion_tokens"]
+            return
+        self.usage["completion_tokens"] += sum(
+            count_tokens(generation.text) for generations in response.generations for generation in generations
+        )
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        """
+        Forwards the token once the final answer has started.
+        """
+        if self._answering:
+            self._forward(token)
+            return
+
+        self._buffer += token
+        marker_at = self._buffer.find(FINAL_ANSWER_MARKER)
+        if marker_at != -1:
+            self._answering = True
+            remainder = self._buffer[marker_at + len(FINAL_ANSWER_MARKER):]
+            self._buffer = ""
+            self._forward(remainder)
+
+    def _forward(self, token: str) -> None:
+        """
+        Delivers a token to the event loop thread, dropping the whitespace that
+        separates the marker from the answer.
+        """
+        if not self._emitted:
+            token = token.lstrip()
+            if not token:
+                return
+            self._emitted = True
+        self.loop.call_soon_threadsafe(self.emit, token)
+
+
+# --- Context Binding ---
+# The handler for the currently running stage. LangChain attaches whatever handler is
+# set here to every LLM call, and `workers.run_llm_call` copies the context into the
+# worker thread, so concurrent stages each stream into their own handler even though
+# they share a single LLM instance.
+stream_handler_var: ContextVar[Optional[TokenStreamHandler]] = ContextVar("stream_handler", default=None)
+register_configure_hook(stream_handler_var, inheritable=True)
@@ -0,0 +1,183 @@
+# ==============================================================================
+# 1. IMPORTS
+# ==============================================================================
+# --- Standard Library Imports ---
+import functools
+import os
+from typing import Dict, Optional, Sequence
+
+
+# ==============================================================================
+# 2. CONFIGURATION CONSTANTS
+# ==============================================================================
+# The model whose tokenizer is used for counting.
+TOKEN_BUDGET_MODEL = os.getenv("TOKEN_BUDGET_MODEL", "gpt-4.1-mini")
+
+# Maximum tokens in a pipeline Task description. The agent's own instructions and
+# tool results come on top, so this caps the part we control.
+STAGE_PROMPT_TOKEN_BUDGET = int(os.getenv("STAGE_PROMPT_TOKEN_BUDGET", "6000"))
+
+# Maximum tokens of context (report, conversation, history) in a follow-up prompt.
+FOLLOW_UP_PROMPT_TOKEN_BUDGET = int(os.getenv("FOLLOW_UP_PROMPT_TOKEN_BUDGET", "8000"))
+
+# Appended where text was cut.
+TRUNCATION_MARKER = "\n[...truncated to fit the prompt budget]"
+
+# Rough characters per token, used when no tokenizer is available.
+_CHARS_PER_TOKEN = 4
+
+
+# ==============================================================================
+# 3. TOKEN COUNTING
+# ==============================================================================
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    """
+    Returns the tiktoken encoding for TOKEN_BUDGET_MODEL, falling back to o200k_base
+    for models tiktoken does not know yet, or None if no encoding can be loaded
+    (tiktoken downloads its tables on first use, which fails without network access).
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(TOKEN_BUDGET_MODEL)
+    except KeyError:
+        pass
+    except Exception as e:
+        print(f"Could not load a tokenizer, estimating token counts: {e}")
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"Could not load a tokenizer, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts the tokens in a text (estimated from its length if no tokenizer is available).
+
+    Args:
+        text (str): The text to count.
+
+    Returns:
+        int: The number of tokens.
+    """
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cuts a text to at most `max_tokens` tokens, keeping its beginning and marking the cut.
+
+    Args:
+        text (str): The text to shorten.
+        max_tokens (int): The maximum number of tokens, including the marker.
+
+    Returns:
+        str: The text, unchanged if it already fits.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    keep = max_tokens - count_tokens(TRUNCATION_MARKER)
+    if keep <= 0:
+        return ""
+    encoding = _encoding()
+    if encoding is None:
+        head = text[:keep * _CHARS_PER_TOKEN]
+    else:
+        head = encoding.decode(encoding.encode(text, disallowed_special=())[:keep])
+    # Prefer ending on a line or word boundary when one is close.
+    for separator in ("\n", " "):
+        cut = head.rfind(separator)
+        if cut > len(head) * 0.8:
+            head = head[:cut]
+            break
+    return head.rstrip() + TRUNCATION_MARKER
+
+
+# ==============================================================================
+# 4. BUDGET ENFORCEMENT
+# ==============================================================================
+
+def fit_to_budget(parts: Dict[str, str], budget: int, trim_order: Sequence[str]) -> Dict[str, str]:
+    """
+    Shrinks the named parts of a prompt until together they fit the budget.
+
+    Parts are trimmed in `trim_order` (lowest priority first), each only as much as
+    needed, and a part is emptied before the next one is touched. Parts not listed
+    are never trimmed.
+
+    Args:
+        parts (Dict[str, str]): The prompt parts by name.
+        budget (int): The maximum total number of tokens.
+        trim_order (Sequence[str]): Names of the parts that may be trimmed, lowest priority first.
+
+    Returns:
+        Dict[str, str]: The parts, with the trimmed ones shortened.
+    """
+    counts = {name: count_tokens(text) for name, text in parts.items()}
+    excess = sum(counts.values()) - budget
+    if excess <= 0:
+        return parts
+
+    fitted = dict(parts)
+    for name in trim_order:
+        if excess <= 0:
+            break
+        if not counts.get(name):
+            continue
+        target = max(0, counts[name] - excess)
+        fitted[name] = truncate_to_tokens(parts[name], target)
+        excess -= counts[name] - count_tokens(fitted[name])
+    return fitted
+
+
+def fit_template(template: str, values: Dict[str, str], budget: int, trim_order: Sequence[str]) -> str:
+    """
+    Renders a `str.format` template after trimming its values to fit the budget.
+    The template's own text always counts against the budget in full.
+
+    Args:
+        template (str): The template, with `{name}` placeholders.
+        values (Dict[str, str]): The values to fill in.
+        budget (int): The maximum number of tokens in the rendered text.
+        trim_order (Sequence[str]): Values that may be trimmed, lowest priority first.
+
+    Returns:
+        str: The rendered text.
+    """
+    fixed = count_tokens(template.format(**{name: "" for name in values}))
+    return template.format(**fit_to_budget(values, budget - fixed, trim_order))
+
+
+# ==============================================================================
+# 5. USAGE RECORDS
+# ==============================================================================
+
+def new_usage() -> Dict[str, int]:
+    """
+    Returns an empty per-stage usage record.
+    """
+    return {"prompt_tokens": 0, "completion_tokens": 0, "llm_calls": 0}
+
+
+def total_usage(usage: Dict[str, Dict[str, int]]) -> Optional[Dict[str, int]]:
+    """
+    Sums per-stage usage records, or returns None if there are none.
+    """
+    if not usage:
+        return None
+    total = new_usage()
+    for record in usage.values():
+        for key in total:
+            total[key] += record.get(key, 0)
+    return total
@@ -0,0 +1,234 @@
+# ==============================================================================
+# 1. IMPORTS
+# ==============================================================================
+# --- Standard Library Imports ---
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional
+
+
+# ==============================================================================
+# 2. CONFIGURATION CONSTANTS
+# ==============================================================================
+# Threads dedicated to blocking LLM/agent calls, per worker process. Kept separate from
+# the default executor so a burst of analyses cannot starve the database calls.
+LLM_WORKER_THREADS = int(os.getenv("LLM_WORKER_THREADS", "8"))
+
+# Analyses allowed to run at the same time, per worker process. Each analysis runs
+# up to two stages in parallel, so this is roughly LLM_WORKER_THREADS / 2.
+MAX_CONCURRENT_ANALYSES = int(os.getenv("MAX_CONCURRENT_ANALYSES", "4"))
+
+# Analyses allowed to wait for a slot. Beyond this, new requests are rejected immediately.
+MAX_QUEUED_ANALYSES = int(os.getenv("MAX_QUEUED_ANALYSES", "16"))
+
+# Follow-up questions allowed to run, and to wait, at the same time per worker process.
+# They are single LLM calls, so more of them fit next to the analyses.
+MAX_CONCURRENT_FOLLOW_UPS = int(os.getenv("MAX_CONCURRENT_FOLLOW_UPS", "4"))
+MAX_QUEUED_FOLLOW_UPS = int(os.getenv("MAX_QUEUED_FOLLOW_UPS", "32"))
+
+# Suggested client back-off (seconds) when the queue is full.
+QUEUE_FULL_RETRY_AFTER_SECONDS = int(os.getenv("QUEUE_FULL_RETRY_AFTER_SECONDS", "30"))
+
+
+# ==============================================================================
+# 3. LLM WORKER POOL
+# ==============================================================================
+llm_executor = ThreadPoolExecutor(max_workers=LLM_WORKER_THREADS, thread_name_prefix="llm-worker")
+
+
+async def run_llm_call(func: Callable[..., Any], *args: Any) -> Any:
+    """
+    Runs a blocking LLM/agent call on the dedicated worker pool.
+
+    Unlike `loop.run_in_executor`, this carries the caller's context variables
+    into the worker thread (as `asyncio.to_thread` does), which the token
+    streaming callback relies on.
+
+    Args:
+        func (Callable[..., Any]): The blocking function to run.
+        *args (Any): Positional arguments for the function.
+
+    Returns:
+        Any: The function's return value.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(llm_executor, functools.partial(context.run, func, *args))
+
+
+def llm_queue_depth() -> int:
+    """
+    Returns the number of LLM calls waiting for a free worker thread.
+    """
+    return llm_executor._work_queue.qsize()
+
+
+# ==============================================================================
+# 4. ADMISSION CONTROL
+# ==============================================================================
+
+class QueueFullError(Exception):
+    """
+    Raised when an analysis cannot even be queued because the waiting room is full.
+    """
+    pass
+
+
+class AdmissionTicket:
+    """
+    A place in the admission queue. The holder waits with `wait()` and must
+    call `release()` when done, whether or not it was admitted.
+    """
+
+    def __init__(self, controller: "AdmissionController", user_id: Optional[int], finish_tag: float, sequence: int):
+        self._controller = controller
+        self._changed = asyncio.Event()
+        self.user_id = user_id
+        # Virtual finish time in the fair queue; waiting tickets are admitted in this order.
+        self.finish_tag = finish_tag
+        self.sequence = sequence
+        self.admitted = False
+        self.released = False
+
+    async def wait(self) -> AsyncGenerator[int, None]:
+        """
+        Waits for a slot, yielding the 1-based queue position whenever it changes.
+        Yields nothing if the ticket was admitted straight away.
+        """
+        last_position = None
+        while not self.admitted:
+            position = self._controller.position(self)
+            if position != last_position:
+                last_position = position
+                yield position
+            self._changed.clear()
+            await self._changed.wait()
+
+    def release(self) -> None:
+        """
+        Gives the slot (or the queue position) back. Safe to call more than once.
+        """
+        if not self.released:
+            self.released = True
+            self._controller._release(self)
+
+
+class AdmissionController:
+    """
+    Bounds how many analyses run at once and how many may wait.
+
+    Requests beyond `max_active` wait in a weighted fair queue: each user's
+    requests get virtual finish times spaced 1 / weight apart (self-clocked fair
+    queueing), so a user with many queued runs is interleaved with everyone else
+    instead of holding the front of the line, and heavier-weighted tiers get a
+    proportionally larger share. Requests beyond `max_active + max_queued` are
+    rejected up front so latency stays predictable under load.
+    """
+
+    def __init__(self, max_active: int = MAX_CONCURRENT_ANALYSES, max_queued: int = MAX_QUEUED_ANALYSES, name: str = "analysis"):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.name = name
+        self.active = 0
+        self.rejected = 0
+        self._waiting: List[AdmissionTicket] = []
+        # Finish tag of the last admitted ticket, and of each user's latest ticket.
+        self._virtual_time = 0.0
+        self._last_finish: Dict[Optional[int], float] = {}
+        self._sequence = 0
+
+    def try_admit(self, user_id: Optional[int] = None, weight: float = 1.0) -> AdmissionTicket:
+        """
+        Reserves a slot or a queue position.
+
+        Args:
+            user_id (Optional[int]): The requesting user; None shares one anonymous flow.
+            weight (float): The user's share of the slots relative to other users.
+
+        Returns:
+            AdmissionTicket: The caller's ticket.
+
+        Raises:
+            QueueFullError: If no slot is free and the queue is full.
+        """
+        if self.active >= self.max_active or self._waiting:
+            if len(self._waiting) >= self.max_queued:
+                self.rejected += 1
+                raise QueueFullError(f"The {self.name.replace('_', '-')} queue is full. Please try again shortly.")
+
+        finish_tag = max(self._virtual_time, self._last_finish.get(user_id, 0.0)) + 1.0 / weight
+        self._last_finish[user_id] = finish_tag
+        self._sequence += 1
+        ticket = AdmissionTicket(self, user_id, finish_tag, self._sequence)
+        if self.active < self.max_active and not self._waiting:
+            self.active += 1
+            ticket.admitted = True
+            self._advance(ticket)
+        else:
+            self._waiting.append(ticket)
+            self._waiting.sort(key=lambda waiting: (waiting.finish_tag, waiting.sequence))
+            # A newcomer may have been placed ahead of earlier arrivals.
+            for waiting in self._waiting:
+                waiting._changed.set()
+        return ticket
+
+    def position(self, ticket: AdmissionTicket) -> int:
+        """
+        Returns a waiting ticket's 1-based position, or 0 if it is not waiting.
+        """
+        try:
+            return self._waiting.index(ticket) + 1
+        except ValueError:
+            return 0
+
+    def stats(self) -> dict:
+        """
+        Returns the current load of the controller.
+        """
+        return {
+            "active": self.active,
+            "queued": len(self._waiting),
+            "max_active": self.max_active,
+            "max_queued": self.max_queued,
+            "rejected": self.rejected,
+            "queued_users": len({ticket.user_id for ticket in self._waiting}),
+        }
+
+    def _release(self, ticket: AdmissionTicket) -> None:
+        """
+        Frees the ticket's slot or queue position and admits the next waiters.
+        """
+        if ticket.admitted:
+            self.active -= 1
+        elif ticket in self._waiting:
+            self._waiting.remove(ticket)
+
+        while self._waiting and self.active < self.max_active:
+            next_ticket = self._waiting.pop(0)
+            next_ticket.admitted = True
+            self.active += 1
+            self._advance(next_ticket)
+            next_ticket._changed.set()
+
+        # Everyone still waiting moved up a place.
+        for waiting in self._waiting:
+            waiting._changed.set()
+
+    def _advance(self, ticket: AdmissionTicket) -> None:
+        """
+        Moves the virtual clock to an admitted ticket's finish tag, forgetting users
+        whose last tag it has passed (they would start from the clock anyway).
+        """
+        self._virtual_time = max(self._virtual_time, ticket.finish_tag)
+        self._last_finish = {
+            user_id: tag for user_id, tag in self._last_finish.items() if tag > self._virtual_time
+        }
+
+
+# --- Shared Instances ---
+# One controller per worker process guarding the analysis endpoints, and one for follow-ups.
+admission = AdmissionController()
+follow_up_admission = AdmissionController(MAX_CONCURRENT_FOLLOW_UPS, MAX_QUEUED_FOLLOW_UPS, name="follow_up")
@@ -0,0 +1,118 @@
+# ==============================================================================
+# Import-time profile & regression check
+# ==============================================================================
+# Imports `app.main` in a fresh interpreter with `python -X importtime` and reports
+# how long it took and which packages cost the most. Exits with status 1 if a
+# heavy package that must stay lazy (crewai, the LangChain integrations,
+# WeasyPrint, ...) is imported, or if the import takes longer than --max-ms.
+#
+# A worker can't serve requests before `app.main` is imported, so this is the
+# floor of every cold start and autoscale reaction on Railway.
+#
+# Usage (from the backend/ directory):
+#     python -m benchmarks.bench_import_time
+#     python -m benchmarks.bench_import_time --max-ms 1500 --top 15
+# ==============================================================================
+
+# --- Standard Library Imports ---
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Packages that `import app.main` must not load. They are imported when the agents
+# are built or a PDF is rendered, after the worker has started.
+LAZY_PACKAGES = (
+    "crewai",
+    "langchain_openai",
+    "langchain_community",
+    "openai",
+    "weasyprint",
+    "markdown2",
+    "tiktoken",
+)
+
+
+def profile_import(module: str) -> Tuple[int, Dict[str, int], List[str]]:
+    """
+    Imports a module in a fresh interpreter with `-X importtime`.
+
+    Returns:
+        Tuple[int, Dict[str, int], List[str]]: The total import time in microseconds,
+        the cumulative time per top-level package and every module imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+        # Keep the check offline and free of side effects.
+        env={**os.environ, "PRELOAD_AGENTS": "false"},
+    )
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"`import {module}` failed:\n" + "\n".join(errors[-20:]))
+
+    entries = []
+    for line in result.stderr.splitlines():
+        # Format: "import time: self [us] | cumulative | imported package", children
+        # indented under (and printed before) the module that imported them.
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((depth, name.strip(), int(cumulative)))
+
+    total = 0
+    per_package: Dict[str, int] = defaultdict(int)
+    modules = [name for _, name, _ in entries]
+    # Walk the tree top-down and charge each module to its package only where that
+    # package is entered from another one, so a package's time is counted once.
+    parents: List[Tuple[int, str]] = []
+    for depth, name, cumulative in reversed(entries):
+        while parents and parents[-1][0] >= depth:
+            parents.pop()
+        package = name.split(".")[0]
+        if not parents or parents[-1][1] != package:
+            per_package[package] += cumulative
+        parents.append((depth, package))
+        if name == module:
+            total = cumulative
+    return total, dict(per_package), modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile & regression check for app.main.")
+    parser.add_argument("--module", default="app.main", help="Module to import.")
+    parser.add_argument("--max-ms", type=float, help="Fail if the import takes longer than this.")
+    parser.add_argument("--top", type=int, default=10, help="Number of packages to list.")
+    args = parser.parse_args()
+
+    try:
+        total, per_package, modules = profile_import(args.module)
+    except RuntimeError as e:
+        print(e)
+        sys.exit(2)
+
+    print(f"import {args.module}: {total / 1000:.0f} ms ({len(modules)} modules)\n")
+    print(f"{'package (incl. its dependencies)':<40} {'ms':>8}")
+    for package, micros in sorted(per_package.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<40} {micros / 1000:>8.1f}")
+
+    failures = []
+    loaded = sorted({name.split(".")[0] for name in modules} & set(LAZY_PACKAGES))
+    if loaded:
+        failures.append(f"heavy packages imported eagerly: {', '.join(loaded)}")
+    if args.max_ms is not None and total / 1000 > args.max_ms:
+        failures.append(f"import took {total / 1000:.0f} ms, over the {args.max_ms:.0f} ms limit")
+
+    if failures:
+        print("\nFAILED: " + "; ".join(failures))
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
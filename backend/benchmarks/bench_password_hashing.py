@@ -0,0 +1,104 @@
+# ==============================================================================
+# Login throughput & event-loop stall benchmark (bcrypt)
+# ==============================================================================
+# Compares verifying passwords directly on the event loop (the old behaviour of
+# `login_for_access_token`) with `auth.verify_password_async`, which runs bcrypt
+# on a dedicated process pool.
+#
+# Usage (from the backend/ directory):
+#     python -m benchmarks.bench_password_hashing --logins 32 --concurrency 8
+# ==============================================================================
+
+# --- Standard Library Imports ---
+import argparse
+import asyncio
+import time
+
+# --- Local Application Imports ---
+from app import auth
+
+
+class LoopLagMonitor:
+    """
+    Measures how late a periodic tick fires. On an unblocked loop the lag stays
+    near zero; every synchronous bcrypt call shows up as a ~250 ms stall.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+            self.max_lag = max(self.max_lag, lag)
+            self.total_lag += lag
+            self.samples.append(lag)
+
+    def __enter__(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+async def _login_on_loop(password: str, hashed: str) -> bool:
+    # Old behaviour: bcrypt runs inline inside the `async def` endpoint.
+    return auth.verify_password(password, hashed)
+
+
+async def _login_on_pool(password: str, hashed: str) -> bool:
+    return await auth.verify_password_async(password, hashed)
+
+
+async def run_case(name: str, login, logins: int, concurrency: int, hashed: str) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_login():
+        async with semaphore:
+            assert await login("correct horse battery staple", hashed)
+
+    with LoopLagMonitor() as monitor:
+        # Let the monitor tick before and after the burst so it sees every stall.
+        await asyncio.sleep(monitor.interval * 2)
+        started = time.perf_counter()
+        await asyncio.gather(*(one_login() for _ in range(logins)))
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(monitor.interval * 2)
+
+    return {
+        "case": name,
+        "logins_per_second": logins / elapsed,
+        "max_loop_stall_ms": monitor.max_lag * 1000,
+        "total_loop_stall_ms": monitor.total_lag * 1000,
+    }
+
+
+async def main(logins: int, concurrency: int):
+    hashed = auth.get_password_hash("correct horse battery staple")
+    # Warm the pool up so process start-up is not counted against it.
+    await auth.verify_password_async("warm-up", hashed)
+
+    results = [
+        await run_case("before: bcrypt on the event loop", _login_on_loop, logins, concurrency, hashed),
+        await run_case(f"after: process pool ({auth.PASSWORD_HASH_WORKERS} workers)", _login_on_pool, logins, concurrency, hashed),
+    ]
+    auth.shutdown_password_pool()
+
+    print(f"{'case':<42} {'logins/s':>9} {'max stall ms':>13} {'total stall ms':>15}")
+    for r in results:
+        print(f"{r['case']:<42} {r['logins_per_second']:>9.1f} {r['max_loop_stall_ms']:>13.1f} {r['total_loop_stall_ms']:>15.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Login throughput & event-loop stall benchmark (bcrypt).")
+    parser.add_argument("--logins", type=int, default=32, help="Total number of logins to simulate.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Logins in flight at the same time.")
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.concurrency))
@@ -0,0 +1,174 @@
+# ==============================================================================
+# Rate limiter & fair admission check
+# ==============================================================================
+# Exercises the token buckets (burst, refill, refund, paced waits) and the weighted
+# fair queue of `AdmissionController` against hand-computed expectations, then
+# times `RateLimiter.take` across many users. Exits with status 1 if any check fails.
+#
+# Runs on the standard library and `app.rate_limits` / `app.workers` only, so no
+# database or API key is needed.
+#
+# Usage (from the backend/ directory):
+#     python -m benchmarks.bench_rate_limits
+#     python -m benchmarks.bench_rate_limits --takes 200000 --users 5000
+# ==============================================================================
+
+# --- Standard Library Imports ---
+import argparse
+import asyncio
+import sys
+import time
+from typing import Callable, List, Tuple
+
+# --- Local Application Imports ---
+from app.rate_limits import DEFAULT_USER_TIER, RateLimiter
+from app.workers import AdmissionController, QueueFullError
+
+# One token every 0.1 s and a burst of 3, so refills are quick to observe.
+LIMITS = {"analysis": {DEFAULT_USER_TIER: (36000.0, 3), "pro": (72000.0, 6)}}
+
+
+def rewind(limiter: RateLimiter, user_id: int, seconds: float) -> None:
+    """
+    Makes a bucket's last refill look `seconds` older, as if that much time had passed.
+    """
+    limiter._buckets[("analysis", user_id)].updated -= seconds
+
+
+def check_burst_and_refill() -> None:
+    limiter = RateLimiter(LIMITS)
+    allowed = [limiter.take("analysis", 1, None).allowed for _ in range(4)]
+    assert allowed == [True, True, True, False], f"burst of 3 expected, got {allowed}"
+    decision = limiter.take("analysis", 1, None)
+    assert 0 < decision.retry_after_seconds <= 0.1, f"retry after {decision.retry_after_seconds}s, expected <= 0.1s"
+    assert decision.headers()["Retry-After"] == "1", decision.headers()
+
+    rewind(limiter, 1, 0.1)
+    assert limiter.take("analysis", 1, None).allowed, "one token should be back after 0.1 s"
+    assert not limiter.take("analysis", 1, None).allowed, "only one token should be back after 0.1 s"
+
+    rewind(limiter, 1, 60)
+    decision = limiter.take("analysis", 1, None)
+    assert decision.remaining == 2, f"a refilled bucket stops at its burst, {decision.remaining} left"
+    assert limiter.stats()["allowed"] == 5 and limiter.stats()["rejected"] == 3, limiter.stats()
+
+
+def check_tiers() -> None:
+    limiter = RateLimiter(LIMITS)
+    assert limiter.take("analysis", 1, "pro").limit == 6, "pro users get the pro burst"
+    assert limiter.take("analysis", 2, "unknown").limit == 3, "unknown tiers get the default limits"
+    assert limiter.take("analysis", 1, None).limit == 3, "a tier change resizes the bucket"
+
+
+def check_refund() -> None:
+    limiter = RateLimiter(LIMITS)
+    for _ in range(3):
+        limiter.take("analysis", 1, None)
+    limiter.refund("analysis", 1)
+    assert limiter.stats()["allowed"] == 2, f"a refunded take is not counted, got {limiter.stats()}"
+    assert limiter.take("analysis", 1, None).allowed, "the refunded token can be taken again"
+    assert not limiter.take("analysis", 1, None).allowed, "refund gives back exactly one token"
+
+    rewind(limiter, 1, 60)
+    limiter.refund("analysis", 1)
+    assert limiter.take("analysis", 1, None).remaining == 2, "a refund never overfills the bucket"
+
+    limiter.refund("analysis", 99)
+    assert ("analysis", 99) not in limiter._buckets, "refunding an unknown user creates no bucket"
+
+
+def check_wait() -> None:
+    limiter = RateLimiter(LIMITS)
+
+    async def drain() -> float:
+        for _ in range(3):
+            await limiter.wait("analysis", 1, None)
+        start = time.perf_counter()
+        await limiter.wait("analysis", 1, None)
+        return time.perf_counter() - start
+
+    waited = asyncio.run(drain())
+    assert 0.05 <= waited <= 0.5, f"the fourth wait should take about 0.1 s, took {waited:.3f} s"
+    assert limiter.stats()["allowed"] == 0 and limiter.stats()["rejected"] == 0, "waits are not counted"
+
+
+def check_fair_queue() -> None:
+    controller = AdmissionController(max_active=1, max_queued=6)
+    running = controller.try_admit(0, 1.0)
+    # A light user (weight 1) queues three runs, then a heavy user (weight 2.5) queues
+    # three. Finish tags from the clock at 1.0: light 2, 3, 4; heavy 1.4, 1.8, 2.2.
+    tickets = [controller.try_admit("light", 1.0) for _ in range(3)] + [controller.try_admit("heavy", 2.5) for _ in range(3)]
+    try:
+        controller.try_admit("light", 1.0)
+        raise AssertionError("a seventh queued ticket should be rejected")
+    except QueueFullError:
+        pass
+    assert controller.stats()["rejected"] == 1, controller.stats()
+
+    order = []
+    current = running
+    for _ in tickets:
+        current.release()
+        current = next(ticket for ticket in tickets if ticket.admitted and ticket not in order)
+        order.append(current)
+    expected = ["heavy", "heavy", "light", "heavy", "light", "light"]
+    assert [ticket.user_id for ticket in order] == expected, f"admitted {[t.user_id for t in order]}, expected {expected}"
+    current.release()
+    assert controller.stats()["active"] == 0 and controller.stats()["queued"] == 0, controller.stats()
+
+    # A ticket given up while waiting frees its place for the next one.
+    controller = AdmissionController(max_active=1, max_queued=2)
+    running = controller.try_admit(1)
+    first, second = controller.try_admit(2), controller.try_admit(3)
+    first.release()
+    assert controller.position(second) == 1, "the remaining waiter moves to the front"
+    running.release()
+    assert second.admitted and not first.admitted, "the released waiter is skipped"
+
+
+CHECKS: List[Tuple[str, Callable[[], None]]] = [
+    ("burst and refill", check_burst_and_refill),
+    ("tiers", check_tiers),
+    ("refund", check_refund),
+    ("paced wait", check_wait),
+    ("weighted fair queue", check_fair_queue),
+]
+
+
+def time_takes(takes: int, users: int) -> float:
+    """
+    Returns the mean time of one `RateLimiter.take`, in microseconds.
+    """
+    limiter = RateLimiter(max_buckets=users)
+    start = time.perf_counter()
+    for i in range(takes):
+        limiter.take("analysis", i % users, None)
+    return (time.perf_counter() - start) / takes * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rate limiter & fair admission check.")
+    parser.add_argument("--takes", type=int, default=100000, help="Takes to time.")
+    parser.add_argument("--users", type=int, default=1000, help="Distinct users the takes are spread over.")
+    args = parser.parse_args()
+
+    failures = []
+    for name, check in CHECKS:
+        try:
+            check()
+            print(f"{name:<24} ok")
+        except AssertionError as e:
+            print(f"{name:<24} FAILED: {e}")
+            failures.append(name)
+
+    print(f"\nRateLimiter.take: {time_takes(args.takes, args.users):.2f} us per call "
+          f"({args.takes} takes over {args.users} users)")
+
+    if failures:
+        print("\nFAILED: " + ", ".join(failures))
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
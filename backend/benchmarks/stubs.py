@@ -0,0 +1,157 @@
+# ==============================================================================
+# Deterministic local stand-ins for the OpenAI chat model and the Tavily search tool
+# ==============================================================================
+# `install_stubs` replaces the `ChatOpenAI` and `TavilySearchResults` classes with
+# factories for the stubs below. It must run before the app builds its agents
+# (`app.agents.get_agents`, at worker startup or on first use).
+#
+# The stubs block their calling thread like the real clients do, so the server's
+# thread pools, admission control and streaming behave as they would in production,
+# without network access or API costs.
+# ==============================================================================
+
+# --- Standard Library Imports ---
+import random
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Optional, Type
+
+# --- Third-party Library Imports ---
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel, Field
+
+
+# Marks stub search results, so the stub LLM can tell how many searches a prompt already contains.
+SEARCH_RESULT_MARKER = "[stub search result]"
+
+_VOCABULARY = (
+    "market customers growth pricing channel revenue margin competitor segment retention "
+    "onboarding subscription platform partnership regulation risk adoption funnel churn "
+    "differentiation supply demand validation prototype pilot launch scale brand community"
+).split()
+
+
+@dataclass
+class StubConfig:
+    """
+    Latency and output size of the stand-ins.
+    """
+    first_token_latency: float = 0.5   # Seconds before the model's first token.
+    token_delay: float = 0.005         # Seconds between tokens.
+    output_tokens: int = 300           # Words in each final answer.
+    searches_per_call: int = 1         # Searches an agent with the search tool makes before answering.
+    search_latency: float = 0.3        # Seconds per search.
+    search_result_bytes: int = 2000    # Size of each search result.
+
+
+def _words(seed_text: str, count: int) -> List[str]:
+    rng = random.Random(zlib.crc32(seed_text.encode("utf-8")))
+    return [rng.choice(_VOCABULARY) for _ in range(count)]
+
+
+class StubChatModel(BaseChatModel):
+    """
+    A chat model that answers in the ReAct format the agents expect, with text
+    derived from the prompt (so the same prompt always gets the same answer).
+
+    While an agent that can search has made fewer than `searches_per_call`
+    searches, it asks for one; after that it gives its final answer.
+    """
+    model_name: str = "stub"
+    streaming: bool = True
+    first_token_latency: float = 0.5
+    token_delay: float = 0.005
+    output_tokens: int = 300
+    searches_per_call: int = 1
+    search_tool_name: str = "tavily_search_results_json"
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def _reply(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = "\n".join(str(message.content) for message in messages)
+        if self.search_tool_name in prompt and prompt.count(SEARCH_RESULT_MARKER) < self.searches_per_call:
+            query = " ".join(_words(prompt + str(prompt.count(SEARCH_RESULT_MARKER)), 6))
+            return [
+                "Thought: ", "I ", "should ", "research ", "this.\n",
+                f"Action: {self.search_tool_name}\n", f"Action Input: {query}",
+            ]
+        words = _words(prompt, self.output_tokens)
+        body = []
+        for index, word in enumerate(words):
+            if index % 60 == 0:
+                body.append(f"\n\n## Section {index // 60 + 1}\n")
+            body.append(word + " ")
+        return ["Thought: ", "I ", "now ", "can ", "give ", "a ", "great ", "answer\n", "Final Answer: "] + body
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency)
+        for index, token in enumerate(self._reply(messages)):
+            if index:
+                time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager is not None:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        text = "".join(chunk.text for chunk in self._stream(messages, stop, run_manager, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+class StubSearchInput(BaseModel):
+    query: str = Field(description="search query to look up")
+
+
+class StubSearchTool(BaseTool):
+    """
+    A search tool with Tavily's name and schema that returns made-up results after a fixed delay.
+    """
+    name: str = "tavily_search_results_json"
+    description: str = (
+        "A search engine optimized for comprehensive, accurate, and trusted results. "
+        "Useful for when you need to answer questions about current events. "
+        "Input should be a search query."
+    )
+    args_schema: Type[BaseModel] = StubSearchInput
+    latency: float = 0.3
+    result_bytes: int = 2000
+
+    def _run(self, query: str, run_manager: Any = None) -> list:
+        time.sleep(self.latency)
+        words_per_result = max(1, self.result_bytes // 8)
+        return [
+            {"url": f"https://example.com/{i}", "content": SEARCH_RESULT_MARKER + " " + " ".join(_words(f"{query}{i}", words_per_result))}
+            for i in range(3)
+        ]
+
+
+def install_stubs(config: StubConfig) -> None:
+    """
+    Makes `ChatOpenAI(...)` and `TavilySearchResults(...)` build the stubs.
+    Call it before the app's agents are built.
+    """
+    import langchain_openai
+    import langchain_community.tools.tavily_search as tavily_search
+
+    def chat_model(**kwargs: Any) -> StubChatModel:
+        return StubChatModel(
+            model_name=kwargs.get("model", "stub"),
+            first_token_latency=config.first_token_latency,
+            token_delay=config.token_delay,
+            output_tokens=config.output_tokens,
+            searches_per_call=config.searches_per_call,
+        )
+
+    def search_tool(**kwargs: Any) -> StubSearchTool:
+        return StubSearchTool(latency=config.search_latency, result_bytes=config.search_result_bytes)
+
+    langchain_openai.ChatOpenAI = chat_model
+    tavily_search.TavilySearchResults = search_tool
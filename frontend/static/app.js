@@ -1,4 +1,6 @@
 const API_BASE_URL = 'https://venture-mind-production.up.railway.app';
+// The agent whose streamed tokens make up the final report.
+const REPORT_AGENT = 'Pragmatic Strategy Consultant';
 
 
 document.addEventListener('alpine:init', () => {
@@ -20,14 +22,19 @@ document.addEventListener('alpine:init', () => {
         businessIdea: '',
         isLoading: false,
         isDownloading: false,
+        // Last exported PDF and its ETag, so re-exporting an unchanged report is a 304.
+        pdfCache: { etag: null, blob: null },
         error: null,
         liveLog: [],
         rawMarkdown: '',
         currentAnalysisId: null,
+        activeJob: null, // { id, lastEventId } of the analysis job being streamed
+        resumableRunId: null, // Failed run whose finished stages can be reused
 
         // --- UI & Component State ---
         isHistoryPanelOpen: false,
         analysisHistory: [],
+        historyCursor: null, // Cursor of the next (older) history page, null when there is none
         useHistory: false,
         showConfirmationModal: false,
         itemToDelete: null,
@@ -53,6 +60,12 @@ document.addEventListener('alpine:init', () => {
             return !this.isLoading && this.rawMarkdown;
         },
 
+        // The report is shown as soon as its first tokens arrive, while the
+        // chat and PDF controls wait for the analysis to finish.
+        get reportVisible() {
+            return !!this.rawMarkdown;
+        },
+
         //======================================================================
         //  LIFECYCLE & INITIALIZATION
         //======================================================================
@@ -64,6 +77,7 @@ document.addEventListener('alpine:init', () => {
                 this.isLoggedIn = true;
                 this.currentUser = storedUser;
                 this.fetchHistory();
+                this.resumeActiveJob();
             }
         },
 
@@ -169,10 +183,11 @@ document.addEventListener('alpine:init', () => {
         //  HISTORY & ANALYSIS MANAGEMENT
         //======================================================================
         
-        async fetchHistory() {
+        async fetchHistory(cursor = null) {
             if (!this.authToken) return;
             try {
-                const response = await fetch(`${API_BASE_URL}/analyses/`, {
+                const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+                const response = await fetch(`${API_BASE_URL}/analyses/${query}`, {
                     headers: { 'Authorization': `Bearer ${this.authToken}` }
                 });
                 if (!response.ok) {
@@ -182,20 +197,18 @@ document.addEventListener('alpine:init', () => {
                     }
                     throw new Error('Could not fetch history.');
                 }
-                this.analysisHistory = await response.json();
+                // The list only carries summaries; full reports are fetched on demand.
+                const page = await response.json();
+                this.analysisHistory = cursor ? [...this.analysisHistory, ...page.items] : page.items;
+                this.historyCursor = page.next_cursor;
             } catch (e) {
                 this.error = e.message;
                 this.showNotification(e.message, 'error');
             }
         },
 
-        loadAnalysisFromHistory(analysis) {
-            this.businessIdea = analysis.idea_prompt;
-            this.rawMarkdown = analysis.report_markdown;
-            this.chatHistory = []; // Reset chat when loading a new report
-            this.isHistoryPanelOpen = false;
-            window.scrollTo({ top: 0, behavior: 'smooth' });
-            this.showNotification('Analysis loaded from history.');
+        loadMoreHistory() {
+            if (this.historyCursor) this.fetchHistory(this.historyCursor);
         },
 
         confirmDelete(analysisId, event) {
@@ -221,15 +234,9 @@ document.addEventListener('alpine:init', () => {
                 // Refresh history data
                 await this.fetchHistory(); 
 
-                // Check if the deleted item is currently displayed
-                const currentAnalysis = this.analysisHistory.find(
-                    analysis => analysis.id === deletedItemId
-                );
-                
                 // If the currently displayed analysis was deleted, clear the view
-                if (currentAnalysis && 
-                    (this.businessIdea === currentAnalysis.idea_prompt || 
-                    this.rawMarkdown === currentAnalysis.report_markdown)) {
+                if (this.currentAnalysisId === deletedItemId) {
+                    this.currentAnalysisId = null;
                     this.rawMarkdown = '';
                     this.businessIdea = '';
                     this.chatHistory = [];
@@ -261,6 +268,8 @@ document.addEventListener('alpine:init', () => {
             
             this.isLoading = true;
             this.error = null;
+            this.resumableRunId = null;
+            this.currentAnalysisId = null;
             this.liveLog = [];
             this.rawMarkdown = '';
             this.chatHistory = [];
@@ -268,6 +277,9 @@ document.addEventListener('alpine:init', () => {
             // Try streaming first, then fallback to simple endpoint
             const success = await this.tryStreamingAnalysis();
             
+            // The server turned the request away; the simple endpoint would be turned away too.
+            if (success === 'rejected') return;
+
             if (!success) {
                 console.log('Streaming failed, trying fallback method...');
                 this.showNotification('Switching to alternative method...', 'info', 2000);
@@ -292,84 +304,188 @@ document.addEventListener('alpine:init', () => {
                     })
                 });
 
+                if (await this.handleRejection(response)) return 'rejected';
                 if (!response.ok) {
                     throw new Error(`HTTP ${response.status}: ${response.statusText}`);
                 }
 
-                if (!response.body) {
-                    throw new Error('Response body is null.');
-                }
+                // The analysis runs as a server-side job; remember it so a dropped
+                // connection (or a page reload) can pick the stream back up.
+                this.activeJob = { id: response.headers.get('X-Job-Id'), lastEventId: 0 };
+                if (this.activeJob.id) sessionStorage.setItem('ventureMindJob', this.activeJob.id);
+                return await this.followJobStream(response);
+            } catch (error) {
+                console.error('Streaming method failed:', error);
+                return false; 
+            }
+        },
 
-                const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
-                let buffer = '';
-                
-                let lastActivity = Date.now();
-                const timeoutDuration = 60000; // 60 seconds
-                const activityTimeout = setInterval(() => {
-                    if (Date.now() - lastActivity > timeoutDuration) {
-                        console.log('Streaming activity timeout detected');
-                        reader.cancel('Timeout');
-                        clearInterval(activityTimeout);
-                    }
-                }, 5000);
+        // Shows why the server turned a request away (rate limit or full queue) and when
+        // to try again. Returns true if it did, so the caller does not retry elsewhere.
+        async handleRejection(response) {
+            if (response.status !== 429 && response.status !== 503) return false;
+            const data = await response.json().catch(() => ({}));
+            const retryAfter = Number(response.headers.get('Retry-After') || response.headers.get('RateLimit-Reset'));
+            let message = data.detail || (response.status === 429 ? 'Rate limit reached.' : 'The server is busy.');
+            if (retryAfter > 0) message += ` Please try again in ${retryAfter} seconds.`;
+            this.error = message;
+            this.isLoading = false;
+            this.showNotification(message, 'error', 5000);
+            return true;
+        },
 
+        // Reads a job's event stream, reconnecting with Last-Event-ID when the
+        // connection drops before the job has finished.
+        async followJobStream(response) {
+            for (let attempt = 0; attempt <= 3; attempt++) {
                 try {
-                    while (true) {
-                        const { value, done } = await reader.read();
-                        if (done) {
-                            console.log('Streaming completed by the server.');
-                            clearInterval(activityTimeout);
-                            
-                            // If we have markdown content but didn't get a completion event,
-                            // handle it here
-                            if (this.rawMarkdown && this.isLoading) {
-                                this.isLoading = false;
-                                this.fetchHistory();
-                                this.showNotification('Analysis completed!');
+                    if (!response) {
+                        await new Promise(resolve => setTimeout(resolve, 1000 * attempt));
+                        console.log(`Reconnecting to job ${this.activeJob.id} after event ${this.activeJob.lastEventId}...`);
+                        response = await fetch(`${API_BASE_URL}/jobs/${this.activeJob.id}/events`, {
+                            headers: {
+                                'Authorization': `Bearer ${this.authToken}`,
+                                'Last-Event-ID': String(this.activeJob.lastEventId)
                             }
-                            return true;
-                        }
+                        });
+                        if (response.status === 404) break; // The job expired or lives on another server
+                        if (!response.ok) throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+                    }
+                    if (await this.readEventStream(response)) {
+                        sessionStorage.removeItem('ventureMindJob');
+                        return true;
+                    }
+                } catch (error) {
+                    console.error('Job stream interrupted:', error);
+                }
+                response = null;
+                if (!this.activeJob || !this.activeJob.id) break;
+            }
+            sessionStorage.removeItem('ventureMindJob');
+            return false;
+        },
 
-                        lastActivity = Date.now();
-                        buffer += value;
-                        
-                        const messages = buffer.split('\n\n');
-                        buffer = messages.pop() || '';
+        // Returns true once the job has reached a final event (or the server closed the stream).
+        async readEventStream(response) {
+            if (!response.body) {
+                throw new Error('Response body is null.');
+            }
+
+            const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+            let buffer = '';
+            
+            let lastActivity = Date.now();
+            const timeoutDuration = 60000; // 60 seconds
+            const activityTimeout = setInterval(() => {
+                if (Date.now() - lastActivity > timeoutDuration) {
+                    console.log('Streaming activity timeout detected');
+                    reader.cancel('Timeout');
+                    clearInterval(activityTimeout);
+                }
+            }, 5000);
+
+            try {
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) {
+                        console.log('Streaming completed by the server.');
+                        clearInterval(activityTimeout);
                         
-                        for (const message of messages) {
-                            if (!message.trim()) continue;
-                            if (message.startsWith(':')) {
-                                console.log('Keep-alive ping received');
-                                continue;
-                            }
-                            if (message.startsWith('data:')) {
-                                try {
-                                    const jsonData = message.substring(5).trim();
-                                    if (!jsonData) continue;
-                                    const data = JSON.parse(jsonData);
-                                    const shouldStop = await this.handleStreamData(data);
-                                    if (shouldStop) {
-                                        clearInterval(activityTimeout);
-                                        return true;
-                                    }
-                                    if (data.type === 'error') throw new Error(data.message);
-                                } catch (parseError) {
-                                    console.error('JSON parse error:', parseError);
-                                }
+                        // If we have markdown content but didn't get a completion event,
+                        // handle it here
+                        if (this.rawMarkdown && this.isLoading) {
+                            this.isLoading = false;
+                            this.fetchHistory();
+                            this.showNotification('Analysis completed!');
+                        }
+                        return true;
+                    }
+
+                    lastActivity = Date.now();
+                    buffer += value;
+                    
+                    const messages = buffer.split('\n\n');
+                    buffer = messages.pop() || '';
+                    
+                    for (const message of messages) {
+                        if (!message.trim()) continue;
+                        if (message.startsWith(':')) {
+                            console.log('Keep-alive ping received');
+                            continue;
+                        }
+                        // Each message is an optional "id:" line followed by a "data:" line.
+                        let eventId = null;
+                        let jsonData = '';
+                        for (const line of message.split('\n')) {
+                            if (line.startsWith('id:')) eventId = Number(line.substring(3).trim());
+                            else if (line.startsWith('data:')) jsonData += line.substring(5).trim();
+                        }
+                        if (eventId !== null && this.activeJob) this.activeJob.lastEventId = eventId;
+                        if (!jsonData) continue;
+                        try {
+                            const data = JSON.parse(jsonData);
+                            const shouldStop = await this.handleStreamData(data);
+                            if (shouldStop) {
+                                clearInterval(activityTimeout);
+                                return true;
                             }
+                        } catch (parseError) {
+                            console.error('JSON parse error:', parseError);
                         }
                     }
-                } finally {
-                    clearInterval(activityTimeout);
-                    try { reader.cancel(); } catch (e) { /* Already closed */ }
                 }
-                
-            } catch (error) {
-                console.error('Streaming method failed:', error);
-                return false; 
+            } finally {
+                clearInterval(activityTimeout);
+                try { reader.cancel(); } catch (e) { /* Already closed */ }
             }
         },
 
+        // Reruns only the stages a failed analysis had not finished.
+        async resumeAnalysis() {
+            if (this.isLoading || !this.resumableRunId) return;
+            const runId = this.resumableRunId;
+
+            this.resumableRunId = null;
+            this.currentAnalysisId = null;
+            this.isLoading = true;
+            this.error = null;
+            this.liveLog = [];
+            this.rawMarkdown = '';
+            this.chatHistory = [];
+
+            try {
+                const response = await fetch(`${API_BASE_URL}/analysis-runs/${runId}/resume`, {
+                    method: 'POST',
+                    headers: { 'Authorization': `Bearer ${this.authToken}` }
+                });
+                if (!response.ok) {
+                    const data = await response.json().catch(() => ({}));
+                    throw new Error(data.detail || `HTTP ${response.status}`);
+                }
+                this.activeJob = { id: response.headers.get('X-Job-Id'), lastEventId: 0 };
+                if (this.activeJob.id) sessionStorage.setItem('ventureMindJob', this.activeJob.id);
+                if (!await this.followJobStream(response)) throw new Error('Lost the connection to the analysis.');
+            } catch (e) {
+                this.error = `Could not resume the analysis: ${e.message}`;
+                this.isLoading = false;
+                this.showNotification(this.error, 'error', 5000);
+            }
+        },
+
+        // After a page reload, replays a still-running job from its first event.
+        async resumeActiveJob() {
+            const jobId = sessionStorage.getItem('ventureMindJob');
+            if (!jobId || this.isLoading) return;
+
+            this.isLoading = true;
+            this.liveLog = [];
+            this.rawMarkdown = '';
+            this.chatHistory = [];
+            this.activeJob = { id: jobId, lastEventId: 0 };
+            this.showNotification('Resuming your running analysis...', 'info', 2000);
+            if (!await this.followJobStream(null)) this.isLoading = false;
+        },
+
         // FIX 5: Add method to refresh entire view if needed
         refreshView() {
             this.$nextTick(() => {
@@ -380,9 +496,19 @@ document.addEventListener('alpine:init', () => {
         },
 
         // FIX 6: Enhanced loadAnalysisFromHistory with tracking
-        loadAnalysisFromHistory(analysis) {
+        async loadAnalysisFromHistory(analysis) {
+            try {
+                const response = await fetch(`${API_BASE_URL}/analyses/${analysis.id}`, {
+                    headers: { 'Authorization': `Bearer ${this.authToken}` }
+                });
+                if (!response.ok) throw new Error('Could not load this analysis.');
+                const fullAnalysis = await response.json();
+                this.rawMarkdown = fullAnalysis.report_markdown;
+            } catch (e) {
+                this.showNotification(e.message, 'error');
+                return;
+            }
             this.businessIdea = analysis.idea_prompt;
-            this.rawMarkdown = analysis.report_markdown;
             this.chatHistory = []; // Reset chat when loading a new report
             this.currentAnalysisId = analysis.id; // Track current analysis
             this.isHistoryPanelOpen = false;
@@ -417,6 +543,7 @@ document.addEventListener('alpine:init', () => {
                 // Mark as completed
                 this.liveLog[0].status = 'done';
                 this.rawMarkdown = data.result;
+                this.currentAnalysisId = data.analysis_id ?? null;
                 this.isLoading = false;
                 this.fetchHistory();
                 this.showNotification('Analysis completed using backup method!');
@@ -435,10 +562,23 @@ document.addEventListener('alpine:init', () => {
                 case 'connection_established':
                     console.log('Stream connected');
                     break;
+
+                case 'queued': {
+                    const queueLog = this.liveLog.find(l => l.id === 'queue');
+                    const label = `Waiting in queue (position ${data.position})`;
+                    if (queueLog) queueLog.agent = label;
+                    else this.liveLog.push({ id: 'queue', agent: label, status: 'thinking' });
+                    break;
+                }
+
+                case 'cache_hit':
+                    this.liveLog.push({ id: Date.now(), agent: 'Recent analysis', status: 'done' });
+                    break;
                     
                 case 'agent_start':
+                    this.liveLog.filter(l => l.id === 'queue').forEach(l => l.status = 'done');
                     this.liveLog.push({ 
-                        id: Date.now(), 
+                        id: `${data.agent}-${Date.now()}`, // Stages can start in the same millisecond
                         agent: data.agent, 
                         status: 'thinking' 
                     });
@@ -452,6 +592,17 @@ document.addEventListener('alpine:init', () => {
                 case 'progress':
                     console.log(`Progress: ${data.step}/${data.total} - ${data.message}`);
                     break;
+
+                // Live tokens: the Planner's tokens are the report itself, the
+                // other agents' tokens are shown as a short preview in the log.
+                case 'token':
+                    if (data.agent === REPORT_AGENT) {
+                        this.rawMarkdown += data.token;
+                    } else {
+                        const agentLog = this.liveLog.find(l => l.agent === data.agent);
+                        if (agentLog) agentLog.preview = ((agentLog.preview || '') + data.token).slice(-160);
+                    }
+                    break;
                     
                 // FIX 1: Handle report_chunk events to build the markdown content
                 case 'report_chunk':
@@ -462,13 +613,37 @@ document.addEventListener('alpine:init', () => {
                 // FIX 2: Handle completed event properly
                 case 'completed':
                     console.log('Analysis completed:', data.message);
+                    this.currentAnalysisId = data.analysis_id ?? null;
                     this.isLoading = false;
                     this.fetchHistory(); // Refresh history
                     this.showNotification('Analysis completed successfully!');
                     return true; // Signal to stop streaming
                     
+                case 'cancelled':
+                    this.isLoading = false;
+                    return true;
+
+                // A retried stage starts its answer over.
+                case 'stage_retry': {
+                    if (data.agent === REPORT_AGENT) this.rawMarkdown = '';
+                    const retryLog = this.liveLog.find(l => l.agent === data.agent);
+                    if (retryLog) retryLog.preview = `Retrying (attempt ${data.attempt} of ${data.max_attempts})...`;
+                    break;
+                }
+
+                // Stages restored from checkpoints when resuming a failed run.
+                case 'resumed':
+                    data.completed_stages.forEach(agent => {
+                        this.liveLog.push({ id: `${agent}-restored`, agent, status: 'done' });
+                    });
+                    break;
+
                 case 'error':
-                    throw new Error(data.message);
+                    this.error = data.message;
+                    this.isLoading = false;
+                    this.resumableRunId = data.resumable ? data.run_id : null;
+                    this.showNotification(data.message, 'error', 5000);
+                    return true;
             }
             return false; // Continue streaming
         },
@@ -494,17 +669,20 @@ document.addEventListener('alpine:init', () => {
             this.followUpQuestion = '';
 
             try {
-                const response = await fetch(`${API_BASE_URL}/ask-follow-up`, {
+                // Saved analyses have a server-side conversation, so only the question is sent.
+                const url = this.currentAnalysisId
+                    ? `${API_BASE_URL}/analyses/${this.currentAnalysisId}/follow-up`
+                    : `${API_BASE_URL}/ask-follow-up`;
+                const payload = { question: questionToAsk, use_history: this.useHistoryForFollowUp };
+                if (!this.currentAnalysisId) payload.report_context = this.rawMarkdown;
+
+                const response = await fetch(url, {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
                         'Authorization': `Bearer ${this.authToken}`
                     },
-                    body: JSON.stringify({
-                        report_context: this.rawMarkdown,
-                        question: questionToAsk,
-                        use_history: this.useHistoryForFollowUp
-                    })
+                    body: JSON.stringify(payload)
                 });
                 const data = await response.json();
                 if (!response.ok) throw new Error(data.detail || 'Failed to get an answer.');
@@ -530,17 +708,26 @@ document.addEventListener('alpine:init', () => {
             this.isDownloading = true;
 
             try {
+                const headers = {
+                    'Content-Type': 'application/json',
+                    'Authorization': `Bearer ${this.authToken}`
+                };
+                if (this.pdfCache.etag) headers['If-None-Match'] = this.pdfCache.etag;
+
                 const response = await fetch(`${API_BASE_URL}/generate-pdf`, {
                     method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                        'Authorization': `Bearer ${this.authToken}`
-                    },
+                    headers,
                     body: JSON.stringify({ markdown_content: this.rawMarkdown })
                 });
-                if (!response.ok) throw new Error('PDF generation failed.');
 
-                const blob = await response.blob();
+                let blob;
+                if (response.status === 304 && this.pdfCache.blob) {
+                    blob = this.pdfCache.blob;
+                } else {
+                    if (!response.ok) throw new Error('PDF generation failed.');
+                    blob = await response.blob();
+                    this.pdfCache = { etag: response.headers.get('ETag'), blob };
+                }
                 const url = window.URL.createObjectURL(blob);
                 const a = document.createElement('a');
                 a.style.display = 'none';